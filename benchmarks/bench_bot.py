@@ -0,0 +1,293 @@
+#benchmark for weather_bot.py
+#
+#starts local stand-ins for Telegram and OpenWeatherMap (see stand_ins.py),
+#runs weather_bot.py against them as a webhook bot in a child process and
+#replays /cityweather, /zipweather, /dash and /dash.json traffic at a few
+#concurrency levels. latency, throughput and upstream call counts are printed and
+#written as json so runs can be compared across commits, for example:
+#
+#python benchmarks/bench_bot.py --concurrency 1 8 32 --requests 200 --owm-latency 0.05
+#
+#an update is timed from the webhook request until the bot's reply
+#reaches the Telegram stand-in, a dashboard from request to response.
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import platform
+import threading
+import subprocess
+import concurrent.futures
+import urllib.parse
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from stand_ins import FakeTelegram, FakeOpenWeather
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+cities = ["San Diego", "Paris, Fr", "San Luis Obispo, CA, US", "London, GB", "Tokyo", "Denver, CO", "Lima, PE", "Oslo, NO"]
+zip_codes = ["92113", "10001", "WC2N 5DU, GB", "80202", "94103", "60601", "33101", "98101"]
+
+def freePort():
+	with socket.socket() as s:
+		s.bind(("127.0.0.1", 0))
+		return s.getsockname()[1]
+
+def percentile(values, p):
+	#nearest-rank percentile of an already sorted list
+	if not values:
+		return None
+
+	rank = max(0, min(len(values) - 1, int(round(p / 100.0 * len(values) + 0.5)) - 1))
+	return values[rank]
+
+def summarize(latencies, errors, elapsed):
+	latencies = sorted(latencies)
+	return {
+		"requests": len(latencies) + errors,
+		"errors": errors,
+		"throughput": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+		"mean_ms": round(1000 * sum(latencies) / len(latencies), 2) if latencies else None,
+		"p50_ms": round(1000 * percentile(latencies, 50), 2) if latencies else None,
+		"p95_ms": round(1000 * percentile(latencies, 95), 2) if latencies else None,
+		"p99_ms": round(1000 * percentile(latencies, 99), 2) if latencies else None,
+		"max_ms": round(1000 * latencies[-1], 2) if latencies else None
+	}
+
+class BotProcess(object):
+	"""
+	weather_bot.py running in a child process with a generated weather_bot.ini
+	pointing it at the stand-ins. The working directory is a temporary folder,
+	so a real weather_bot.ini next to the bot is never touched.
+	"""
+	def __init__(self, telegram, openweather, settings, log_path = None):
+		self.port = freePort()
+		self.folder = tempfile.mkdtemp(prefix = "weather_bot_bench_")
+		self.log_path = log_path or os.path.join(self.folder, "weather_bot.log")
+		self.url = "http://127.0.0.1:" + str(self.port)
+
+		ini = {
+			"Telegram": {
+				"HOSTNAME": "127.0.0.1",
+				"PORT": self.port,
+				"BOT_TOKEN": "bench",
+				"WEBHOOK_URL": self.url,
+				"ENVIRONMENT": "production",
+				"API_URL": telegram.url
+			},
+			"OpenWeather": {"API_KEY": "bench", "API_URL": openweather.url + "/data/2.5"},
+			"Mapbox": {"API_KEY": "bench"},
+			"Bitly": {"TOKEN": "bench"}
+		}
+		for name, value in settings.items():
+			section, key = name.split(".", 1)
+			ini.setdefault(section, {})[key] = value
+
+		with open(os.path.join(self.folder, "weather_bot.ini"), "w") as f:
+			for section, values in ini.items():
+				f.write("[" + section + "]\n")
+				for key, value in values.items():
+					f.write(key + " = " + str(value) + "\n")
+
+		self.process = None
+
+	def start(self, timeout = 60):
+		self.log = open(self.log_path, "w")
+		self.process = subprocess.Popen(
+			[sys.executable, os.path.join(root, "weather_bot.py")],
+			cwd = self.folder,
+			stdout = self.log,
+			stderr = subprocess.STDOUT
+		)
+
+		deadline = time.monotonic() + timeout
+		while time.monotonic() < deadline:
+			if self.process.poll() != None:
+				raise RuntimeError("weather_bot.py exited early, see " + self.log_path)
+			try:
+				requests.get(self.url + "/health", timeout = 1)
+				return self
+			except requests.ConnectionError:
+				time.sleep(0.2)
+
+		raise RuntimeError("weather_bot.py did not start listening, see " + self.log_path)
+
+	def stop(self):
+		if self.process != None and self.process.poll() == None:
+			self.process.terminate()
+			try:
+				self.process.wait(timeout = 10)
+			except subprocess.TimeoutExpired:
+				self.process.kill()
+
+		self.log.close()
+
+class Benchmark(object):
+	"""
+	Replays one scenario at one concurrency level. Each of the concurrency
+	workers sends its next request as soon as its previous one completed.
+	"""
+	def __init__(self, bot, telegram, timeout = 30):
+		self.bot = bot
+		self.telegram = telegram
+		self.timeout = timeout
+		self.session = requests.Session()
+		self.session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize = 256))
+		self.chat_ids = iter(range(1000, 10 ** 9))
+		self.sizes = []
+		self.lock = threading.Lock()
+
+	def nextChat(self):
+		with self.lock:
+			return next(self.chat_ids)
+
+	def update(self, text):
+		#one synthetic message update, each in its own
+		#chat so the per-chat rate limit stays out of the way
+		chat_id = self.nextChat()
+		waiter = self.telegram.expect(chat_id)
+		update = {
+			"update_id": chat_id,
+			"message": {
+				"message_id": 1,
+				"date": int(time.time()),
+				"text": text,
+				"chat": {"id": chat_id, "type": "private"},
+				"from": {"id": chat_id, "is_bot": False, "first_name": "Bench"}
+			}
+		}
+
+		started = time.perf_counter()
+		r = self.session.post(self.bot.url + "/", json = update, timeout = self.timeout)
+		if r.status_code != 200 or not waiter["event"].wait(self.timeout):
+			return None
+
+		return waiter["time"] - started
+
+	def dash(self, city, path = "/dash"):
+		parts = [p.strip() for p in city.split(",")]
+		params = {"city": parts[0], "state": "None", "country_code": "None"}
+		if len(parts) == 3:
+			params.update({"state": parts[1], "country_code": parts[2]})
+		elif len(parts) == 2:
+			params["country_code"] = parts[1]
+
+		started = time.perf_counter()
+		r = self.session.get(self.bot.url + path + "?" + urllib.parse.urlencode(params), timeout = self.timeout)
+		if r.status_code != 200:
+			return None
+
+		elapsed = time.perf_counter() - started
+		with self.lock:
+			self.sizes.append(len(r.content))
+
+		return elapsed
+
+	def request(self, scenario, i):
+		try:
+			if scenario == "cityweather":
+				return self.update("/cityweather " + cities[i % len(cities)])
+			if scenario == "zipweather":
+				return self.update("/zipweather " + zip_codes[i % len(zip_codes)])
+			if scenario == "dashjson":
+				return self.dash(cities[i % len(cities)], "/dash.json")
+			return self.dash(cities[i % len(cities)])
+		except requests.RequestException:
+			return None
+
+	def run(self, scenario, concurrency, count):
+		latencies = []
+		errors = 0
+		self.sizes = []
+		started = time.perf_counter()
+		with concurrent.futures.ThreadPoolExecutor(max_workers = concurrency) as pool:
+			for latency in pool.map(lambda i: self.request(scenario, i), range(count)):
+				if latency == None:
+					errors += 1
+				else:
+					latencies.append(latency)
+
+		summary = summarize(latencies, errors, time.perf_counter() - started)
+		if self.sizes:
+			summary["mean_bytes"] = round(sum(self.sizes) / len(self.sizes))
+
+		return summary
+
+def gitCommit():
+	try:
+		return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd = root, stderr = subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def main():
+	parser = argparse.ArgumentParser(description = "Benchmark weather_bot.py against local Telegram and OpenWeatherMap stand-ins.")
+	parser.add_argument("--scenarios", nargs = "+", default = ["cityweather", "zipweather", "dash", "dashjson"], choices = ["cityweather", "zipweather", "dash", "dashjson"])
+	parser.add_argument("--concurrency", nargs = "+", type = int, default = [1, 8, 32])
+	parser.add_argument("--requests", type = int, default = 200, help = "requests per scenario and concurrency level")
+	parser.add_argument("--warmup", type = int, default = 10, help = "requests per scenario sent before measuring")
+	parser.add_argument("--telegram-latency", type = float, default = 0.02)
+	parser.add_argument("--telegram-errors", type = float, default = 0.0, help = "fraction of Telegram calls answered with a 500")
+	parser.add_argument("--owm-latency", type = float, default = 0.05)
+	parser.add_argument("--owm-jitter", type = float, default = 0.0)
+	parser.add_argument("--owm-errors", type = float, default = 0.0, help = "fraction of OpenWeatherMap calls answered with a 500")
+	parser.add_argument("--no-rate-limit", action = "store_true", help = "turn off the bot's outgoing message pacing")
+	parser.add_argument("--set", nargs = "*", default = [], metavar = "SECTION.KEY=VALUE", help = "extra weather_bot.ini settings, for example OpenWeather.CACHE_TTL=0")
+	parser.add_argument("--output", default = None, help = "json results file (default benchmarks/results/<time>.json)")
+	parser.add_argument("--log", default = None, help = "file for the bot's own output")
+	args = parser.parse_args()
+
+	settings = dict(s.split("=", 1) for s in args.set)
+	if args.no_rate_limit:
+		settings["Telegram.RATE_LIMIT"] = "false"
+
+	telegram = FakeTelegram(latency = args.telegram_latency, error_rate = args.telegram_errors).start()
+	openweather = FakeOpenWeather(latency = args.owm_latency, jitter = args.owm_jitter, error_rate = args.owm_errors).start()
+	bot = BotProcess(telegram, openweather, settings, args.log).start()
+
+	results = {
+		"commit": gitCommit(),
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"settings": dict(vars(args), ini = settings),
+		"runs": []
+	}
+
+	benchmark = Benchmark(bot, telegram)
+	try:
+		for scenario in args.scenarios:
+			for i in range(args.warmup):
+				benchmark.request(scenario, i)
+
+			for concurrency in args.concurrency:
+				telegram.reset()
+				openweather.reset()
+				run = dict(scenario = scenario, concurrency = concurrency, **benchmark.run(scenario, concurrency, args.requests))
+				run["telegram"] = telegram.stats()
+				run["openweather"] = openweather.stats()
+				results["runs"].append(run)
+
+				print("{:<12} c={:<4} {:>8} req/s  p50 {:>8} ms  p95 {:>8} ms  p99 {:>8} ms  errors {}  owm {}  telegram {}".format(
+					scenario, concurrency, str(run["throughput"]), str(run["p50_ms"]), str(run["p95_ms"]), str(run["p99_ms"]),
+					run["errors"], sum(run["openweather"]["calls"].values()), sum(run["telegram"]["calls"].values())
+				))
+	finally:
+		bot.stop()
+		telegram.stop()
+		openweather.stop()
+
+	output = args.output or os.path.join(root, "benchmarks", "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+	os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok = True)
+	with open(output, "w") as f:
+		json.dump(results, f, indent = 2)
+
+	print("Results written to " + output)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,112 @@
+#benchmark for the server rendered dashboard page
+#
+#imports weather_bot.py against the OpenWeatherMap stand-in (see stand_ins.py),
+#fetches one dashboard's data and then times only the page rendering, building
+#the page with dominate on every call against filling the template compiled
+#once at startup ([Dashboard] TEMPLATE), for example:
+#
+#python benchmarks/bench_dash_render.py --iterations 500
+#
+#no server or network is involved in the timed part.
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import platform
+import importlib
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from stand_ins import FakeOpenWeather
+from bench_bot import root, summarize, gitCommit
+
+def loadBot(openweather):
+	#weather_bot.py reads weather_bot.ini from the working directory
+	#when it is imported, so it is pointed at the stand-in from a temporary one
+	folder = tempfile.mkdtemp(prefix = "weather_bot_render_")
+	with open(os.path.join(folder, "weather_bot.ini"), "w") as f:
+		f.write("[Telegram]\nHOSTNAME = 127.0.0.1\nPORT = 8080\nBOT_TOKEN = bench\nWEBHOOK_URL = http://127.0.0.1:8080\nENVIRONMENT = production\n")
+		f.write("[OpenWeather]\nAPI_KEY = bench\nAPI_URL = " + openweather.url + "/data/2.5\n")
+		f.write("[Mapbox]\nAPI_KEY = bench\n[Bitly]\nTOKEN = bench\n[Logging]\nLEVEL = WARNING\n")
+
+	os.chdir(folder)
+	sys.path.insert(0, root)
+	weather_bot = importlib.import_module("weather_bot")
+
+	#the bot is never started, only its rendering is used
+	bot = weather_bot.Bot.__new__(weather_bot.Bot)
+	bot.configure({"token": "bench"})
+	return weather_bot, bot
+
+def timeRenders(render, iterations):
+	latencies = []
+	started = time.perf_counter()
+	for i in range(iterations):
+		begin = time.perf_counter()
+		page = render()
+		latencies.append(time.perf_counter() - begin)
+
+	summary = summarize(latencies, 0, time.perf_counter() - started)
+	summary["bytes"] = len(page.encode("utf-8"))
+	return summary
+
+def main():
+	parser = argparse.ArgumentParser(description = "Benchmark the dominate and precompiled dashboard page rendering.")
+	parser.add_argument("--iterations", type = int, default = 300)
+	parser.add_argument("--warmup", type = int, default = 20)
+	parser.add_argument("--city", default = "San Diego")
+	parser.add_argument("--output", default = None, help = "json results file (default benchmarks/results/render-<time>.json)")
+	args = parser.parse_args()
+
+	openweather = FakeOpenWeather().start()
+	try:
+		weather_bot, bot = loadBot(openweather)
+		params = {"city": args.city, "state": "None", "country_code": "None"}
+		current, dash_data = bot.fetchDash(params)
+	finally:
+		openweather.stop()
+
+	values = bot.dashValues(params, current, dash_data)
+
+	started = time.perf_counter()
+	weather_bot.dashboard["compiled"] = bot.compileDashTemplate()
+	compile_ms = round(1000 * (time.perf_counter() - started), 2)
+
+	renders = {
+		"dominate": lambda: bot.renderDominate(values, dash_data),
+		"precompiled": lambda: bot.renderTemplate(values, dash_data)
+	}
+
+	results = {
+		"commit": gitCommit(),
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"settings": vars(args),
+		"compile_ms": compile_ms,
+		"runs": []
+	}
+
+	for name, render in renders.items():
+		for i in range(args.warmup):
+			render()
+
+		run = dict(template = name, **timeRenders(render, args.iterations))
+		results["runs"].append(run)
+		print("{:<12} {:>8} pages/s  mean {:>8} ms  p50 {:>8} ms  p99 {:>8} ms  {} bytes".format(
+			name, str(run["throughput"]), str(run["mean_ms"]), str(run["p50_ms"]), str(run["p99_ms"]), run["bytes"]
+		))
+
+	print("Template compiled in {} ms".format(compile_ms))
+
+	output = args.output or os.path.join(root, "benchmarks", "results", "render-" + time.strftime("%Y%m%d-%H%M%S") + ".json")
+	os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok = True)
+	with open(output, "w") as f:
+		json.dump(results, f, indent = 2)
+
+	print("Results written to " + output)
+
+if __name__ == "__main__":
+	main()
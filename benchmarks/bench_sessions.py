@@ -0,0 +1,77 @@
+#benchmark for CherryPy sessions on the bot's endpoints
+#
+#runs weather_bot.py twice against the stand-ins (see bench_bot.py), once
+#stateless (the default) and once with [Server] SESSIONS = true, and replays
+#the same webhook and dashboard traffic at each, for example:
+#
+#python benchmarks/bench_sessions.py --concurrency 1 8 32 --requests 500
+#
+#cookies are never sent back, like Telegram's webhook calls and first
+#visits to a shared dashboard link, so every request starts a session.
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import http.cookiejar
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from stand_ins import FakeTelegram, FakeOpenWeather
+from bench_bot import root, BotProcess, Benchmark, gitCommit
+
+def main():
+	parser = argparse.ArgumentParser(description = "Benchmark weather_bot.py with and without CherryPy sessions.")
+	parser.add_argument("--scenarios", nargs = "+", default = ["cityweather", "dashjson"], choices = ["cityweather", "zipweather", "dash", "dashjson"])
+	parser.add_argument("--concurrency", nargs = "+", type = int, default = [1, 8, 32])
+	parser.add_argument("--requests", type = int, default = 500, help = "requests per scenario and concurrency level")
+	parser.add_argument("--warmup", type = int, default = 10, help = "requests per scenario sent before measuring")
+	parser.add_argument("--output", default = None, help = "json results file (default benchmarks/results/sessions-<time>.json)")
+	args = parser.parse_args()
+
+	#no upstream latency or message pacing, so the
+	#server's own per-request work is what gets measured
+	telegram = FakeTelegram().start()
+	openweather = FakeOpenWeather().start()
+
+	results = {
+		"commit": gitCommit(),
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"settings": vars(args),
+		"runs": []
+	}
+
+	try:
+		for sessions in [False, True]:
+			bot = BotProcess(telegram, openweather, {"Server.SESSIONS": str(sessions).lower(), "Telegram.RATE_LIMIT": "false"}).start()
+			try:
+				benchmark = Benchmark(bot, telegram)
+				benchmark.session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains = []))
+				for scenario in args.scenarios:
+					for i in range(args.warmup):
+						benchmark.request(scenario, i)
+
+					for concurrency in args.concurrency:
+						run = dict(sessions = sessions, scenario = scenario, concurrency = concurrency, **benchmark.run(scenario, concurrency, args.requests))
+						results["runs"].append(run)
+						print("sessions {:<5} {:<12} c={:<4} {:>8} req/s  p50 {:>8} ms  p99 {:>8} ms  errors {}".format(
+							str(sessions).lower(), scenario, concurrency, str(run["throughput"]), str(run["p50_ms"]), str(run["p99_ms"]), run["errors"]
+						))
+			finally:
+				bot.stop()
+	finally:
+		telegram.stop()
+		openweather.stop()
+
+	output = args.output or os.path.join(root, "benchmarks", "results", "sessions-" + time.strftime("%Y%m%d-%H%M%S") + ".json")
+	os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok = True)
+	with open(output, "w") as f:
+		json.dump(results, f, indent = 2)
+
+	print("Results written to " + output)
+
+if __name__ == "__main__":
+	main()
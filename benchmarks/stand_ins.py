@@ -0,0 +1,224 @@
+#local stand-ins for the Telegram Bot API and OpenWeatherMap
+#so the bot can be benchmarked without live services
+#(see bench_bot.py)
+
+import json
+import time
+import random
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StandIn(object):
+	"""
+	Base class of the stand-in HTTP servers. Every request waits latency seconds
+	(plus up to jitter seconds more) and fails with a 500 at the given error_rate.
+	The server runs on a daemon thread on 127.0.0.1 and an ephemeral port
+	unless one is given.
+
+	stand_in = FakeOpenWeather(latency = 0.05, error_rate = 0.01)
+	stand_in.start()
+	stand_in.url #http://127.0.0.1:PORT
+	stand_in.calls #{"weather": 10, "forecast": 4}
+	stand_in.stop()
+
+	Subclasses implement respond(path, query, body) returning (status code, json object).
+	"""
+	def __init__(self, latency = 0, jitter = 0, error_rate = 0, port = 0):
+		self.latency = latency
+		self.jitter = jitter
+		self.error_rate = error_rate
+		self.port = port
+		self.calls = {}
+		self.errors = {}
+		self.lock = threading.Lock()
+		self.server = None
+
+	@property
+	def url(self):
+		return "http://127.0.0.1:" + str(self.server.server_address[1])
+
+	def start(self):
+		stand_in = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = "HTTP/1.1"
+
+			def do_GET(self):
+				self.reply(b"")
+
+			def do_POST(self):
+				self.reply(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+
+			def reply(self, body):
+				url = urllib.parse.urlsplit(self.path)
+				code, payload = stand_in.handle(url.path, urllib.parse.parse_qs(url.query), body, self.headers)
+				data = json.dumps(payload).encode()
+				self.send_response(code)
+				self.send_header("Content-Type", "application/json")
+				self.send_header("Content-Length", str(len(data)))
+				self.end_headers()
+				self.wfile.write(data)
+
+			def log_message(self, format, *args):
+				pass
+
+		self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+		self.server.daemon_threads = True
+		threading.Thread(target = self.server.serve_forever, daemon = True).start()
+		return self
+
+	def stop(self):
+		if self.server != None:
+			self.server.shutdown()
+			self.server.server_close()
+
+	def handle(self, path, query, body, headers):
+		name = self.callName(path)
+		self.count(self.calls, name)
+		self.received(name, query, body, headers)
+
+		delay = self.latency + random.uniform(0, self.jitter)
+		if delay > 0:
+			time.sleep(delay)
+
+		if self.error_rate > 0 and random.random() < self.error_rate:
+			self.count(self.errors, name)
+			return 500, {"ok": False, "cod": 500, "message": "stand-in error"}
+
+		return self.respond(name, query, body, headers)
+
+	def count(self, counts, name):
+		with self.lock:
+			counts[name] = counts.get(name, 0) + 1
+
+	def callName(self, path):
+		return path.rstrip("/").rsplit("/", 1)[-1]
+
+	def received(self, name, query, body, headers):
+		#hook for subclasses that want to see requests
+		#before the latency is applied
+		pass
+
+	def respond(self, name, query, body, headers):
+		raise NotImplementedError
+
+	def stats(self):
+		with self.lock:
+			return {"calls": dict(self.calls), "errors": dict(self.errors)}
+
+	def reset(self):
+		with self.lock:
+			self.calls = {}
+			self.errors = {}
+
+class FakeTelegram(StandIn):
+	"""
+	Answers the Bot API methods the weather bot uses. Messages sent to a chat
+	are reported to the waiter registered for it with expect(chat_id), so a
+	benchmark can time an update from the webhook request to the bot's reply
+	(the time is taken when the reply arrives, before the stand-in latency).
+	"""
+	def __init__(self, **kwargs):
+		StandIn.__init__(self, **kwargs)
+		self.waiters = {}
+		self.file_ids = 0
+
+	def expect(self, chat_id):
+		"""
+		RETURNS: dictionary with an "event" set when a message for chat_id arrives
+		and the "time" (time.perf_counter) it arrived.
+		"""
+		waiter = {"event": threading.Event(), "time": None}
+		with self.lock:
+			self.waiters[str(chat_id)] = waiter
+
+		return waiter
+
+	def received(self, name, query, body, headers):
+		if not name.startswith("send"):
+			return
+
+		chat_id = self.chatOf(query, body, headers)
+		with self.lock:
+			waiter = self.waiters.pop(chat_id, None)
+
+		if waiter != None:
+			waiter["time"] = time.perf_counter()
+			waiter["event"].set()
+
+	def chatOf(self, query, body, headers):
+		if "chat_id" in query:
+			return query["chat_id"][0]
+
+		content_type = headers.get("Content-Type", "")
+		text = body.decode("utf-8", "replace")
+		if content_type.startswith("application/json"):
+			return str(json.loads(text).get("chat_id"))
+		if content_type.startswith("application/x-www-form-urlencoded"):
+			return urllib.parse.parse_qs(text).get("chat_id", [None])[0]
+
+		#multipart upload, good enough for a stand-in
+		marker = 'name="chat_id"'
+		if marker in text:
+			return text.split(marker, 1)[1].split("\r\n\r\n", 1)[1].split("\r\n", 1)[0]
+
+		return None
+
+	def respond(self, name, query, body, headers):
+		if name == "getMe":
+			return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}}
+		if name == "getWebhookInfo":
+			return 200, {"ok": True, "result": {"url": "", "pending_update_count": 0}}
+		if name == "getMyCommands":
+			return 200, {"ok": True, "result": []}
+		if name == "getUpdates":
+			return 200, {"ok": True, "result": []}
+
+		message = {"message_id": 1, "date": int(time.time()), "chat": {"id": 1}}
+		if name in ["sendPhoto", "sendAnimation"]:
+			with self.lock:
+				self.file_ids += 1
+				file_id = "bench-file-" + str(self.file_ids)
+
+			if name == "sendPhoto":
+				message["photo"] = [{"file_id": file_id + "-small"}, {"file_id": file_id}]
+			else:
+				message["animation"] = {"file_id": file_id}
+
+		if name.startswith("send"):
+			return 200, {"ok": True, "result": message}
+
+		return 200, {"ok": True, "result": True}
+
+class FakeOpenWeather(StandIn):
+	"""
+	Answers /weather (by q or zip) and /forecast with synthetic readings
+	shaped like OpenWeatherMap's responses.
+	"""
+	def respond(self, name, query, body, headers):
+		place = (query.get("q") or query.get("zip") or ["Benchville"])[0].split(",")[0]
+		now = int(time.time())
+		if name == "weather":
+			return 200, {
+				"cod": 200,
+				"name": place,
+				"coord": {"lat": 32.72, "lon": -117.16},
+				"main": {"temp": 70.1, "feels_like": 69.0, "temp_min": 65.0, "temp_max": 75.0, "pressure": 1012, "humidity": 60},
+				"weather": [{"id": 800, "main": "Clear", "description": "clear sky", "icon": "01d"}],
+				"sys": {"country": "US", "sunrise": now - 20000, "sunset": now + 20000}
+			}
+
+		if name == "forecast":
+			start = now // 10800 * 10800
+			return 200, {
+				"cod": "200",
+				"city": {"name": place, "country": "US", "coord": {"lat": 32.72, "lon": -117.16}, "sunrise": now - 20000, "sunset": now + 20000},
+				"list": [{
+					"dt": start + i * 10800,
+					"main": {"temp": 60 + i % 10, "feels_like": 59, "temp_min": 55 + i % 5, "temp_max": 70 + i % 7, "pressure": 1010, "humidity": 50},
+					"weather": [{"id": 500, "main": "Rain", "description": "light rain", "icon": "10d"}]
+				} for i in range(40)]
+			}
+
+		return 404, {"cod": "404", "message": "city not found"}
@@ -1,7 +1,1479 @@
+import os
+import sys
+import atexit
+import copy
 import json
+import signal
+import socket
+import gzip
+import io
+import hashlib
+import ipaddress
+import mimetypes
+import email.utils
+import logging
+import logging.handlers
+import time
+import random
+import queue
+import threading
+from collections import OrderedDict
+import asyncio
+import inspect
 import requests
+from requests.adapters import HTTPAdapter
 import cherrypy
 
+#only needed for AsyncDokkaebi
+try:
+	import aiohttp
+	import aiohttp.web
+except ImportError:
+	aiohttp = None
+
+#brotli is optional, responses fall back to gzip without it
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+#response compressions dokkaebi can produce, most preferred first
+content_encodings = ("br", "gzip") if brotli != None else ("gzip",)
+
+#CherryPy config every Dokkaebi app starts from: the webhook and
+#the pages a bot serves don't keep per-visitor state, so no session
+#is created, locked and cookied for each request (see sessions)
+stateless_config = {
+	'/': {
+		'tools.sessions.on': False
+	}
+}
+
+#everything dokkaebi reports goes through this logger,
+#see configureLogging for getting it onto the console
+log = logging.getLogger("dokkaebi")
+
+class StructuredFormatter(logging.Formatter):
+	"""
+	Formats log records as one json object per line, for log collectors:
+	{"time": "2021-01-01T12:00:00", "level": "INFO", "logger": "dokkaebi", "message": "Message sent", "method": "sendMessage", "status": 200}
+	Fields passed with extra = {...} are added to the object.
+	"""
+	#attributes every LogRecord has, anything else came from extra
+	standard = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+	def format(self, record):
+		entry = {
+			"time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+			"level": record.levelname,
+			"logger": record.name,
+			"message": record.getMessage()
+		}
+		for name, value in vars(record).items():
+			if name not in self.standard:
+				entry[name] = value
+		if record.exc_info:
+			entry["exception"] = self.formatException(record.exc_info)
+		elif record.exc_text:
+			#queued records carry the traceback as text (see RecordQueueHandler)
+			entry["exception"] = record.exc_text
+
+		return json.dumps(entry, default = str)
+
+class FieldsFormatter(logging.Formatter):
+	"""
+	Formats log records as readable lines with the extra fields appended:
+	2021-01-01 12:00:00 INFO dokkaebi: Message sent method=sendMessage status=200
+	"""
+	def __init__(self):
+		logging.Formatter.__init__(self, "%(asctime)s %(levelname)s %(name)s: %(message)s", "%Y-%m-%d %H:%M:%S")
+
+	def format(self, record):
+		line = logging.Formatter.format(self, record)
+		fields = [name + "=" + str(value) for name, value in vars(record).items() if name not in StructuredFormatter.standard]
+		if fields:
+			#keep the exception text at the end
+			head, separator, tail = line.partition("\n")
+			line = head + " " + " ".join(fields) + separator + tail
+
+		return line
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+	"""
+	QueueHandler that leaves the formatting to the writer thread's formatter.
+	The stock prepare() bakes the traceback into the message, which would hide
+	it from StructuredFormatter's "exception" field; here the message arguments
+	are merged and the traceback is kept apart as exc_text.
+	"""
+	def prepare(self, record):
+		record = copy.copy(record)
+		record.msg = record.getMessage()
+		record.args = None
+		if record.exc_info:
+			record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+			record.exc_info = None
+
+		return record
+
+class LogListener(logging.handlers.QueueListener):
+	"""
+	The QueueListener configureLogging starts, it remembers whether its writer thread
+	is running so stop() can be called again (by hand and then at exit).
+	"""
+	running = False
+
+	def start(self):
+		super().start()
+		self.running = True
+
+	def stop(self):
+		if self.running:
+			self.running = False
+			super().stop()
+
+#the listener configureLogging last started, stopped at exit
+#and replaced in forked worker processes (see Dokkaebi.preFork)
+logging_state = {"listener": None, "handlers": [], "hooked": False}
+
+def stopLogging():
+	"""
+	Writes out whatever is still queued and stops the configureLogging writer thread.
+	Safe to call again or after the listener was stopped by hand.
+	"""
+	listener = logging_state["listener"]
+	if listener != None:
+		listener.stop()
+
+def restartLogging():
+	#a forked worker process can't use the parent's writer thread or the
+	#queue it was waiting on, so it gets its own listener on a fresh queue
+	listener = logging_state["listener"]
+	if listener == None or not listener.running:
+		return
+
+	fresh = queue.SimpleQueue()
+	for queued in logging_state["handlers"]:
+		queued.queue = fresh
+	logging_state["listener"] = LogListener(fresh, *listener.handlers, respect_handler_level = listener.respect_handler_level)
+	logging_state["listener"].start()
+
+def configureLogging(level = "INFO", format = "text", stream = None, loggers = ("dokkaebi",)):
+	"""
+	Sends the given loggers through a queue to a background thread that does the
+	formatting and writing, so logging never blocks a request or worker thread on a
+	slow console or pipe. For example:
+
+	dokkaebi.configureLogging(level = "DEBUG", format = "json", loggers = ("dokkaebi", "weather_bot"))
+
+	format is "json" (see StructuredFormatter) or "text" (see FieldsFormatter). Dokkaebi calls this
+	with the 'log_level' and 'log_format' hook values unless its logger already has handlers.
+	Response bodies are only decoded and logged at the DEBUG level.
+
+	Calling it again replaces the previous setup (its writer thread is stopped first).
+
+	RETURNS: the LogListener doing the writing, stop() flushes it.
+
+	PRECONDITION:
+	None
+
+	POSTCONDITION:
+	The loggers hand their records to a queue and no longer pass them up to the root logger.
+	"""
+	handler = logging.StreamHandler(stream if stream != None else sys.stdout)
+	handler.setFormatter(StructuredFormatter() if format == "json" else FieldsFormatter())
+
+	stopLogging()
+
+	records = queue.SimpleQueue()
+	listener = LogListener(records, handler, respect_handler_level = True)
+	handlers = []
+	for name in loggers:
+		logger = logging.getLogger(name)
+		for old in list(logger.handlers):
+			logger.removeHandler(old)
+		handlers.append(RecordQueueHandler(records))
+		logger.addHandler(handlers[-1])
+		logger.setLevel(level)
+		logger.propagate = False
+
+	logging_state["listener"] = listener
+	logging_state["handlers"] = handlers
+	listener.start()
+
+	if not logging_state["hooked"]:
+		logging_state["hooked"] = True
+		#write out whatever is still queued at exit
+		atexit.register(stopLogging)
+		if hasattr(os, "register_at_fork"):
+			os.register_at_fork(after_in_child = restartLogging)
+
+	return listener
+
+def command(*names):
+	"""
+	Decorator registering a method of a Dokkaebi subclass as the handler for
+	one or more bot commands (without the leading slash). The handler is called
+	with the message json object and the text following the command:
+
+	class Bot(dokkaebi.Dokkaebi):
+		@dokkaebi.command("start")
+		def onStart(self, message, arguments):
+			self.sendMessage({"chat_id": message["chat"]["id"], "text": "hi"})
+
+	"/start" and "/start@yourbotname" both reach the handler (see Dokkaebi.buildCommandTable).
+	"""
+	def register(function):
+		function.dokkaebi_commands = names
+		return function
+
+	return register
+
+def sessions(function):
+	"""
+	Decorator opting one exposed method of a Dokkaebi subclass into CherryPy
+	sessions, everything else stays stateless (see stateless_config):
+
+	class Bot(dokkaebi.Dokkaebi):
+		@cherrypy.expose
+		@dokkaebi.sessions
+		def settings(self):
+			return cherrypy.session.get("units", "imperial")
+	"""
+	function._cp_config = dict(getattr(function, "_cp_config", {}), **{'tools.sessions.on': True})
+	return function
+
+def allowsClient(access, ip):
+	"""
+	Decides who may read a monitoring endpoint such as /metrics, access is True
+	(anyone), "local" (only clients on this machine) or False (nobody), for example:
+
+	if not dokkaebi.allowsClient("local", cherrypy.request.remote.ip):
+		raise cherrypy.NotFound()
+
+	RETURNS: boolean True if a request from ip may be answered.
+	"""
+	if access == "local":
+		try:
+			address = ipaddress.ip_address(ip)
+		except ValueError:
+			return False
+
+		#127.0.0.1 arrives as ::ffff:127.0.0.1 on a dual stack socket
+		if address.version == 6 and address.ipv4_mapped != None:
+			address = address.ipv4_mapped
+		return address.is_loopback
+
+	return access == True
+
+class Endpoints(object):
+	"""
+	Registry of Bot API urls. The prefix for a bot's methods is put together once
+	and every method's url is built the first time it is called and kept, so API calls
+	only do a dictionary lookup. Point api_url at a local Bot API server
+	(https://github.com/tdlib/telegram-bot-api) or a proxy to route calls there.
+
+	endpoints = Endpoints("https://api.telegram.org", "yourtelegrambottokenhere")
+	endpoints.url("sendMessage") #https://api.telegram.org/botyourtelegrambottokenhere/sendMessage
+	endpoints.fileUrl("photos/file_1.jpg") #https://api.telegram.org/file/botyourtelegrambottokenhere/photos/file_1.jpg
+
+	PRECONDITION:
+	api_url is the server's base url without the /bot part.
+
+	POSTCONDITION:
+	Urls for the methods listed in methods are ready, any others are added as they are used.
+	"""
+	def __init__(self, api_url = "https://api.telegram.org", token = "", methods = ()):
+		self.api_url = api_url.rstrip("/")
+		self.prefix = self.api_url + "/bot" + token + "/"
+		self.file_prefix = self.api_url + "/file/bot" + token + "/"
+		self.urls = {method: self.prefix + method for method in methods}
+
+	def url(self, method):
+		"""
+		RETURNS: string url of the Bot API method.
+		"""
+		url = self.urls.get(method)
+		if url == None:
+			#a plain dict store is safe to race on,
+			#every thread builds the same string
+			url = self.prefix + method
+			self.urls[method] = url
+
+		return url
+
+	def fileUrl(self, file_path):
+		"""
+		RETURNS: string url to download a file, file_path comes from getFile's File json object.
+		"""
+		return self.file_prefix + file_path
+
+class Metrics(object):
+	"""
+	Metrics is a small registry of counters and histograms rendered in the
+	Prometheus text format (served by Dokkaebi at /metrics). Families are
+	described once and then updated by name with a dictionary of labels:
+
+	metrics.describe("dokkaebi_command_seconds", "histogram", "Time spent handling a bot command.")
+	metrics.observe("dokkaebi_command_seconds", 0.12, {"command": "cityweather"})
+	metrics.inc("dokkaebi_updates_total", {"result": "queued"})
+
+	Values that are already counted elsewhere (cache stats, queue depth) are not copied
+	in here, they are passed to render as extra families when /metrics is scraped.
+
+	Data Members:
+	self.families - ordered dictionary of name -> {"type", "help", "buckets", "samples"}.
+	"""
+	default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+	def __init__(self):
+		self.families = OrderedDict()
+		self.lock = threading.Lock()
+
+	def describe(self, name, type, help, buckets = None):
+		"""
+		Registers a "counter" or "histogram" family (histograms get default_buckets unless buckets are given).
+		"""
+		with self.lock:
+			self.families[name] = {
+				"type": type,
+				"help": help,
+				"buckets": tuple(buckets or self.default_buckets),
+				"samples": {}
+			}
+
+	def inc(self, name, labels = None, value = 1):
+		"""
+		Adds value to a counter.
+		"""
+		key = tuple(sorted((labels or {}).items()))
+		with self.lock:
+			samples = self.families[name]["samples"]
+			samples[key] = samples.get(key, 0) + value
+
+	def observe(self, name, value, labels = None):
+		"""
+		Records value (usually seconds) in a histogram.
+		"""
+		key = tuple(sorted((labels or {}).items()))
+		with self.lock:
+			family = self.families[name]
+			sample = family["samples"].get(key)
+			if sample == None:
+				sample = {"buckets": [0] * len(family["buckets"]), "sum": 0.0, "count": 0}
+				family["samples"][key] = sample
+
+			for i, bound in enumerate(family["buckets"]):
+				if value <= bound:
+					sample["buckets"][i] += 1
+			sample["sum"] += value
+			sample["count"] += 1
+
+	def render(self, extra = ()):
+		"""
+		RETURNS: string of every family in the Prometheus text exposition format (version 0.0.4).
+		extra is a list of (name, type, help, [(labels dictionary, value), ...]) families
+		such as gauges read at scrape time.
+		"""
+		lines = []
+		with self.lock:
+			for name, family in self.families.items():
+				lines.append("# HELP " + name + " " + family["help"])
+				lines.append("# TYPE " + name + " " + family["type"])
+				for key, sample in family["samples"].items():
+					if family["type"] != "histogram":
+						lines.append(name + self.labelText(key) + " " + self.valueText(sample))
+						continue
+
+					for bound, count in zip(family["buckets"], sample["buckets"]):
+						lines.append(name + "_bucket" + self.labelText(key + (("le", self.valueText(bound)),)) + " " + str(count))
+					lines.append(name + "_bucket" + self.labelText(key + (("le", "+Inf"),)) + " " + str(sample["count"]))
+					lines.append(name + "_sum" + self.labelText(key) + " " + self.valueText(sample["sum"]))
+					lines.append(name + "_count" + self.labelText(key) + " " + str(sample["count"]))
+
+		for name, type, help, samples in extra:
+			lines.append("# HELP " + name + " " + help)
+			lines.append("# TYPE " + name + " " + type)
+			for labels, value in samples:
+				lines.append(name + self.labelText(tuple(sorted(labels.items()))) + " " + self.valueText(value))
+
+		return "\n".join(lines) + "\n"
+
+	def labelText(self, key):
+		"""
+		RETURNS: string {name="value",...} for a sorted tuple of label pairs, or "" without labels.
+		"""
+		if not key:
+			return ""
+
+		pairs = []
+		for name, value in key:
+			value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+			pairs.append(name + '="' + value + '"')
+
+		return "{" + ",".join(pairs) + "}"
+
+	def valueText(self, value):
+		"""
+		RETURNS: string form of a sample value (booleans as 0/1, whole floats without the .0).
+		"""
+		if isinstance(value, bool):
+			return "1" if value else "0"
+		if isinstance(value, float) and value.is_integer():
+			return str(int(value))
+
+		return str(value)
+
+#the registry shared by every Dokkaebi and UpstreamClient in the process
+metrics = Metrics()
+metrics.describe("dokkaebi_updates_total", "counter", "Updates received from Telegram by result (handled, queued, duplicate, rejected).")
+metrics.describe("dokkaebi_command_seconds", "histogram", "Time spent handling a bot command.")
+metrics.describe("dokkaebi_telegram_requests_total", "counter", "Bot API calls by method and HTTP status (error when no response arrived).")
+metrics.describe("dokkaebi_telegram_request_seconds", "histogram", "Bot API call latency by method.")
+metrics.describe("dokkaebi_upstream_requests_total", "counter", "UpstreamClient requests by upstream and HTTP status (error when no response arrived).")
+metrics.describe("dokkaebi_upstream_request_seconds", "histogram", "UpstreamClient request latency by upstream, retries counted separately.")
+
+class TTLCache(object):
+	"""
+	TTLCache is a thread-safe key/value cache whose entries expire
+	after a fixed number of seconds. When the cache is full the least
+	recently used entry is evicted.
+
+	Data Members:
+	self.ttl - seconds an entry stays fresh after it is set.
+	self.size - maximum number of entries kept.
+	self.entries - OrderedDict of key -> (expiry time, value), least recently used first.
+	self.hits - number of lookups answered from the cache.
+	self.misses - number of lookups that found nothing or an expired entry.
+	"""
+
+	def __init__(self, ttl = 600, size = 1024):
+		"""
+		TTLCache construction takes the time to live in seconds and the maximum entry count, for example:
+		cache = TTLCache(ttl = 600, size = 1024)
+		PRECONDITION:
+		None
+		POSTCONDITION:
+		An empty cache is constructed.
+		"""
+		self.ttl = ttl
+		self.size = size
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.Lock()
+
+	def get(self, key):
+		"""
+		RETURNS: the cached value for key, or None if there is no fresh entry.
+		"""
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry == None or entry[0] < time.monotonic():
+				self.misses += 1
+				return None
+
+			self.entries.move_to_end(key)
+			self.hits += 1
+			return entry[1]
+
+	def set(self, key, value, ttl = None):
+		"""
+		Stores value under key for ttl seconds (self.ttl if not given),
+		evicting the least recently used entry if the cache is full.
+		"""
+		with self.lock:
+			self.entries[key] = (time.monotonic() + (self.ttl if ttl == None else ttl), value)
+			self.entries.move_to_end(key)
+			while len(self.entries) > self.size:
+				self.entries.popitem(last = False)
+
+	def getStale(self, key):
+		"""
+		RETURNS: the cached value for key even if it has expired, or None if
+		there is no entry at all (used to keep serving data while an upstream is down).
+		"""
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry == None:
+				return None
+
+			return entry[1]
+
+	def expires(self, key):
+		"""
+		RETURNS: the time.monotonic() value at which key's entry expires (in the
+		past if it already has), or None if there is no entry at all.
+		"""
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry == None:
+				return None
+
+			return entry[0]
+
+	def clear(self):
+		"""
+		Removes every entry from the cache.
+		"""
+		with self.lock:
+			self.entries.clear()
+
+	def stats(self):
+		"""
+		RETURNS: dictionary with the entry count and hit/miss counters, for example:
+		{"entries": 42, "size": 1024, "hits": 900, "misses": 58}
+		"""
+		with self.lock:
+			return {
+				"entries": len(self.entries),
+				"size": self.size,
+				"hits": self.hits,
+				"misses": self.misses
+			}
+
+class SingleFlight(object):
+	"""
+	SingleFlight collapses concurrent calls for the same key into one.
+	The first caller runs the function while the others wait for it
+	and receive the same result (or exception).
+
+	Data Members:
+	self.calls - dictionary of key -> in-flight call {"done": threading.Event, "result": ..., "error": ...}.
+	self.leader_count - number of calls that actually ran the function.
+	self.shared_count - number of calls answered by waiting on another caller.
+	"""
+
+	def __init__(self):
+		"""
+		SingleFlight construction takes no arguments, for example:
+		flights = SingleFlight()
+		PRECONDITION:
+		None
+		POSTCONDITION:
+		A SingleFlight with no calls in flight is constructed.
+		"""
+		self.calls = {}
+		self.leader_count = 0
+		self.shared_count = 0
+		self.lock = threading.Lock()
+
+	def do(self, key, function):
+		"""
+		Runs function() unless a call for the same key is already in flight,
+		in which case that call is waited on instead, for example:
+		res = flights.do(("forecast", "san diego"), lambda: requests.get(url).json())
+
+		RETURNS: the value returned by function()
+
+		PRECONDITION:
+		key is hashable.
+
+		POSTCONDITION:
+		function has run at most once for all of the concurrent callers with
+		this key. If it raised, every one of those callers raises the same exception.
+		"""
+		with self.lock:
+			call = self.calls.get(key)
+			leader = call == None
+			if leader:
+				call = {"done": threading.Event(), "result": None, "error": None}
+				self.calls[key] = call
+				self.leader_count += 1
+			else:
+				self.shared_count += 1
+
+		if not leader:
+			call["done"].wait()
+			if call["error"] != None:
+				raise call["error"]
+			return call["result"]
+
+		try:
+			call["result"] = function()
+		except Exception as e:
+			call["error"] = e
+			raise
+		finally:
+			with self.lock:
+				del self.calls[key]
+			call["done"].set()
+
+		return call["result"]
+
+	def stats(self):
+		"""
+		RETURNS: dictionary with the in-flight count and call counters, for example:
+		{"in_flight": 1, "leaders": 120, "shared": 480}
+		"""
+		with self.lock:
+			return {
+				"in_flight": len(self.calls),
+				"leaders": self.leader_count,
+				"shared": self.shared_count
+			}
+
+class UpstreamUnavailable(Exception):
+	"""
+	Raised by UpstreamClient when a request fails after its retries or
+	when the circuit breaker is open and the request was not attempted.
+	"""
+
+class CircuitBreaker(object):
+	"""
+	CircuitBreaker stops calls to an upstream service after repeated failures
+	so callers fail fast instead of tying up threads waiting on it.
+
+	States:
+	closed - calls go through, consecutive failures are counted.
+	open - calls are refused until self.reset_timeout seconds have passed.
+	half_open - one trial call is let through, its outcome closes or re-opens the breaker.
+
+	Data Members:
+	self.failure_threshold - consecutive failures that open the breaker.
+	self.reset_timeout - seconds the breaker stays open before a trial call.
+	self.state - "closed", "open" or "half_open".
+	self.failures - consecutive failures counted while closed.
+	self.opened_at - time.monotonic() when the breaker last opened.
+	self.rejected_count - number of calls refused while open.
+	"""
+
+	def __init__(self, failure_threshold = 5, reset_timeout = 30):
+		"""
+		CircuitBreaker construction takes the failure count that opens it and the
+		seconds it stays open, for example:
+		breaker = CircuitBreaker(failure_threshold = 5, reset_timeout = 30)
+		PRECONDITION:
+		None
+		POSTCONDITION:
+		A closed breaker is constructed.
+		"""
+		self.failure_threshold = failure_threshold
+		self.reset_timeout = reset_timeout
+		self.state = "closed"
+		self.failures = 0
+		self.opened_at = 0
+		self.trial_in_flight = False
+		self.rejected_count = 0
+		self.lock = threading.Lock()
+
+	def allow(self):
+		"""
+		RETURNS: boolean True if a call may be made now.
+		"""
+		with self.lock:
+			if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+				self.state = "half_open"
+				self.trial_in_flight = False
+
+			if self.state == "closed":
+				return True
+
+			if self.state == "half_open" and not self.trial_in_flight:
+				self.trial_in_flight = True
+				return True
+
+			self.rejected_count += 1
+			return False
+
+	def success(self):
+		"""
+		Records a successful call, closing the breaker.
+		"""
+		with self.lock:
+			self.state = "closed"
+			self.failures = 0
+			self.trial_in_flight = False
+
+	def failure(self):
+		"""
+		Records a failed call, opening the breaker after self.failure_threshold
+		consecutive failures or after a failed trial call.
+		"""
+		with self.lock:
+			self.failures += 1
+			self.trial_in_flight = False
+			if self.state == "half_open" or self.failures >= self.failure_threshold:
+				if self.state != "open":
+					log.warning("Circuit breaker opened", extra = {"failures": self.failures})
+				self.state = "open"
+				self.opened_at = time.monotonic()
+
+	def stats(self):
+		"""
+		RETURNS: dictionary with the breaker state, for example:
+		{"state": "open", "failures": 5, "rejected": 12, "retry_in": 17.5}
+		"""
+		with self.lock:
+			retry_in = 0
+			if self.state == "open":
+				retry_in = max(0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+			return {
+				"state": self.state,
+				"failures": self.failures,
+				"rejected": self.rejected_count,
+				"retry_in": retry_in
+			}
+
+class UpstreamClient(object):
+	"""
+	UpstreamClient makes json GET requests to a third party HTTP API with a
+	pooled session, per-call timeouts, jittered exponential backoff on 5xx and
+	429 responses, and a CircuitBreaker that fails fast while the API is down.
+
+	Data Members:
+	self.session - pooled requests.Session.
+	self.timeout - (connect, read) timeout tuple in seconds for each attempt.
+	self.retries - extra attempts made after a failed one.
+	self.backoff - base delay in seconds, doubled on every retry.
+	self.max_backoff - longest delay in seconds between attempts.
+	self.breaker - CircuitBreaker guarding the API.
+	self.name - upstream label of the client's requests in metrics.
+	self.request_count - number of HTTP requests made.
+	self.retry_count - number of those requests that were retries.
+	"""
+
+	def __init__(self, timeout = (3, 10), retries = 2, backoff = 0.5, max_backoff = 8, breaker = None, pool_maxsize = 10, name = "upstream"):
+		"""
+		UpstreamClient construction takes the timeouts and retry policy, for example:
+		client = UpstreamClient(timeout = (3, 10), retries = 2, breaker = CircuitBreaker(), name = "openweather")
+		PRECONDITION:
+		None
+		POSTCONDITION:
+		A client with its own connection pool is constructed.
+		"""
+		self.session = requests.Session()
+		adapter = HTTPAdapter(pool_maxsize = pool_maxsize)
+		self.session.mount("https://", adapter)
+		self.session.mount("http://", adapter)
+		self.timeout = timeout
+		self.retries = retries
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+		self.breaker = breaker if breaker != None else CircuitBreaker()
+		self.name = name
+		self.request_count = 0
+		self.retry_count = 0
+		self.lock = threading.Lock()
+
+	def getJson(self, url, **kwargs):
+		"""
+		Makes a GET request and decodes the json body.
+
+		RETURNS: json object
+
+		PRECONDITION:
+		None
+
+		POSTCONDITION:
+		The decoded body of the first response that is not a 5xx or 429 is returned
+		(4xx bodies included, the API answered). Connection errors, timeouts, 5xx and 429
+		responses are retried after a randomized, doubling delay (or the Retry-After
+		header). UpstreamUnavailable is raised when every attempt failed or when the
+		breaker is open and no request was made.
+		"""
+		if not self.breaker.allow():
+			raise UpstreamUnavailable("circuit breaker is open for " + url.split("?")[0])
+
+		kwargs.setdefault("timeout", self.timeout)
+		error = None
+		for attempt in range(0, self.retries + 1):
+			if attempt > 0:
+				with self.lock:
+					self.retry_count += 1
+				time.sleep(self.retryDelay(attempt, error))
+
+			with self.lock:
+				self.request_count += 1
+			started = time.perf_counter()
+			try:
+				r = self.session.get(url, **kwargs)
+			except requests.exceptions.RequestException as e:
+				self.record("error", time.perf_counter() - started)
+				error = e
+				continue
+
+			self.record(r.status_code, time.perf_counter() - started)
+
+			if r.status_code >= 500 or r.status_code == 429:
+				error = r
+				continue
+
+			try:
+				res = r.json()
+			except ValueError as e:
+				error = e
+				continue
+
+			self.breaker.success()
+			return res
+
+		self.breaker.failure()
+		if isinstance(error, requests.Response):
+			raise UpstreamUnavailable("{} answered {}".format(url.split("?")[0], error.status_code))
+
+		#requests repeats the whole url (api keys included) in its
+		#messages, so only the kind of failure is passed on
+		raise UpstreamUnavailable("{} failed: {}".format(url.split("?")[0], type(error).__name__))
+
+	def record(self, status, elapsed):
+		"""
+		Adds a request's status and latency in seconds to the metrics registry.
+		"""
+		metrics.inc("dokkaebi_upstream_requests_total", {"upstream": self.name, "status": status})
+		metrics.observe("dokkaebi_upstream_request_seconds", elapsed, {"upstream": self.name})
+
+	def retryDelay(self, attempt, error):
+		"""
+		RETURNS: float seconds to wait before the given retry attempt - the Retry-After header
+		of a 429/503 response if there was one, otherwise a random delay up to backoff * 2^(attempt - 1).
+		"""
+		if isinstance(error, requests.Response) and error.headers.get("Retry-After", "").isdigit():
+			return min(self.max_backoff, int(error.headers["Retry-After"]))
+
+		return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+	def stats(self):
+		"""
+		RETURNS: dictionary with the request counters and breaker state, for example:
+		{"requests": 1200, "retries": 14, "breaker": {"state": "closed", ...}}
+		"""
+		with self.lock:
+			return {
+				"requests": self.request_count,
+				"retries": self.retry_count,
+				"breaker": self.breaker.stats()
+			}
+
+class TokenBucket(object):
+	"""
+	TokenBucket paces events to a steady rate while allowing short bursts.
+	Callers reserve a token and are told how long to wait for it, so
+	callers queue up in the order they arrived instead of being dropped.
+
+	Data Members:
+	self.rate - tokens added per second.
+	self.burst - maximum number of tokens that can be saved up.
+	self.tokens - tokens currently available, negative when callers are waiting.
+	self.updated - time.monotonic() of the last refill.
+	"""
+
+	def __init__(self, rate, burst = 1):
+		"""
+		TokenBucket construction takes the rate in tokens per second and the burst size, for example:
+		bucket = TokenBucket(30, burst = 30)
+		PRECONDITION:
+		rate is greater than zero.
+		POSTCONDITION:
+		A full bucket is constructed.
+		"""
+		self.rate = float(rate)
+		self.burst = float(burst)
+		self.tokens = float(burst)
+		self.updated = time.monotonic()
+
+	def refill(self, now):
+		"""
+		Adds the tokens earned since the last refill, up to self.burst.
+		"""
+		self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+
+	def reserve(self, now):
+		"""
+		Takes a token, going into debt if none are left.
+
+		RETURNS: float seconds the caller has to wait before using its token.
+		"""
+		self.refill(now)
+		self.tokens -= 1
+		if self.tokens >= 0:
+			return 0.0
+
+		return -self.tokens / self.rate
+
+	def pause(self, now, seconds):
+		"""
+		Empties the bucket so the next token is not available for another
+		seconds from now (used to honor retry_after).
+		"""
+		self.refill(now)
+		self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+class RateLimiter(object):
+	"""
+	RateLimiter schedules outgoing messages against a global token bucket
+	and one token bucket per chat, matching Telegram's limits of about
+	30 messages per second overall and 1 message per second per chat.
+
+	Data Members:
+	self.global_bucket - TokenBucket shared by every chat.
+	self.chat_buckets - OrderedDict of chat_id -> TokenBucket, least recently used first.
+	self.chat_rate - messages per second allowed in a single chat.
+	self.chat_burst - messages a single chat may send back to back.
+	self.max_chats - number of per-chat buckets kept before the least recently used is dropped.
+	self.delayed_count - number of messages that had to wait for a token.
+	self.throttled_count - number of 429 responses received from Telegram.
+	"""
+
+	def __init__(self, global_rate = 30, global_burst = 30, chat_rate = 1, chat_burst = 1, max_chats = 10000):
+		"""
+		RateLimiter construction takes the global and per-chat rates in messages per second
+		and their burst sizes, for example:
+		limiter = RateLimiter(global_rate = 30, chat_rate = 1)
+		PRECONDITION:
+		Rates are greater than zero.
+		POSTCONDITION:
+		A RateLimiter with a full global bucket and no chat buckets is constructed.
+		"""
+		self.global_bucket = TokenBucket(global_rate, global_burst)
+		self.chat_buckets = OrderedDict()
+		self.chat_rate = chat_rate
+		self.chat_burst = chat_burst
+		self.max_chats = max_chats
+		self.delayed_count = 0
+		self.throttled_count = 0
+		self.lock = threading.Lock()
+
+	def chatBucket(self, chat_id):
+		"""
+		RETURNS: the TokenBucket for chat_id, creating it if needed (call with self.lock held).
+		"""
+		bucket = self.chat_buckets.get(chat_id)
+		if bucket == None:
+			bucket = TokenBucket(self.chat_rate, self.chat_burst)
+			self.chat_buckets[chat_id] = bucket
+			while len(self.chat_buckets) > self.max_chats:
+				self.chat_buckets.popitem(last = False)
+		else:
+			self.chat_buckets.move_to_end(chat_id)
+
+		return bucket
+
+	def reserve(self, chat_id = None):
+		"""
+		Reserves a slot for one message to chat_id (or a message not tied to a chat).
+
+		RETURNS: float seconds the caller has to wait before sending.
+		"""
+		with self.lock:
+			now = time.monotonic()
+			wait = self.global_bucket.reserve(now)
+			if chat_id != None:
+				wait = max(wait, self.chatBucket(chat_id).reserve(now))
+
+			if wait > 0:
+				self.delayed_count += 1
+
+			return wait
+
+	def backoff(self, chat_id, seconds):
+		"""
+		Holds back further messages to chat_id (or every chat when chat_id is None)
+		for the given number of seconds, as asked by a 429 response's retry_after.
+		"""
+		with self.lock:
+			now = time.monotonic()
+			self.throttled_count += 1
+			if chat_id != None:
+				self.chatBucket(chat_id).pause(now, seconds)
+			else:
+				self.global_bucket.pause(now, seconds)
+
+	def stats(self):
+		"""
+		RETURNS: dictionary with the limiter counters, for example:
+		{"chats": 120, "delayed": 35, "throttled": 0}
+		"""
+		with self.lock:
+			return {
+				"chats": len(self.chat_buckets),
+				"delayed": self.delayed_count,
+				"throttled": self.throttled_count
+			}
+
+class UpdateQueue(object):
+	"""
+	UpdateQueue is a bounded in-process work queue that hands
+	Telegram updates off to a pool of worker threads so the
+	webhook can be acknowledged before the update is handled.
+
+	Data Members:
+	self.handler - function called with each update's json data by the workers.
+	self.updates - bounded queue.Queue of pending updates.
+	self.workers - list of worker threads.
+	self.put_timeout - seconds to wait for room in a full queue before rejecting an update.
+	self.processed_count - number of updates handled by the workers.
+	self.rejected_count - number of updates rejected because the queue stayed full.
+	self.failed_count - number of updates whose handler raised an exception.
+	self.max_depth - largest number of pending updates seen.
+	"""
+
+	def __init__(self, handler, workers = 4, size = 100, put_timeout = 1):
+		"""
+		UpdateQueue construction requires the function that handles an update,
+		the worker thread count, the maximum number of pending updates and the
+		time in seconds to wait for room before an update is rejected, for example:
+		q = UpdateQueue(self.handleData, workers = 4, size = 100, put_timeout = 1)
+		PRECONDITION:
+		None
+		POSTCONDITION:
+		The queue is constructed and its worker threads are running.
+		"""
+		self.handler = handler
+		self.updates = queue.Queue(maxsize = size)
+		self.put_timeout = put_timeout
+		self.processed_count = 0
+		self.rejected_count = 0
+		self.failed_count = 0
+		self.max_depth = 0
+		self.stopped = False
+		self.lock = threading.Lock()
+
+		self.workers = []
+		for i in range(0, workers):
+			worker = threading.Thread(target = self.work, name = "dokkaebi-worker-{}".format(i), daemon = True)
+			worker.start()
+			self.workers.append(worker)
+
+	def put(self, data, wait = False):
+		"""
+		Queues an update for the workers, waiting up to self.put_timeout
+		seconds when the queue is full, or for as long as it takes when
+		wait is True.
+
+		RETURNS: boolean
+
+		PRECONDITION:
+		The UpdateQueue has been constructed.
+
+		POSTCONDITION:
+		True is returned if the update was queued. If the queue stayed full
+		the update is dropped, self.rejected_count is incremented and False is returned.
+		"""
+		try:
+			if wait:
+				self.updates.put(data)
+			else:
+				self.updates.put(data, timeout = self.put_timeout)
+		except queue.Full:
+			with self.lock:
+				self.rejected_count += 1
+			return False
+
+		with self.lock:
+			self.max_depth = max(self.max_depth, self.updates.qsize())
+
+		return True
+
+	def work(self):
+		"""
+		Worker thread loop - takes updates off of the queue and passes them to
+		self.handler until a None update is received (see stop).
+		"""
+		while True:
+			data = self.updates.get()
+			if data is None:
+				self.updates.task_done()
+				return
+
+			try:
+				self.handler(data)
+				with self.lock:
+					self.processed_count += 1
+			except Exception:
+				with self.lock:
+					self.failed_count += 1
+				log.exception("Update could not be handled")
+			finally:
+				self.updates.task_done()
+
+	def depth(self):
+		"""
+		RETURNS: int number of updates waiting to be handled.
+		"""
+		return self.updates.qsize()
+
+	def stats(self):
+		"""
+		RETURNS: dictionary with the queue depth and counters, for example:
+		{"depth": 0, "max_depth": 12, "size": 100, "workers": 4, "processed": 310, "rejected": 0, "failed": 1}
+		"""
+		with self.lock:
+			return {
+				"depth": self.updates.qsize(),
+				"max_depth": self.max_depth,
+				"size": self.updates.maxsize,
+				"workers": len(self.workers),
+				"processed": self.processed_count,
+				"rejected": self.rejected_count,
+				"failed": self.failed_count
+			}
+
+	def stop(self, timeout = None):
+		"""
+		Lets the workers finish the pending updates and then stops them,
+		waiting at most timeout seconds in all (None waits as long as it takes).
+		Calling it again after the workers were stopped does nothing.
+
+		RETURNS: boolean True if every worker finished in time.
+
+		PRECONDITION:
+		No more updates are being put on the queue.
+
+		POSTCONDITION:
+		The workers have exited, or are still finishing when False is returned.
+		"""
+		with self.lock:
+			if self.stopped:
+				return True
+			self.stopped = True
+
+		deadline = None if timeout == None else time.monotonic() + timeout
+		for worker in self.workers:
+			try:
+				self.updates.put(None, timeout = None if deadline == None else max(0, deadline - time.monotonic()))
+			except queue.Full:
+				break
+
+		for worker in self.workers:
+			worker.join(None if deadline == None else max(0, deadline - time.monotonic()))
+
+		return not any(worker.is_alive() for worker in self.workers)
+
+class SeenUpdates(object):
+	"""
+	SeenUpdates remembers the update_ids handled in the last window seconds
+	so updates Telegram delivers again (after a slow or failed webhook answer)
+	are dropped instead of being handled twice.
+
+	The ids are kept in a fixed size ring buffer with a dictionary index, so
+	memory stays bounded no matter how many updates arrive: the oldest id is
+	overwritten once size ids are stored, and ids older than window no longer count.
+	For several processes sharing one bot, a store shared between them can be
+	given. It needs a redis-py style set(key, value, nx = True, ex = seconds) that
+	returns a true value only when the key was not set yet, and delete(key) (a
+	redis.Redis connection works as is).
+
+	Data Members:
+	self.window - seconds an update_id is remembered.
+	self.size - maximum number of update_ids remembered in process.
+	self.store - shared store or None.
+	self.dropped_count - number of duplicate updates dropped.
+	"""
+
+	def __init__(self, window = 600, size = 4096, store = None):
+		"""
+		SeenUpdates construction takes the window in seconds, the size of the
+		ring buffer and an optional shared store, for example:
+		seen = SeenUpdates(window = 600, size = 4096)
+		PRECONDITION:
+		size is at least 1.
+		POSTCONDITION:
+		An empty SeenUpdates is constructed.
+		"""
+		self.window = window
+		self.size = size
+		self.store = store
+		self.ids = [None] * size
+		self.times = [0.0] * size
+		self.slots = {}
+		self.next = 0
+		self.dropped_count = 0
+		self.lock = threading.Lock()
+
+	def check(self, update_id):
+		"""
+		Records update_id as seen.
+
+		RETURNS: boolean True if update_id was already seen within the window (a duplicate).
+
+		PRECONDITION:
+		None
+
+		POSTCONDITION:
+		update_id is remembered for self.window seconds, duplicates add to self.dropped_count.
+		"""
+		if self.store != None:
+			duplicate = not self.store.set("dokkaebi:update:" + str(update_id), 1, nx = True, ex = int(self.window))
+		else:
+			now = time.monotonic()
+			with self.lock:
+				slot = self.slots.get(update_id)
+				duplicate = slot != None and now - self.times[slot] < self.window
+				if slot == None:
+					slot = self.next
+					self.next = (self.next + 1) % self.size
+					old = self.ids[slot]
+					if old != None and self.slots.get(old) == slot:
+						del self.slots[old]
+					self.ids[slot] = update_id
+					self.slots[update_id] = slot
+
+				if not duplicate:
+					self.times[slot] = now
+
+		if duplicate:
+			with self.lock:
+				self.dropped_count += 1
+
+		return duplicate
+
+	def forget(self, update_id):
+		"""
+		Forgets update_id, so a delivery that could not be handled is accepted when Telegram sends it again.
+		"""
+		if self.store != None:
+			self.store.delete("dokkaebi:update:" + str(update_id))
+			return
+
+		with self.lock:
+			slot = self.slots.pop(update_id, None)
+			if slot != None:
+				self.ids[slot] = None
+
+	def stats(self):
+		"""
+		RETURNS: dictionary of the dropped duplicate count and the number of update_ids remembered in process.
+		"""
+		with self.lock:
+			return {"dropped": self.dropped_count, "remembered": len(self.slots), "window": self.window}
+
+def acceptedEncoding(accept_encoding, encodings = None):
+	"""
+	Picks the response compression from a request's Accept-Encoding header,
+	for example "gzip, deflate, br" or "gzip;q=1.0, br;q=0.5".
+
+	RETURNS: string "br" or "gzip", or None to send the body as it is.
+
+	PRECONDITION:
+	encodings lists the encodings to choose from, most preferred first (default content_encodings).
+
+	POSTCONDITION:
+	None
+	"""
+	if not accept_encoding:
+		return None
+
+	weights = {}
+	for part in accept_encoding.split(","):
+		name, _, parameters = part.partition(";")
+		weight = 1.0
+		parameters = parameters.strip()
+		if parameters.startswith("q="):
+			try:
+				weight = float(parameters[2:])
+			except ValueError:
+				weight = 0.0
+		weights[name.strip().lower()] = weight
+
+	best = None
+	best_weight = 0.0
+	for encoding in (content_encodings if encodings == None else encodings):
+		weight = weights.get(encoding, weights.get("*", 0.0))
+		if weight > best_weight:
+			best = encoding
+			best_weight = weight
+
+	return best
+
+def compressBody(body, encoding, fast = False):
+	"""
+	RETURNS: bytes body compressed with encoding ("br" or "gzip"), at the highest
+	level or at a cheaper level for bodies compressed while a request waits when fast is True.
+	"""
+	if encoding == "br":
+		return brotli.compress(body, quality = 5 if fast else 11)
+
+	#mtime = 0 keeps the output the same for the same body
+	#(gzip.compress only takes mtime from Python 3.8 on)
+	compressed = io.BytesIO()
+	with gzip.GzipFile(fileobj = compressed, mode = "wb", compresslevel = 6 if fast else 9, mtime = 0) as f:
+		f.write(body)
+
+	return compressed.getvalue()
+
+def isNotModified(etag, last_modified = None):
+	"""
+	RETURNS: boolean True if the current CherryPy request's If-None-Match
+	(or, without it, If-Modified-Since) header says the client has this version already.
+	"""
+	if_none_match = cherrypy.request.headers.get("If-None-Match")
+	if if_none_match != None:
+		tags = [t.strip().replace("W/", "", 1) for t in if_none_match.split(",")]
+		return etag in tags or "*" in tags
+
+	return last_modified != None and cherrypy.request.headers.get("If-Modified-Since") == last_modified
+
+def sendBody(body, etag, last_modified = None, encoded = None):
+	"""
+	Answers the current CherryPy request with body, compressed as the client's
+	Accept-Encoding allows, or with a 304 when the client's copy is current. Each
+	compressed form gets its own ETag (the etag with -gzip or -br added).
+
+	page = {"body": body, "etag": "\"" + hashlib.sha1(body).hexdigest() + "\"", "encoded": {}}
+	return dokkaebi.sendBody(page["body"], page["etag"], encoded = page["encoded"])
+
+	RETURNS: bytes to return from the exposed method.
+
+	PRECONDITION:
+	encoded is a dictionary kept with the body mapping encodings to compressed bytes
+	(None when compressing did not make it smaller), or None to never compress the body.
+
+	POSTCONDITION:
+	ETag, Last-Modified, Vary and Content-Encoding are set on cherrypy.response.
+	Encodings missing from encoded are compressed now and added to it.
+	"""
+	headers = cherrypy.response.headers
+	encoding = None
+	if encoded != None:
+		headers["Vary"] = "Accept-Encoding"
+		encoding = acceptedEncoding(cherrypy.request.headers.get("Accept-Encoding"))
+		if encoding != None and encoding not in encoded:
+			#first request for this encoding pays for it, a few
+			#concurrent ones may both compress (mtime 0 makes the
+			#output identical) and the last store wins
+			compressed = compressBody(body, encoding, fast = True)
+			encoded[encoding] = compressed if len(compressed) < len(body) else None
+		if encoding != None and encoded[encoding] == None:
+			encoding = None
+
+	if encoding != None:
+		etag = etag[:-1] + "-" + encoding + "\""
+		body = encoded[encoding]
+		headers["Content-Encoding"] = encoding
+
+	headers["ETag"] = etag
+	if last_modified != None:
+		headers["Last-Modified"] = last_modified
+
+	if isNotModified(etag, last_modified):
+		cherrypy.response.status = 304
+		headers.pop("Content-Encoding", None)
+		return b""
+
+	return body
+
+class StaticAssets(object):
+	"""
+	StaticAssets serves a folder of static files (css, js, images) from memory.
+	Every file is read once at construction and text files are compressed with
+	gzip (and brotli when it is installed) up front, so a request never reads
+	the disk or compresses anything.
+
+	Each file also gets a content-hashed name, css/styles.css is served as
+	css/styles.0123456789ab.css as well. Hashed urls are cached by browsers
+	for a year without revalidating (Cache-Control: immutable) since a changed
+	file gets a new name; url() and rewrite() put the hashed names into pages.
+	The plain names still work and are revalidated on every use.
+
+	assets = StaticAssets("./public", prefix = "/static")
+	assets.url("css/styles.css") #/static/css/styles.0123456789ab.css
+
+	class Bot(dokkaebi.Dokkaebi):
+		@cherrypy.expose
+		def static(self, *path):
+			return assets.serve("/".join(path))
+
+	Data Members:
+	self.folder - folder the files were read from.
+	self.prefix - url path the folder is served under.
+	self.assets - dictionary of relative paths to the file's body, type, hashed name and compressed forms.
+	"""
+	#types worth compressing, images are compressed already
+	compressible = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+	def __init__(self, folder, prefix = "/static", min_size = 256, max_age = 31536000):
+		"""
+		PRECONDITION:
+		folder exists.
+		POSTCONDITION:
+		Every file below folder is loaded, files of at least min_size bytes are compressed.
+		"""
+		self.folder = folder
+		self.prefix = prefix.rstrip("/")
+		self.min_size = min_size
+		self.max_age = max_age
+		self.assets = {}
+		self.hashed = {}
+		for directory, folders, files in os.walk(folder):
+			for name in files:
+				self.add(os.path.relpath(os.path.join(directory, name), folder).replace(os.sep, "/"))
+
+	def add(self, path):
+		"""
+		Loads (or reloads) the file at path relative to self.folder.
+		"""
+		full_path = os.path.join(self.folder, path)
+		with open(full_path, "rb") as f:
+			body = f.read()
+
+		digest = hashlib.sha1(body).hexdigest()
+		base, extension = os.path.splitext(path)
+		content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+		asset = {
+			"body": body,
+			"type": content_type + (";charset=utf-8" if content_type.startswith("text/") or content_type == "application/javascript" else ""),
+			"hashed": base + "." + digest[:12] + extension,
+			"etag": "\"" + digest + "\"",
+			"last_modified": email.utils.formatdate(os.path.getmtime(full_path), usegmt = True),
+			"encoded": None
+		}
+		if content_type.startswith(self.compressible) and len(body) >= self.min_size:
+			asset["encoded"] = {}
+			for encoding in content_encodings:
+				compressed = compressBody(body, encoding)
+				asset["encoded"][encoding] = compressed if len(compressed) < len(body) else None
+
+		self.assets[path] = asset
+		self.hashed[asset["hashed"]] = path
+
+	def url(self, path):
+		"""
+		RETURNS: string content-hashed url of the file at path (relative to self.folder),
+		or its plain url if there is no such file.
+		"""
+		asset = self.assets.get(path)
+		return self.prefix + "/" + (asset["hashed"] if asset != None else path)
+
+	def rewrite(self, page):
+		"""
+		RETURNS: string page with every quoted plain url of a file ("/static/css/styles.css")
+		replaced by its content-hashed url.
+		"""
+		for path, asset in self.assets.items():
+			for quote in ["\"", "'"]:
+				page = page.replace(quote + self.prefix + "/" + path + quote, quote + self.prefix + "/" + asset["hashed"] + quote)
+
+		return page
+
+	def serve(self, path):
+		"""
+		Answers the current CherryPy request for the file at path (relative to self.folder,
+		plain or content-hashed name).
+
+		RETURNS: bytes to return from the exposed method.
+
+		PRECONDITION:
+		None
+
+		POSTCONDITION:
+		Raises cherrypy.NotFound for unknown files.
+		"""
+		name = self.hashed.get(path)
+		asset = self.assets.get(name if name != None else path)
+		if asset == None:
+			raise cherrypy.NotFound()
+
+		headers = cherrypy.response.headers
+		headers["Content-Type"] = asset["type"]
+		if name != None:
+			headers["Cache-Control"] = "public, max-age={}, immutable".format(self.max_age)
+		else:
+			headers["Cache-Control"] = "public, no-cache"
+
+		return sendBody(asset["body"], asset["etag"], asset["last_modified"], asset["encoded"])
+
 class Dokkaebi(object):
 	"""
 	Dokkaebi is a class for easily creating
@@ -12,117 +1484,853 @@ class Dokkaebi(object):
 	self.webhook_config - user-supplied dictionary with hook information (see __init__).
 	self.webhook_info - json data with information about your webhook from the Telegram API.
 	self.update_received_count - number of updates received counted since the bot was instantiated.
+	self.session - pooled keep-alive requests.Session shared by every Telegram API call (see createSession).
+	self.request_timeout - (connect, read) timeout tuple in seconds applied to every Telegram API call.
+	self.update_queue - UpdateQueue feeding updates to handleData on worker threads, None when updates are handled inline.
+	self.polling - True while the long-polling loop is running (see poll).
+	self.rate_limiter - RateLimiter pacing every message sent to a chat, None when rate limiting is off.
+	self.seen_updates - SeenUpdates dropping repeated deliveries of an update, None when de-duplication is off.
+	self.endpoints - Endpoints holding the Bot API url of every method (see the 'api_url' hook key).
+	self.commands - dictionary of "/command" and "/command@botname" -> (command name, handler) (see buildCommandTable).
+	self.command_stats - dictionary of command name -> {"count", "total_time", "max_time"} for handled commands.
+	self.file_ids - dictionary of media key (usually the url first sent) -> Telegram file_id (see sendCached).
+	self.worker - number of this worker process when there are several (see preFork), otherwise None.
 	"""
 
-	def __init__(self, hook, conf = None):
+	def __init__(self, hook, conf = None):
+		"""
+		Dokkaebi bot construction requires passing in a dictionary of the following form, for example:
+		hook = {
+			'hostname': '127.0.0.1', #optional
+			'port': 80, #optional
+			'token': 'yourtelegrambottokenhere', #required 
+			'url': 'https://yourwebhookurlhere.com', #optional
+			'environment': "CherryPy Environment value", #optional
+			'thread_pool': 10, #optional - int CherryPy threads serving requests (per process).
+			'socket_queue_size': 5, #optional - int connections the listening socket holds before refusing more.
+			'max_request_body_size': 104857600, #optional - int largest request body in bytes CherryPy accepts (updates are a few KB).
+			'processes': 1, #optional - int worker processes sharing the webhook port (see preFork).
+			'reuse_port': True, #optional - boolean give each worker its own SO_REUSEPORT socket instead of sharing one.
+			'api_url': 'https://api.telegram.org', #optional - Bot API server (a local Bot API server or a stand-in for benchmarks).
+			'pool_connections': 10, #optional - int number of per-host connection pools to cache.
+			'pool_maxsize': 10, #optional - int connections kept alive per host (size it to the CherryPy thread pool).
+			'pool_block': False, #optional - boolean wait for a free connection instead of opening a throwaway one.
+			'keep_alive': True, #optional - boolean reuse connections between requests.
+			'connect_timeout': 5, #optional - float seconds to wait for a connection to Telegram.
+			'read_timeout': 30, #optional - float seconds to wait for a response from Telegram.
+			'workers': 4, #optional - int worker threads handling updates, 0 handles them inline in the webhook request.
+			'queue_size': 100, #optional - int maximum number of updates waiting for a worker.
+			'queue_timeout': 1, #optional - float seconds the webhook waits for room in a full queue before answering 503.
+			'drain_timeout': 30, #optional - float seconds queued updates may take to finish when the bot stops (see drainUpdates).
+			'mode': 'webhook', #optional - 'polling' fetches updates with getUpdates instead of running the CherryPy webhook.
+			'poll_limit': 100, #optional - int maximum number of updates fetched per getUpdates call (1-100).
+			'poll_timeout': 30, #optional - int seconds Telegram holds a getUpdates call open waiting for updates.
+			'poll_retry': 1, #optional - float seconds to wait before polling again after a failed getUpdates call.
+			'allowed_updates': ["message"], #optional - list of update types to receive while polling.
+			'rate_limit': True, #optional - boolean pace outgoing messages to stay within Telegram's limits.
+			'global_rate': 30, #optional - float messages per second sent across all chats.
+			'chat_rate': 1, #optional - float messages per second sent to a single chat.
+			'chat_burst': 1, #optional - int messages a single chat may receive back to back.
+			'rate_retries': 3, #optional - int times a message is retried after a 429 response.
+			'file_id_store': None, #optional - path of a json file keeping Telegram file_ids across restarts (see sendCached).
+			'dedup': True, #optional - boolean drop updates Telegram delivers more than once (see SeenUpdates).
+			'dedup_window': 600, #optional - float seconds an update_id is remembered.
+			'dedup_size': 4096, #optional - int update_ids remembered in process.
+			'dedup_store': None, #optional - store shared by several bot processes, for example a redis.Redis connection.
+			'metrics': "local", #optional - serve Prometheus metrics at /metrics to True (anyone), "local" (this machine only) or False (nobody), see allowsClient.
+			'log_level': "INFO", #optional - DEBUG also logs every response body (see configureLogging).
+			'log_format': "text" #optional - "json" writes one json object per log line for log collectors.
+		}
+		d = dokkaebi.Dokkaebi(hook)
+		PRECONDITION:
+		None
+		POSTCONDITION:
+		Dokkaebi class is constructed from the given dictionary values.
+		"""
+		self.configure(hook)
+
+		if hook and hook != None and hook.get("mode") == "polling":
+			log.info("Starting Dokkaebi bot in long-polling mode... Ctrl+C to quit")
+
+			#getUpdates doesn't work while a webhook is set
+			self.deleteWebhook()
+
+			#store the bot info
+			self.bot_info = self.getMe()
+			self.buildCommandTable()
+
+			#hook for init work that
+			#needs accomplished in derived classes
+			#before polling starts
+			self.onInit()
+
+			#start handing updates off to the workers
+			self.update_queue = self.createUpdateQueue()
+
+			try:
+				self.poll()
+			except KeyboardInterrupt:
+				pass
+
+			#stopPolling or Ctrl+C, either way
+			#finish up and close the session
+			self.closeServer()
+		elif hook and hook != None and all (keys in hook for keys in ["hostname", "port", "url"]):
+			log.info("Starting Dokkaebi bot... Ctrl+C to quit")
+
+			#make sure there is no live webhook before setting it
+			self.deleteWebhook()
+
+			#store current webhook info upon setting it successfully
+			self.setWebhook()
+			self.webhook_info = self.getWebhookInfo()
+
+			#store the bot info
+			self.bot_info = self.getMe()
+			self.buildCommandTable()
+
+			#hook for init work that
+			#needs accomplished in derived classes
+			#before the server starts
+			self.onInit()
+
+			#crank up a CherryPy server, in each
+			#worker process when there are several
+			cherrypy.config.update(self.serverSettings())
+			if self.webhook_config.get("processes", 1) > 1 and self.preFork():
+				return
+
+			#start handing updates off to the workers
+			self.update_queue = self.createUpdateQueue()
+			#Telegram was already answered for the queued updates, so they
+			#are handled before the process exits (the priority runs this
+			#after the HTTP server stopped taking new ones)
+			cherrypy.engine.subscribe("stop", self.drainUpdates, priority = 60)
+
+			log.info("Running CherryPy", extra = {"version": cherrypy.__version__})
+			cherrypy.quickstart(self, '/', self.serverConfig(conf))
+		else:
+			log.info("Dokkaebi bot initializing without CherryPy...")
+
+			#store the bot info
+			self.bot_info = self.getMe()
+			self.buildCommandTable()
+
+			#hook for init work that
+			#needs accomplished in derived classes
+			#before the server starts
+			self.onInit()
+
+			#start handing updates off to the workers
+			self.update_queue = self.createUpdateQueue()
+
+			log.info("Dokkaebi initialized successfully.")
+
+	#Bot API methods whose urls are ready before the first call
+	common_methods = [
+		"getMe", "getUpdates", "setWebhook", "deleteWebhook", "getWebhookInfo",
+		"sendMessage", "sendPhoto", "sendAnimation", "sendChatAction", "setMyCommands", "getMyCommands"
+	]
+
+	def configure(self, hook):
+		"""
+		Sets up the data members shared by Dokkaebi and AsyncDokkaebi from the
+		hook dictionary (see __init__) without contacting Telegram.
+
+		PRECONDITION:
+		None
+
+		POSTCONDITION:
+		The session, timeouts and rate limiter are ready for API calls.
+		"""
+		self.webhook_config = hook
+		if not log.handlers:
+			configureLogging(self.webhook_config.get("log_level", "INFO"), self.webhook_config.get("log_format", "text"))
+
+		self.endpoints = Endpoints(
+			self.webhook_config.get("api_url", "https://api.telegram.org"),
+			self.webhook_config.get("token", ""),
+			self.common_methods
+		)
+		self.update_received_count = 0
+		self.update_lock = threading.Lock()
+		self.update_queue = None
+		self.polling = False
+		self.worker = None
+		self.commands = {}
+		self.command_stats = {}
+		self.command_lock = threading.Lock()
+		self.file_id_lock = threading.Lock()
+		self.file_ids = self.loadFileIds()
+
+		#every Telegram API call shares this
+		#session so connections are reused
+		self.session = self.createSession()
+		self.request_timeout = (
+			self.webhook_config.get("connect_timeout", 5),
+			self.webhook_config.get("read_timeout", 30)
+		)
+
+		#Telegram delivers an update again when the webhook
+		#answers slowly, those repeats are dropped here
+		self.seen_updates = None
+		if self.webhook_config.get("dedup", True):
+			self.seen_updates = SeenUpdates(
+				window = self.webhook_config.get("dedup_window", 600),
+				size = self.webhook_config.get("dedup_size", 4096),
+				store = self.webhook_config.get("dedup_store")
+			)
+
+		#every message to a chat waits its turn here
+		self.rate_limiter = None
+		if self.webhook_config.get("rate_limit", True):
+			self.rate_limiter = RateLimiter(
+				#worker processes (see preFork) share the global limit
+				global_rate = self.webhook_config.get("global_rate", 30) / self.webhook_config.get("processes", 1),
+				global_burst = max(1, self.webhook_config.get("global_rate", 30) // self.webhook_config.get("processes", 1)),
+				chat_rate = self.webhook_config.get("chat_rate", 1),
+				chat_burst = self.webhook_config.get("chat_burst", 1)
+			)
+
+	@cherrypy.expose
+	@cherrypy.tools.json_in()
+	def index(self):
+		"""
+		Handles all of the update logic for the Dokkaebi bot.
+		Because this varies wildy depending on the application,
+		simply calling a user-defined function was the easiest
+		way of handling the issue. The caller must inherit from
+		Dokkaebi and override the handleData(data) function to
+		implement their own update logic:
+
+		class Bot(dokkaebi.Dokkaebi):
+			#overridden function...
+			def handleData(data):
+				print("do some stuff with the update data...")
+
+		This enables the user to hook into the CherryPy server
+		listening at the webhook base url and customize the
+		update logic.
+
+		PRECONDITION:
+		A Telegram bot has been created and the Dokkaebi instance has been constructed.
+
+		POSTCONDITION:
+		Requests are received on the assigned port at the webhook url provided.
+		Additionally, processing of the updates is passed on to self.handleData(data)
+		which is implemented in the user-defined override outside of this class.
+		When worker threads are configured (see __init__) the update is queued and
+		the request is acknowledged right away. If the queue stays full, a 503 is
+		returned so Telegram delivers the update again later.
+		"""
+		data = cherrypy.request.json
+
+		if not self.dispatchUpdate(data):
+			raise cherrypy.HTTPError(503, "Update queue is full")
+
+	@cherrypy.expose
+	def metrics(self):
+		"""
+		Serves the metrics registry and the current gauges (see gauges) in the
+		Prometheus text format at /metrics, so the bot can be scraped like:
+
+		scrape_configs:
+		  - job_name: "dokkaebi"
+		    static_configs:
+		      - targets: ["yourhostname:port"]
+
+		Only clients on the bot's own machine are answered unless 'metrics' is set to
+		True in the hook dictionary, False turns the endpoint off (see allowsClient).
+
+		RETURNS: string
+		"""
+		if not allowsClient(self.webhook_config.get("metrics", "local"), cherrypy.request.remote.ip):
+			raise cherrypy.NotFound()
+
+		cherrypy.response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+		return metrics.render(self.gauges())
+
+	def gauges(self):
+		"""
+		Override this method (and add to the list it returns) to export more values
+		when /metrics is scraped, for example cache statistics kept by the bot.
+
+		RETURNS: list of (name, type, help, [(labels dictionary, value), ...]) families (see Metrics.render).
+		"""
+		families = [
+			("dokkaebi_updates_received", "gauge", "Updates received since the bot started (update_received_count).", [({}, self.update_received_count)]),
+			("dokkaebi_file_ids", "gauge", "Telegram file_ids remembered for sendCached.", [({}, len(self.file_ids))])
+		]
+
+		if self.update_queue != None:
+			stats = self.update_queue.stats()
+			families += [
+				("dokkaebi_update_queue_depth", "gauge", "Updates waiting for a worker.", [({}, stats["depth"])]),
+				("dokkaebi_update_queue_max_depth", "gauge", "Most updates that have been waiting for a worker at once.", [({}, stats["max_depth"])]),
+				("dokkaebi_update_queue_size", "gauge", "Updates the queue holds before the webhook answers 503.", [({}, stats["size"])]),
+				("dokkaebi_update_queue_processed_total", "counter", "Updates handled by the workers.", [({}, stats["processed"])]),
+				("dokkaebi_update_queue_failed_total", "counter", "Updates whose handler raised an exception.", [({}, stats["failed"])])
+			]
+
+		if self.seen_updates != None:
+			families.append(("dokkaebi_duplicate_updates_dropped_total", "counter", "Repeated deliveries of an update that were dropped.", [({}, self.seen_updates.stats()["dropped"])]))
+
+		if self.rate_limiter != None:
+			stats = self.rate_limiter.stats()
+			families += [
+				("dokkaebi_rate_limited_chats", "gauge", "Chats with a message pacing bucket.", [({}, stats["chats"])]),
+				("dokkaebi_rate_limit_delayed_total", "counter", "Messages that waited for the rate limiter.", [({}, stats["delayed"])]),
+				("dokkaebi_rate_limit_throttled_total", "counter", "429 responses received from Telegram.", [({}, stats["throttled"])])
+			]
+
+		return families
+
+	def dispatchUpdate(self, data, wait = False):
+		"""
+		Passes an update from the webhook or the polling loop on to self.handleData,
+		either through the worker queue or inline when no workers are configured.
+
+		RETURNS: boolean
+
+		PRECONDITION:
+		The Dokkaebi instance has been constructed.
+
+		POSTCONDITION:
+		True is returned if the update was handled, queued or dropped as a duplicate
+		(see isDuplicate). False is returned if the queue stayed full (see UpdateQueue.put).
+		When wait is True the call blocks until there is room in the queue instead.
+		"""
+		if self.isDuplicate(data):
+			self.recordUpdate("duplicate")
+			return True
+
+		if self.update_queue == None:
+			#callback to a user-defined function
+			#for handling updates
+			try:
+				self.handleData(data)
+			except Exception:
+				#the request fails and Telegram delivers
+				#the update again, let that delivery through
+				self.forgetUpdate(data)
+				raise
+
+			self.recordUpdate("handled")
+			return True
+
+		if not self.update_queue.put(data, wait):
+			#let Telegram's next delivery through
+			self.forgetUpdate(data)
+			self.recordUpdate("rejected")
+			return False
+
+		self.recordUpdate("queued")
+		return True
+
+	def recordUpdate(self, result):
+		"""
+		Counts a received update in self.update_received_count and in the metrics
+		registry by result (handled, queued, duplicate or rejected).
+		"""
+		with self.update_lock:
+			self.update_received_count += 1
+
+		metrics.inc("dokkaebi_updates_total", {"result": result})
+
+	def isDuplicate(self, data):
+		"""
+		RETURNS: boolean True if the update's update_id was already seen (see SeenUpdates).
+		"""
+		if self.seen_updates == None or not isinstance(data, dict) or "update_id" not in data:
+			return False
+
+		return self.seen_updates.check(data["update_id"])
+
+	def forgetUpdate(self, data):
+		"""
+		Forgets an update that could not be handled so it is accepted when Telegram delivers it again.
+		"""
+		if self.seen_updates != None and isinstance(data, dict) and "update_id" in data:
+			self.seen_updates.forget(data["update_id"])
+
+	def poll(self):
+		"""
+		Long-polls Telegram with getUpdates and dispatches every update received
+		to the worker queue, as an alternative to the CherryPy webhook (see 'mode' in __init__).
+		The limit, timeout and allowed update types are read from the hook dictionary.
+
+		PRECONDITION:
+		A Telegram bot has been created, the Dokkaebi instance has been constructed
+		and no webhook is set.
+
+		POSTCONDITION:
+		Updates are fetched and dispatched in batches until stopPolling is called.
+		The offset sent with each call confirms the updates dispatched so far with
+		Telegram so they are not delivered again, including an update whose handler
+		raised (it is logged and skipped). Failed calls and malformed answers are
+		retried after 'poll_retry' seconds. Once polling stops, the updates already
+		queued are handled before poll returns (see drainUpdates).
+		"""
+		update_data = {
+			"offset": None,
+			"limit": self.webhook_config.get("poll_limit", 100),
+			"timeout": self.webhook_config.get("poll_timeout", 30)
+		}
+		if "allowed_updates" in self.webhook_config:
+			update_data["allowed_updates"] = json.dumps(self.webhook_config["allowed_updates"])
+
+		retry = self.webhook_config.get("poll_retry", 1)
+
+		self.polling = True
+		try:
+			while self.polling:
+				try:
+					r = self.getUpdates(update_data)
+				except requests.exceptions.RequestException as e:
+					log.warning("Polling request failed", extra = {"error": str(e)})
+					time.sleep(retry)
+					continue
+
+				if(r.status_code != 200):
+					time.sleep(retry)
+					continue
+
+				try:
+					updates = r.json()["result"]
+				except (ValueError, KeyError, TypeError) as e:
+					log.warning("Polling answer could not be read", extra = {"error": str(e)})
+					time.sleep(retry)
+					continue
+
+				for update in updates:
+					try:
+						#wait for the workers rather than drop anything,
+						#the next getUpdates call simply starts later
+						self.dispatchUpdate(update, wait = True)
+					except Exception:
+						#handled inline (no workers) and failed, skip it
+						#rather than stop polling on it again and again
+						log.exception("Update could not be handled")
+
+					update_data["offset"] = update["update_id"] + 1
+		finally:
+			self.drainUpdates()
+
+	def stopPolling(self):
+		"""
+		Stops the long-polling loop after the getUpdates call in progress returns.
+		"""
+		self.polling = False
+
+	def drainUpdates(self):
+		"""
+		Lets the update workers finish the updates already queued, waiting at most
+		'drain_timeout' seconds. Telegram was answered 200 for those updates and won't
+		deliver them again. The webhook server runs this when CherryPy's engine stops.
+
+		PRECONDITION:
+		No more updates are being dispatched.
+
+		POSTCONDITION:
+		The update workers have stopped, or a warning is logged for those still busy.
+		"""
+		if self.update_queue == None:
+			return
+
+		if not self.update_queue.stop(self.webhook_config.get("drain_timeout", 30)):
+			log.warning("Update workers did not finish before the drain timeout", extra = self.update_queue.stats())
+
+	def createUpdateQueue(self):
+		"""
+		Creates the UpdateQueue that hands updates to self.handleData on worker threads.
+		The worker count and queue size are read from the hook dictionary (see __init__).
+
+		RETURNS: UpdateQueue or None
+
+		PRECONDITION:
+		self.webhook_config has been assigned.
+
+		POSTCONDITION:
+		The queue is returned with its workers running, or None is returned
+		when 'workers' is 0 and updates are handled inline.
+		"""
+		workers = self.webhook_config.get("workers", 4)
+		if workers <= 0:
+			return None
+
+		return UpdateQueue(
+			self.handleData,
+			workers = workers,
+			size = self.webhook_config.get("queue_size", 100),
+			put_timeout = self.webhook_config.get("queue_timeout", 1)
+		)
+
+	def onInit(self):
+		"""
+		Override this method to hook into the constructor and
+		handle tasks that need to be handled upon construction
+		of the Dokkaebi class.
+		"""
+
+	def handleData(self, data):
+		"""
+		Override this method to hook into the update method and
+		handle json data retrieved from Telegram webhook request.
+		By default, messages are dispatched to the methods registered
+		with the @command decorator (see dispatchCommand).
+		"""
+		self.dispatchCommand(data)
+
+	def buildCommandTable(self):
+		"""
+		Collects the methods registered with the @command decorator into self.commands,
+		keyed by both "/command" and "/command@botname" so a message's command is found
+		with a single dictionary lookup.
+
+		PRECONDITION:
+		self.bot_info has been retrieved with getMe.
+
+		POSTCONDITION:
+		self.commands maps every registered command spelling to its (command name, handler).
+		"""
+		username = None
+		if isinstance(self.bot_info, dict):
+			username = self.bot_info.get("username")
+
+		commands = {}
+		for name in dir(type(self)):
+			names = getattr(getattr(type(self), name), "dokkaebi_commands", None)
+			if not names:
+				continue
+
+			handler = getattr(self, name)
+			for c in names:
+				commands["/" + c] = (c, handler)
+				if username != None:
+					commands["/" + c + "@" + username] = (c, handler)
+
+		self.commands = commands
+
+	def parseCommand(self, text):
+		"""
+		Splits message text into the command and the rest of the text in one pass, for example:
+		"/cityweather San Diego, CA" -> ("/cityweather", "San Diego, CA")
+
+		RETURNS: tuple of (command, arguments)
 		"""
-		Dokkaebi bot construction requires passing in a dictionary of the following form, for example:
-		hook = {
-			'hostname': '127.0.0.1', #optional
-			'port': 80, #optional
-			'token': 'yourtelegrambottokenhere', #required 
-			'url': 'https://yourwebhookurlhere.com', #optional
-			'environment': "CherryPy Environment value" #optional
-		}
-		d = dokkaebi.Dokkaebi(hook)
+		command, separator, arguments = text.partition(" ")
+		return command, arguments.strip()
+
+	def findCommand(self, data):
+		"""
+		Looks up the handler for the command in an update's message.
+
+		RETURNS: tuple of (command name, handler, message json object, arguments), or None if
+		the update is not a message starting with a registered command.
+		"""
+		message = data.get("message")
+		if message == None or "text" not in message:
+			return None
+
+		command, arguments = self.parseCommand(message["text"])
+		entry = self.commands.get(command)
+		if entry == None:
+			return None
+
+		return entry[0], entry[1], message, arguments
+
+	def dispatchCommand(self, data):
+		"""
+		Calls the handler registered for the command in the update, timing it (see recordCommand).
+
+		RETURNS: boolean True if a handler was called.
+		"""
+		found = self.findCommand(data)
+		if found == None:
+			return False
+
+		name, handler, message, arguments = found
+		started = time.perf_counter()
+		try:
+			handler(message, arguments)
+		finally:
+			self.recordCommand(name, time.perf_counter() - started)
+
+		return True
+
+	def recordCommand(self, name, elapsed):
+		"""
+		Adds a handled command and the seconds it took to self.command_stats.
+		"""
+		with self.command_lock:
+			stats = self.command_stats.get(name)
+			if stats == None:
+				stats = {"count": 0, "total_time": 0.0, "max_time": 0.0}
+				self.command_stats[name] = stats
+
+			stats["count"] += 1
+			stats["total_time"] += elapsed
+			stats["max_time"] = max(stats["max_time"], elapsed)
+
+		metrics.observe("dokkaebi_command_seconds", elapsed, {"command": name})
+
+	def createSession(self):
+		"""
+		Creates the pooled requests.Session used for every Telegram API call.
+		Pool sizing is read from the hook dictionary given to the constructor
+		(see __init__), so the pool can be matched to the CherryPy thread count.
+
+		RETURNS: requests.Session
+
 		PRECONDITION:
-		None
+		self.webhook_config has been assigned.
+
 		POSTCONDITION:
-		Dokkaebi class is constructed from the given dictionary values.
+		A session with a keep-alive connection pool mounted for https and http is returned.
 		"""
-		self.webhook_config = hook
-		self.update_received_count = 0
+		session = requests.Session()
+		adapter = HTTPAdapter(
+			pool_connections = self.webhook_config.get("pool_connections", 10),
+			pool_maxsize = self.webhook_config.get("pool_maxsize", 10),
+			pool_block = self.webhook_config.get("pool_block", False)
+		)
+		session.mount("https://", adapter)
+		session.mount("http://", adapter)
 
-		if hook and hook != None and all (keys in hook for keys in ["hostname", "port", "url"]):
-			print("Starting Dokkaebi bot...")
-			print("Ctrl+C to quit")
+		if not self.webhook_config.get("keep_alive", True):
+			session.headers["Connection"] = "close"
 
-			#make sure there is no live webhook before setting it
-			self.deleteWebhook()
+		return session
 
-			#store current webhook info upon setting it successfully
-			self.setWebhook()
-			self.webhook_info = self.getWebhookInfo()
+	def callApi(self, method, verb, success, failure, **kwargs):
+		"""
+		Sends a request for a Telegram Bot API method over the pooled session.
+		All of the API wrappers below go through here, for example:
+		self.callApi("sendMessage", "post", "Message sent...", "Message could not be sent", data = message_data)
+		Any keyword arguments (data, json, params, files, timeout) are handed to requests.
 
-			#store the bot info
-			self.bot_info = self.getMe()
+		RETURNS: request object
 
-			#hook for init work that
-			#needs accomplished in derived classes
-			#before the server starts
-			self.onInit()
+		PRECONDITION:
+		A Telegram bot has been created and the Dokkaebi instance has been constructed.
+
+		POSTCONDITION:
+		The request is made with self.request_timeout unless a timeout is given. Messages
+		sent to a chat (send* and forwardMessage) wait for self.rate_limiter first, and are
+		retried after the retry_after given with a 429 response. On success
+		the success string is logged, otherwise the failure string and
+		the status code are logged (see logResponse). The request object is returned either way.
+		"""
+		url = self.endpoints.url(method)
+		kwargs.setdefault("timeout", self.request_timeout)
+
+		if self.rate_limiter != None and self.isRateLimited(method):
+			chat_id = self.chatOf(kwargs)
+			retries = self.webhook_config.get("rate_retries", 3)
+			while True:
+				wait = self.rate_limiter.reserve(chat_id)
+				if wait > 0:
+					time.sleep(wait)
+
+				r = self.timedRequest(method, verb, url, kwargs)
+
+				#uploaded files have already been read, so only
+				#messages without them can be sent again
+				if r.status_code != 429 or retries <= 0 or "files" in kwargs:
+					break
+
+				retries -= 1
+				self.rate_limiter.backoff(chat_id, self.retryAfter(r))
+		else:
+			r = self.timedRequest(method, verb, url, kwargs)
 
-			print("running cherrypy version: " + cherrypy.__version__)
+		self.logResponse(method, r, success, failure)
 
-			#crank up a CherryPy server
-			cherrypy.config.update({
-			    #'environment': self.webhook_config["environment"],
-			    'server.socket_host': self.webhook_config["hostname"],
-			    'server.socket_port': self.webhook_config["port"],
-			})
-			if conf != None:
-				cherrypy.quickstart(self, '/', conf)
-			else:
-				cherrypy.quickstart(self, '/')
+		return r
+
+	def timedRequest(self, method, verb, url, request_data):
+		"""
+		Makes one HTTP request for a Bot API method over the pooled session and records
+		its status and latency in the metrics registry (see recordCall).
+
+		RETURNS: request object
+		"""
+		started = time.perf_counter()
+		try:
+			r = self.session.request(verb.upper(), url, **request_data)
+		except requests.exceptions.RequestException:
+			self.recordCall(method, "error", time.perf_counter() - started)
+			raise
+
+		self.recordCall(method, r.status_code, time.perf_counter() - started)
+		return r
+
+	def recordCall(self, method, status, elapsed):
+		"""
+		Adds a Bot API call's status and latency in seconds to the metrics registry.
+		"""
+		metrics.inc("dokkaebi_telegram_requests_total", {"method": method, "status": status})
+		metrics.observe("dokkaebi_telegram_request_seconds", elapsed, {"method": method})
+
+	def logResponse(self, method, r, success, failure):
+		"""
+		Logs a Bot API response: the success string at INFO, or the failure string at
+		WARNING, with the method and status code. The body is only decoded when the
+		dokkaebi logger is at DEBUG.
+		"""
+		if(r.status_code == 200):
+			log.info(success, extra = {"method": method, "status": r.status_code})
 		else:
-			print("Dokkaebi bot initializing without CherryPy...")
+			log.warning(failure, extra = {"method": method, "status": r.status_code})
 
-			#store the bot info
-			self.bot_info = self.getMe()
+		if log.isEnabledFor(logging.DEBUG):
+			log.debug("Response body", extra = {"method": method, "status": r.status_code, "body": r.text})
 
-			#hook for init work that
-			#needs accomplished in derived classes
-			#before the server starts
-			self.onInit()
+	def isRateLimited(self, method):
+		"""
+		RETURNS: boolean True if the Telegram method delivers a message to a chat.
+		"""
+		return method.startswith("send") or method == "forwardMessage"
 
-			print("Dokkaebi initialized successfully.")
+	def chatOf(self, request_data):
+		"""
+		RETURNS: the chat_id a request is addressed to, taken from its data, json or params, or None.
+		"""
+		for name in ["data", "json", "params"]:
+			if isinstance(request_data.get(name), dict) and "chat_id" in request_data[name]:
+				return request_data[name]["chat_id"]
 
-	@cherrypy.expose
-	@cherrypy.tools.json_in()
-	def index(self):
+		return None
+
+	def retryAfter(self, r):
 		"""
-		Handles all of the update logic for the Dokkaebi bot.
-		Because this varies wildy depending on the application,
-		simply calling a user-defined function was the easiest
-		way of handling the issue. The caller must inherit from
-		Dokkaebi and override the handleData(data) function to
-		implement their own update logic:
+		RETURNS: int seconds Telegram asked us to wait in a 429 response (1 if it did not say).
+		"""
+		try:
+			return r.json().get("parameters", {}).get("retry_after", 1)
+		except ValueError:
+			return 1
 
-		class Bot(dokkaebi.Dokkaebi):
-			#overridden function...
-			def handleData(data):
-				print("do some stuff with the update data...")
+	def sendCached(self, method, field, media_data, key = None, upload = None):
+		"""
+		Sends media (sendPhoto, sendAnimation, sendVideo...) by url the first time and by
+		the Telegram file_id it was given afterwards, so Telegram does not have to download
+		the same file again for every message. For example:
 
-		This enables the user to hook into the CherryPy server
-		listening at the webhook base url and customize the
-		update logic.
+		self.sendCached("sendAnimation", "animation", {"chat_id": CHATID, "animation": "https://..."})
+
+		The file_id is remembered under key, which defaults to the url in media_data[field].
+		If Telegram rejects a remembered file_id it is forgotten and the url is sent instead.
+		When upload is the path of a local copy of the media (and the send method accepts
+		file objects, like sendPhoto) the local copy is uploaded instead of the url.
+		File_ids are kept across restarts when the hook dictionary has a 'file_id_store'.
+
+		RETURNS: the response of the send method.
 
 		PRECONDITION:
 		A Telegram bot has been created and the Dokkaebi instance has been constructed.
 
 		POSTCONDITION:
-		Requests are received on the assigned port at the webhook url provided.
-		Additionally, processing of the updates is passed on to self.handleData(data)
-		which is implemented in the user-defined override outside of this class.
+		self.file_ids holds the file_id of the media after the first successful send.
 		"""
-		data = cherrypy.request.json
+		if key == None:
+			key = media_data[field]
 
-		#callback to a user-defined function
-		#for handling updates
-		self.handleData(data)
+		file_id = self.file_ids.get(key)
+		if file_id != None:
+			r = getattr(self, method)(dict(media_data, **{field: file_id}))
+			if r.status_code != 400:
+				return r
 
-	def onInit(self):
+			#stale or foreign file_id, go back to the url
+			self.forgetFileId(key)
+
+		if upload != None and os.path.isfile(upload):
+			with open(upload, "rb") as media:
+				r = getattr(self, method)(dict(media_data, **{field: media}))
+		else:
+			r = getattr(self, method)(media_data)
+
+		self.rememberFileId(key, self.fileIdOf(r, field))
+		return r
+
+	def fileIdOf(self, r, field):
 		"""
-		Override this method to hook into the constructor and
-		handle tasks that need to be handled upon construction
-		of the Dokkaebi class.
+		RETURNS: the file_id Telegram assigned to the media in a sent Message response, or None.
+		For photos the largest size is used.
 		"""
+		if r.status_code != 200:
+			return None
 
-	def handleData(self, data):
+		try:
+			media = r.json()["result"].get(field)
+		except (ValueError, KeyError, AttributeError):
+			return None
+
+		if isinstance(media, list):
+			media = media[-1] if media else None
+		if isinstance(media, dict):
+			return media.get("file_id")
+
+		return None
+
+	def rememberFileId(self, key, file_id):
 		"""
-		Override this method to hook into the update method and
-		handle json data retrieved from Telegram webhook request
+		Stores a Telegram file_id for the media key (see sendCached), ignoring None.
+		"""
+		if file_id == None:
+			return
+
+		with self.file_id_lock:
+			if self.file_ids.get(key) == file_id:
+				return
+
+			self.file_ids[key] = file_id
+			self.saveFileIds()
+
+	def forgetFileId(self, key):
+		"""
+		Drops the Telegram file_id stored for the media key (see sendCached).
+		"""
+		with self.file_id_lock:
+			if self.file_ids.pop(key, None) != None:
+				self.saveFileIds()
+
+	def loadFileIds(self):
+		"""
+		RETURNS: dictionary of media key -> file_id read from the hook's 'file_id_store'
+		json file, or an empty dictionary if there is no store (yet).
+		"""
+		path = self.webhook_config.get("file_id_store")
+		if path == None or not os.path.isfile(path):
+			return {}
+
+		try:
+			with open(path) as store:
+				return dict(json.load(store))
+		except (OSError, ValueError, TypeError) as e:
+			log.warning("File ids could not be loaded", extra = {"path": path, "error": str(e)})
+			return {}
+
+	def saveFileIds(self):
+		"""
+		Writes self.file_ids to the hook's 'file_id_store' json file, if there is one.
+		The file is replaced in one step so a crash never leaves half a store behind.
+
+		PRECONDITION:
+		self.file_id_lock is held.
 		"""
+		path = self.webhook_config.get("file_id_store")
+		if path == None:
+			return
+
+		try:
+			#worker processes (see preFork) may save at the same time
+			with open(path + "." + str(os.getpid()) + ".tmp", "w") as store:
+				json.dump(self.file_ids, store)
+			os.replace(path + "." + str(os.getpid()) + ".tmp", path)
+		except OSError as e:
+			log.warning("File ids could not be saved", extra = {"path": path, "error": str(e)})
 
 	def setWebhook(self, hook = None):
 		"""
@@ -146,21 +2354,10 @@ class Dokkaebi(object):
 		See the Telegram Bot API documentation for more information about what
 		status codes may be returned when a request is made to /setWebhook.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/setWebhook'
-		if(hook == None):
-			r = requests.post(url, data = {"url": self.webhook_config["url"]})
-		else:
+		if(hook != None):
 			self.webhook_config["url"] = hook["url"]
-			r = requests.post(url, data = {"url": self.webhook_config["url"]})
-
-		if(r.status_code == 200):
-			print("Webhook set: " + self.webhook_config["url"])
-		else:
-			print("error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
 
-		return r
+		return self.callApi("setWebhook", "post", "Webhook set: " + self.webhook_config["url"], "Webhook could not be set", data = {"url": self.webhook_config["url"]})
 
 	def getWebhookInfo(self):
 		"""
@@ -175,23 +2372,19 @@ class Dokkaebi(object):
 		
 		POSTCONDITION:
 		Dokkaebi sends the request to get the webhook information from Telegram. Upon success,
-		a json object is printed to the console and the WebhookInfo json object is
+		the result is logged and the WebhookInfo json object is
 		returned to the caller In the event of an error,
-		the request object is returned after error is printed to the console. Also, see the
+		the request object is returned after the error is logged. Also, see the
 		Telegram Bot API documentation for what types of status codes to expect
 		when making a request to /getWebhookInfo.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/getWebhookInfo'
-		r = requests.get(url)
+		r = self.callApi("getWebhookInfo", "get", "Webhook info:", "Webhook info could not be retrieved")
 		if(r.status_code == 200):
-			print("Webhook info:")
-			print(r.json())
-			return r.json()["result"]
-		else:
-			print("Webhook info could not be retrieved - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-				return r
+			result = r.json()["result"]
+			log.info("Bot API result", extra = {"result": result})
+			return result
+
+		return r
 
 	def deleteWebhook(self):
 		"""
@@ -208,22 +2401,13 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		Dokkaebi sends the request to get remove the webhook from Telegram and the internal
 		Dokkaebi bot webhook data is reset to None. Upon success, the HTTP status code
-		is printed to the console and the request returns True. Upon error, the status code is printed to the console
-		along with the whole request object returned. (see Python requests documentation for more 
+		is logged and the request returns True. Upon error, the status code is logged
+		and the whole request object is returned. (see Python requests documentation for more 
 		information on what status codes could be returned from requests.post(...)). Also, see the
 		Telegram Bot API documentation for what types of status codes to expect
 		when making a request to /deleteWebhook.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/deleteWebhook'
-		r = requests.post(url)
-		if(r.status_code == 200):
-			print("Webhook deleted...")
-		else:
-			print("Webhook could not be deleted - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("deleteWebhook", "post", "Webhook deleted...", "Webhook could not be deleted")
 
 	def getMe(self):
 		"""
@@ -236,21 +2420,17 @@ class Dokkaebi(object):
 		
 		POSTCONDITION:
 		If the request succeeds, a User json object with the bot info will be returned.
-		Otherwise, the request failed with an error and the request object is printed
-		to the console and returned. Also, see the Telegram Bot API documentation for 
+		Otherwise, the request failed with an error, it is logged (see logResponse)
+		and the request object is returned. Also, see the Telegram Bot API documentation for 
 		what types of status codes to expect when making a request to /getMe.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/getMe'
-		r = requests.get(url)
+		r = self.callApi("getMe", "get", "Bot information:", "Bot information could not be retrieved")
 		if(r.status_code == 200):
-			print("Bot information:")
-			print(r.json())
-			return r.json()["result"]
-		else:
-			print("Bot information could not be retrieved - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-				return r
+			result = r.json()["result"]
+			log.info("Bot API result", extra = {"result": result})
+			return result
+
+		return r
 
 	def getUpdates(self, update_data = None):
 		"""
@@ -269,24 +2449,16 @@ class Dokkaebi(object):
 
 		POSTCONDITION:
 		On success, a Telegram Update json object is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		if(update_data != None):
-			url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/getUpdates'
-			r = requests.get(url, update_data)
-		else:
-			url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/getUpdates'
-			r = requests.get(url)
+		#long polling holds the request open for up to
+		#"timeout" seconds, so the read has to wait that much longer
+		poll_timeout = 0
+		if update_data != None and update_data.get("timeout") != None:
+			poll_timeout = update_data["timeout"]
 
-		if(r.status_code == 200):
-			print("Updates received...")
-		else:
-			print("Updates could not be retrieved - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-				
-		return r
+		return self.callApi("getUpdates", "get", "Updates received...", "Updates could not be retrieved", params = update_data, timeout = (self.request_timeout[0], self.request_timeout[1] + poll_timeout))
 
 	def sendMessage(self, message_data):
 		"""
@@ -316,22 +2488,14 @@ class Dokkaebi(object):
 
 		POSTCONDITION:
 		On success, Telegram receives the message and the Message json object is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendMessage'
 		if "reply_markup" in message_data:
-			r = requests.post(url, json = message_data)
+			r = self.callApi("sendMessage", "post", "Message sent...", "Message could not be sent", json = message_data)
 		else:
-			r = requests.post(url, data = message_data)
+			r = self.callApi("sendMessage", "post", "Message sent...", "Message could not be sent", data = message_data)
 
-		if(r.status_code == 200):
-			print("Message sent...")
-		else:
-			print("Message could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-		
 		return r
 
 	def forwardMessage(self, message_data):
@@ -353,27 +2517,17 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the forwarded message and the Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/forwardMessage'
-		r = requests.post(url, data = message_data)
-
-		if(r.status_code == 200):
-			print("Message sent...")
-		else:
-			print("Message could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("forwardMessage", "post", "Message sent...", "Message could not be sent", data = message_data)
 
 	def sendPhoto(self, photo_data):
 		"""
 		Send a photo to Telegram.
 		{
 			"chat_id": CHATID, #required - string or integer according to Telegram API docs
-			"photo": FILEORURL, #required - input file, file_id as string or url to photo as string (see Telegram API doc).
+			"photo": FILEORURL, #required - open file to upload, file_id as string or url to photo as string (see Telegram API doc).
 			"caption": "CAPTION", #optional - description of the photo.
 			"parse_mode": None, #optional - html or markdown (see Telegram API doc).
 			"disable_notification": None, #optional - disable notification sound to send photo to user silently.
@@ -389,20 +2543,15 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the photo request and the Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendPhoto'
-		r = requests.post(url, data = photo_data)
-
-		if(r.status_code == 200):
-			print("Photo sent...")
-		else:
-			print("Photo could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
+		if not isinstance(photo_data["photo"], str):
+			#an open file is uploaded
+			data = {name: value for name, value in photo_data.items() if name != "photo"}
+			return self.callApi("sendPhoto", "post", "Photo uploaded...", "Photo could not be uploaded", data = data, files = {"photo": photo_data["photo"]})
 
-		return r
+		return self.callApi("sendPhoto", "post", "Photo sent...", "Photo could not be sent", data = photo_data)
 
 	def sendAudio(self, audio_data):
 		"""
@@ -429,22 +2578,13 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the audio request and the Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
 		if "thumb" in audio_data:
-			url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendAudio?chat_id={}'.format(audio_data["chat_id"])
-			r = requests.post(url, files = audio_data["thumb"], data = audio_data)
-		else:
-			url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendAudio'
-			r = requests.post(url, data = audio_data)
-
-		if(r.status_code == 200):
-			print("Audio sent...")
+			r = self.callApi("sendAudio", "post", "Audio sent...", "Audio could not be sent", params = {"chat_id": audio_data["chat_id"]}, files = audio_data["thumb"], data = audio_data)
 		else:
-			print("Audio could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
+			r = self.callApi("sendAudio", "post", "Audio sent...", "Audio could not be sent", data = audio_data)
 
 		return r
 
@@ -470,22 +2610,13 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the document request and the Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
 		if "thumb" in document_data:
-			url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendDocument?chat_id={}'.format(document_data["chat_id"])
-			r = requests.post(url, files = document_data["thumb"], data = document_data)
-		else:
-			url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendDocument'
-			r = requests.post(url, data = document_data)
-
-		if(r.status_code == 200):
-			print("Document sent...")
+			r = self.callApi("sendDocument", "post", "Document sent...", "Document could not be sent", params = {"chat_id": document_data["chat_id"]}, files = document_data["thumb"], data = document_data)
 		else:
-			print("Document could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
+			r = self.callApi("sendDocument", "post", "Document sent...", "Document could not be sent", data = document_data)
 
 		return r
 
@@ -515,22 +2646,13 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the video request and the Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
 		if "thumb" in video_data:
-			url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendVideo?chat_id={}'.format(video_data["chat_id"])
-			r = requests.post(url, files = video_data["thumb"], data = video_data)
+			r = self.callApi("sendVideo", "post", "Video sent...", "Video could not be sent", params = {"chat_id": video_data["chat_id"]}, files = video_data["thumb"], data = video_data)
 		else:
-			url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendVideo'
-			r = requests.post(url, data = video_data)
-
-		if(r.status_code == 200):
-			print("Video sent...")
-		else:
-			print("Video could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
+			r = self.callApi("sendVideo", "post", "Video sent...", "Video could not be sent", data = video_data)
 
 		return r
 	
@@ -559,23 +2681,14 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the animation request and the Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
 		if "thumb" in animation_data:
-			url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendAnimation?chat_id={}'.format(animation_data["chat_id"])
-			r = requests.post(url, files = animation_data["thumb"], data = animation_data)
+			r = self.callApi("sendAnimation", "post", "Animation sent...", "Animation could not be sent", params = {"chat_id": animation_data["chat_id"]}, files = animation_data["thumb"], data = animation_data)
 		else:
-			url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendAnimation'
-			r = requests.post(url, data = animation_data)
+			r = self.callApi("sendAnimation", "post", "Animation sent...", "Animation could not be sent", data = animation_data)
 
-		if(r.status_code == 200):
-			print("Animation sent...")
-		else:
-			print("Animation could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-				
 		return r
 
 	def sendVoice(self, voice_data):
@@ -600,20 +2713,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the voice request and the Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendVoice'
-		r = requests.post(url, data = voice_data)
-
-		if(r.status_code == 200):
-			print("Voice sent...")
-		else:
-			print("Voice could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-				
-		return r
+		return self.callApi("sendVoice", "post", "Voice sent...", "Voice could not be sent", data = voice_data)
 
 	def sendVideoNote(self, video_note_data):
 		"""
@@ -637,23 +2740,14 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the video note request and the Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
 		if "thumb" in video_note_data:
-			url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendVideoNote?chat_id={}'.format(video_note_data["chat_id"])
-			r = requests.post(url, files = video_note_data["thumb"], data = video_note_data)
+			r = self.callApi("sendVideoNote", "post", "Video note sent...", "Video note could not be sent", params = {"chat_id": video_note_data["chat_id"]}, files = video_note_data["thumb"], data = video_note_data)
 		else:
-			url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendVideoNote'
-			r = requests.post(url, data = video_note_data)
+			r = self.callApi("sendVideoNote", "post", "Video note sent...", "Video note could not be sent", data = video_note_data)
 
-		if(r.status_code == 200):
-			print("Video note sent...")
-		else:
-			print("Video note could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-				
 		return r
 
 	def sendMediaGroup(self, media_group_data):
@@ -678,20 +2772,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the media group request and the array of Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendMediaGroup'
-		r = requests.post(url, json = media_group_data)
-
-		if(r.status_code == 200):
-			print("Media group sent...")
-		else:
-			print("Media group could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-				
-		return r
+		return self.callApi("sendMediaGroup", "post", "Media group sent...", "Media group could not be sent", json = media_group_data)
 
 	def sendLocation(self, location_data):
 		"""
@@ -714,20 +2798,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the location request and the Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendLocation'
-		r = requests.post(url, data = location_data)
-
-		if(r.status_code == 200):
-			print("Location sent...")
-		else:
-			print("Location could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("sendLocation", "post", "Location sent...", "Location could not be sent", data = location_data)
 
 	def editMessageLiveLocation(self, location_data):
 		"""
@@ -749,20 +2823,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the edit live location request and the Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/editMessageLiveLocation'
-		r = requests.post(url, data = location_data)
-
-		if(r.status_code == 200):
-			print("Location edit sent...")
-		else:
-			print("Location edit could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("editMessageLiveLocation", "post", "Location edit sent...", "Location edit could not be sent", data = location_data)
 
 	def stopMessageLiveLocation(self, location_data):
 		"""
@@ -782,20 +2846,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the stop live location request and the Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/stopMessageLiveLocation'
-		r = requests.post(url, data = location_data)
-
-		if(r.status_code == 200):
-			print("Live location stopped...")
-		else:
-			print("Live location stop could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("stopMessageLiveLocation", "post", "Live location stopped...", "Live location stop could not be sent", data = location_data)
 
 	def sendVenue(self, venue_data):
 		"""
@@ -821,20 +2875,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the venue request and the Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendVenue'
-		r = requests.post(url, data = venue_data)
-
-		if(r.status_code == 200):
-			print("Venue sent...")
-		else:
-			print("Venue could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("sendVenue", "post", "Venue sent...", "Venue could not be sent", data = venue_data)
 	def sendContact(self, contact_data):
 		"""
 		Send a contact to Telegram.
@@ -857,20 +2901,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the contact request and the Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendContact'
-		r = requests.post(url, data = contact_data)
-
-		if(r.status_code == 200):
-			print("Contact sent...")
-		else:
-			print("Contact could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("sendContact", "post", "Contact sent...", "Contact could not be sent", data = contact_data)
 
 	def sendPoll(self, poll_data):
 		"""
@@ -901,18 +2935,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		On success, Telegram receives the poll request and the Message json object
 		is returned. 
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendPoll'
-		r = requests.post(url, json = poll_data)
-
-		if(r.status_code == 200):
-			print("Poll sent...")
-		else:
-			print("Poll could not be sent - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
+		return self.callApi("sendPoll", "post", "Poll sent...", "Poll could not be sent", json = poll_data)
 
 	def sendDice(self, dice_data):
 		"""
@@ -933,20 +2959,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The dice have been sent to the Telegram user and the request object is returned
 		to the caller to process at their option.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendDice'
-		r = requests.post(url, data = dice_data)
-
-		if(r.status_code == 200):
-			print("Dice sent...")
-		else:
-			print("Dice could not be set - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-		
-		return r
+		return self.callApi("sendDice", "post", "Dice sent...", "Dice could not be set", data = dice_data)
 
 	def sendChatAction(self, action_data):
 		"""
@@ -968,20 +2984,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The chat action has been sent to the Telegram user and the request object is returned
 		to the caller to process at their option.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/sendChatAction'
-		r = requests.post(url, data = action_data)
-
-		if(r.status_code == 200):
-			print("Chat action sent...")
-		else:
-			print("Chat action could not be set - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-		
-		return r
+		return self.callApi("sendChatAction", "post", "Chat action sent...", "Chat action could not be set", data = action_data)
 
 	def getUserProfilePhotos(self, profile_data):
 		"""
@@ -1000,20 +3006,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The profile photo request has been sent to the Telegram and UserProfilePhotos json object is returned
 		to the caller to process at their option.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/getUserProfilePhotos'
-		r = requests.get(url, data = profile_data)
-
-		if(r.status_code == 200):
-			print("Profile photos received...")
-		else:
-			print("Profile photos could not be retrieved - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-		
-		return r
+		return self.callApi("getUserProfilePhotos", "get", "Profile photos received...", "Profile photos could not be retrieved", data = profile_data)
 
 	def getFile(self, file_data):
 		"""
@@ -1023,6 +3019,7 @@ class Dokkaebi(object):
 		{
 			"file_id": FILEID #required - int unique identifier for the file.
 		}
+		The file can then be downloaded from self.endpoints.fileUrl(file_path).
 
 		RETURNS: File json object
 		
@@ -1032,20 +3029,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The file request has been sent to the Telegram and a File json object is returned
 		to the caller to process at their option.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/getFile'
-		r = requests.get(url, data = file_data)
-
-		if(r.status_code == 200):
-			print("File received...")
-		else:
-			print("File could not be retrieved - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-		
-		return r
+		return self.callApi("getFile", "get", "File received...", "File could not be retrieved", data = file_data)
 
 	def kickChatMember(self, user_data):
 		"""
@@ -1064,20 +3051,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The kick chat member request has been sent to the Telegram and True is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/kickChatMember'
-		r = requests.post(url, data = user_data)
-
-		if(r.status_code == 200):
-			print("Member kicked from chat...")
-		else:
-			print("Member could not be kicked - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-		
-		return r
+		return self.callApi("kickChatMember", "post", "Member kicked from chat...", "Member could not be kicked", data = user_data)
 
 	def unbanChatMember(self, user_data):
 		"""
@@ -1096,20 +3073,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The unban chat member request has been sent to the Telegram and True is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/unbanChatMember'
-		r = requests.post(url, data = user_data)
-
-		if(r.status_code == 200):
-			print("Member unbanned from chat...")
-		else:
-			print("Member could not be unbanned - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("unbanChatMember", "post", "Member unbanned from chat...", "Member could not be unbanned", data = user_data)
 
 	def restrictChatMember(self, user_data):
 		"""
@@ -1138,20 +3105,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The restrict chat member request has been sent to the Telegram and True is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/restrictChatMember'
-		r = requests.post(url, json = user_data)
-
-		if(r.status_code == 200):
-			print("Member restrictions set...")
-		else:
-			print("Member could not be restricted - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("restrictChatMember", "post", "Member restrictions set...", "Member could not be restricted", json = user_data)
 
 	def promoteChatMember(self, user_data):
 		"""
@@ -1177,20 +3134,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The promote chat member request has been sent to the Telegram and True is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/promoteChatMember'
-		r = requests.post(url, data = user_data)
-
-		if(r.status_code == 200):
-			print("Member promoted...")
-		else:
-			print("Member could not be promoted - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("promoteChatMember", "post", "Member promoted...", "Member could not be promoted", data = user_data)
 
 	def setChatAdministratorCustomTitle(self, user_data):
 		"""
@@ -1209,20 +3156,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The set chat administrator title request has been sent to the Telegram and True is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/setChatAdministratorCustomTitle'
-		r = requests.post(url, data = user_data)
-
-		if(r.status_code == 200):
-			print("Chat administrator custom title set...")
-		else:
-			print("Chat administrator custom title could not be set - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("setChatAdministratorCustomTitle", "post", "Chat administrator custom title set...", "Chat administrator custom title could not be set", data = user_data)
 
 	def setChatPermissions(self, permissions_data):
 		"""
@@ -1249,20 +3186,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The set chat permissions request has been sent to the Telegram and True is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/setChatPermissions'
-		r = requests.post(url, json = permissions_data)
-
-		if(r.status_code == 200):
-			print("Chat permissions set...")
-		else:
-			print("Chat permissions could not be set - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("setChatPermissions", "post", "Chat permissions set...", "Chat permissions could not be set", json = permissions_data)
 
 	def exportChatInviteLink(self, chat_data):
 		"""
@@ -1279,20 +3206,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The export chat invite link request has been sent to the Telegram and the string is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/exportChatInviteLink'
-		r = requests.get(url, data = chat_data)
-
-		if(r.status_code == 200):
-			print("Chat invite link exported...")
-		else:
-			print("Chat invite link could not be exported - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("exportChatInviteLink", "get", "Chat invite link exported...", "Chat invite link could not be exported", data = chat_data)
 
 	def setChatPhoto(self, photo_data, photo_file):
 		"""
@@ -1310,20 +3227,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The set chat photo request has been sent to the Telegram and True is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/setChatPhoto?chat_id={}'.format(photo_data["chat_id"])
-		r = requests.post(url, files = photo_file)
-		
-		if(r.status_code == 200):
-			print("Chat photo set...")
-		else:
-			print("Chat photo could not be set - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("setChatPhoto", "post", "Chat photo set...", "Chat photo could not be set", params = {"chat_id": photo_data["chat_id"]}, files = photo_file)
 
 	def deleteChatPhoto(self, chat_data):
 		"""
@@ -1340,20 +3247,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The delete chat photo request has been sent to the Telegram and True is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/deleteChatPhoto'
-		r = requests.post(url, data = chat_data)
-		
-		if(r.status_code == 200):
-			print("Chat photo deleted...")
-		else:
-			print("Chat photo could not be deleted - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("deleteChatPhoto", "post", "Chat photo deleted...", "Chat photo could not be deleted", data = chat_data)
 
 	def setChatTitle(self, chat_data):
 		"""
@@ -1371,20 +3268,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The set chat title request has been sent to the Telegram and True is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/setChatTitle'
-		r = requests.post(url, data = chat_data)
-		
-		if(r.status_code == 200):
-			print("Chat title set...")
-		else:
-			print("Chat title could not be set - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("setChatTitle", "post", "Chat title set...", "Chat title could not be set", data = chat_data)
 
 	def setChatDescription(self, chat_data):
 		"""
@@ -1402,20 +3289,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The set chat description request has been sent to the Telegram and True is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/setChatDescription'
-		r = requests.post(url, data = chat_data)
-		
-		if(r.status_code == 200):
-			print("Chat description set...")
-		else:
-			print("Chat description could not be set - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("setChatDescription", "post", "Chat description set...", "Chat description could not be set", data = chat_data)
 
 	def pinChatMessage(self, chat_data):
 		"""
@@ -1434,20 +3311,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The pin chat message request has been sent to the Telegram and True is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/pinChatMessage'
-		r = requests.post(url, data = chat_data)
-		
-		if(r.status_code == 200):
-			print("Chat message pinned...")
-		else:
-			print("Chat message could not be pinned - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("pinChatMessage", "post", "Chat message pinned...", "Chat message could not be pinned", data = chat_data)
 
 	def unpinChatMessage(self, chat_data):
 		"""
@@ -1464,20 +3331,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The unpin chat message request has been sent to the Telegram and True is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/unpinChatMessage'
-		r = requests.post(url, data = chat_data)
-		
-		if(r.status_code == 200):
-			print("Chat message unpinned...")
-		else:
-			print("Chat message could not be unpinned - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("unpinChatMessage", "post", "Chat message unpinned...", "Chat message could not be unpinned", data = chat_data)
 
 	def leaveChat(self, chat_data):
 		"""
@@ -1494,20 +3351,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The leave chat message request has been sent to the Telegram and True is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/leaveChat'
-		r = requests.post(url, data = chat_data)
-		
-		if(r.status_code == 200):
-			print("Left the chat...")
-		else:
-			print("Could not leave the chat - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("leaveChat", "post", "Left the chat...", "Could not leave the chat", data = chat_data)
 
 	def getChat(self, chat_data):
 		"""
@@ -1524,20 +3371,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The get chat request has been sent to the Telegram and a Chat json object is returned
 		to the caller to process at their option.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/getChat'
-		r = requests.get(url, data = chat_data)
-
-		if(r.status_code == 200):
-			print("Chat data received...")
-		else:
-			print("Chat data could not be retrieved - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-		
-		return r
+		return self.callApi("getChat", "get", "Chat data received...", "Chat data could not be retrieved", data = chat_data)
 
 	def getChatAdministrators(self, chat_data):
 		"""
@@ -1554,20 +3391,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The get chat administrators message request has been sent to the Telegram and the json is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/getChatAdministrators'
-		r = requests.get(url, data = chat_data)
-		
-		if(r.status_code == 200):
-			print("Chat administrators retrieved...")
-		else:
-			print("Could not retrieve chat administrators - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("getChatAdministrators", "get", "Chat administrators retrieved...", "Could not retrieve chat administrators", data = chat_data)
 
 	def getChatMembersCount(self, chat_data):
 		"""
@@ -1584,20 +3411,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The get chat members message request has been sent to the Telegram and the json is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/getChatMembersCount'
-		r = requests.get(url, data = chat_data)
-		
-		if(r.status_code == 200):
-			print("Chat member count retrieved...")
-		else:
-			print("Could not retrieve chat member count - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("getChatMembersCount", "get", "Chat member count retrieved...", "Could not retrieve chat member count", data = chat_data)
 
 	def getChatMember(self, chat_data):
 		"""
@@ -1615,20 +3432,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The get chat members message request has been sent to the Telegram and the json is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/getChatMember'
-		r = requests.get(url, data = chat_data)
-		
-		if(r.status_code == 200):
-			print("Chat member retrieved...")
-		else:
-			print("Could not retrieve chat member - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("getChatMember", "get", "Chat member retrieved...", "Could not retrieve chat member", data = chat_data)
 
 	def setChatStickerSet(self, sticker_data):
 		"""
@@ -1646,20 +3453,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The set chat sticker set message request has been sent to the Telegram and the json is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/setChatStickerSet'
-		r = requests.post(url, data = sticker_data)
-		
-		if(r.status_code == 200):
-			print("Chat sticker set has been set...")
-		else:
-			print("Could not set chat sticker set - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("setChatStickerSet", "post", "Chat sticker set has been set...", "Could not set chat sticker set", data = sticker_data)
 
 	def deleteChatStickerSet(self, chat_data):
 		"""
@@ -1676,20 +3473,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The set chat sticker set message request has been sent to Telegram and the json is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/deleteChatStickerSet'
-		r = requests.post(url, data = chat_data)
-		
-		if(r.status_code == 200):
-			print("Chat sticker set has been deleted...")
-		else:
-			print("Could not delete chat sticker set - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("deleteChatStickerSet", "post", "Chat sticker set has been deleted...", "Could not delete chat sticker set", data = chat_data)
 
 	def answerCallbackQuery(self, callback_data):
 		"""
@@ -1710,20 +3497,10 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The answer callback query request has been sent to Telegram and the json is returned on
 		success.
-		Otherwise, if the request failed with an error the request object is printed
-		to the console and returned.
+		Otherwise, if the request failed with an error it is logged (see logResponse)
+		and the request object is returned.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/answerCallbackQuery'
-		r = requests.post(url, data = callback_data)
-		
-		if(r.status_code == 200):
-			print("Answer callback query completed...")
-		else:
-			print("Could not complete the answer callback query - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-
-		return r
+		return self.callApi("answerCallbackQuery", "post", "Answer callback query completed...", "Could not complete the answer callback query", data = callback_data)
 
 	def setMyCommands(self, commands):
 		"""
@@ -1755,18 +3532,9 @@ class Dokkaebi(object):
 		a request object returned to the caller for optional processing.
 		If the request fails, Telegram should revert to the existing list or the default
 		list if a list was never supplied to the Bot Father. Otherwise, if the request 
-		failed with an error the request object is printed to the console and returned to the caller.
+		failed with an error it is logged and the request object is returned to the caller.
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/setMyCommands'
-		r = requests.post(url, json = commands)
-		if(r.status_code == 200):
-			print("Commands set...")
-		else:
-			print("Commands could not be set - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-		
-		return r
+		return self.callApi("setMyCommands", "post", "Commands set...", "Commands could not be set", json = commands)
 
 	def getMyCommands(self):
 		"""
@@ -1782,23 +3550,636 @@ class Dokkaebi(object):
 		POSTCONDITION:
 		The current command list will be returned as JSON if the
 		request succeeds. Otherwise, if the request failed with an error 
-		the request object is printed to the console and returned to the caller. 
+		it is logged and the request object is returned to the caller. 
 		"""
-		url = 'https://api.telegram.org/bot' + self.webhook_config["token"] + '/getMyCommands'
-		r = requests.get(url)
-		if(r.status_code == 200):
-			print("Get command request received...")
+		return self.callApi("getMyCommands", "get", "Get command request received...", "Commands could not be retrieved")
+
+	def serverSettings(self):
+		"""
+		Builds the global CherryPy server settings from the hook dictionary (see __init__).
+
+		RETURNS: dictionary of CherryPy config keys -> values.
+
+		PRECONDITION:
+		self.webhook_config has 'hostname' and 'port'.
+
+		POSTCONDITION:
+		None
+		"""
+		settings = {
+		    #'environment': self.webhook_config["environment"],
+		    'server.socket_host': self.webhook_config["hostname"],
+		    'server.socket_port': self.webhook_config["port"],
+		    'server.thread_pool': self.webhook_config.get("thread_pool", 10),
+		    'server.socket_queue_size': self.webhook_config.get("socket_queue_size", 5),
+		    'server.max_request_body_size': self.webhook_config.get("max_request_body_size", 100 * 1024 * 1024)
+		}
+		if self.webhook_config.get("processes", 1) > 1:
+			#a worker reloading itself after a code change
+			#would start a whole second bot
+			settings['engine.autoreload.on'] = False
+
+		return settings
+
+	def preFork(self):
+		"""
+		Forks the 'processes' worker processes that serve the webhook and pages,
+		so requests are handled on every core instead of in one process bound by
+		the GIL. Each worker runs its own CherryPy server with its own thread pool
+		and update workers on the same port: either every worker binds its own
+		socket with SO_REUSEPORT (the kernel spreads new connections between them)
+		or, with 'reuse_port' False or where SO_REUSEPORT is missing, they all accept
+		from one socket bound here. The parent process only supervises, starting a
+		new worker when one dies and stopping them all on SIGTERM or Ctrl+C.
+
+		Each worker keeps its own caches, metrics and dedup memory, so pass a shared
+		'dedup_store' and expect /metrics to show the worker that answered the scrape.
+		'global_rate' is split evenly between the workers.
+
+		RETURNS: boolean False in a worker process, which goes on to serve, and
+		True in the parent process once every worker has stopped.
+
+		PRECONDITION:
+		The bot has been initialized (getMe, onInit) and no threads or connections
+		that the workers would inherit are in use (see onPreFork).
+
+		POSTCONDITION:
+		In a worker, cherrypy.server has an HTTP server ready to start on the shared port.
+		"""
+		processes = self.webhook_config.get("processes", 1)
+		if not hasattr(os, "fork"):
+			log.warning("Worker processes aren't supported on this platform, serving from one process")
+			return False
+
+		#a pooled connection must never be shared by two processes
+		self.session.close()
+		self.onPreFork()
+
+		shared = None
+		if not self.webhook_config.get("reuse_port", hasattr(socket, "SO_REUSEPORT")):
+			shared = self.listen()
+
+		workers = {}
+		pending = list(range(processes))
+		stopping = []
+
+		def stop(signum = None, frame = None):
+			stopping.append(signum)
+			for pid in workers:
+				try:
+					os.kill(pid, signal.SIGTERM)
+				except ProcessLookupError:
+					pass
+
+		previous = {number: signal.signal(number, stop) for number in [signal.SIGTERM, signal.SIGINT]}
+		log.info("Starting worker processes", extra = {"processes": processes, "reuse_port": shared == None})
+
+		while True:
+			while pending and not stopping:
+				number = pending.pop(0)
+				pid = os.fork()
+				if pid == 0:
+					for signum, handler in previous.items():
+						signal.signal(signum, handler)
+					self.startWorker(number, shared)
+					return False
+
+				workers[pid] = (number, time.monotonic())
+
+			if not workers:
+				break
+
+			try:
+				pid, status = os.wait()
+			except ChildProcessError:
+				break
+
+			if pid not in workers:
+				continue
+
+			number, started = workers.pop(pid)
+			if stopping:
+				continue
+
+			if time.monotonic() - started < 1:
+				#the same failure would only repeat, e.g. the port is taken
+				log.error("Worker process exited right after starting, stopping the bot", extra = {"worker": number, "pid": pid, "status": status})
+				stop()
+			else:
+				log.warning("Worker process exited, starting another", extra = {"worker": number, "pid": pid, "status": status})
+				pending.append(number)
+
+		for signum, handler in previous.items():
+			signal.signal(signum, handler)
+
+		if shared != None:
+			shared.close()
+
+		log.info("Worker processes stopped")
+		self.closeServer()
+		return True
+
+	def listen(self):
+		"""
+		Binds the listening socket the worker processes share when SO_REUSEPORT isn't used (see preFork).
+
+		RETURNS: socket.socket listening on the hook's hostname and port.
+		"""
+		family, kind, proto, name, address = socket.getaddrinfo(
+			self.webhook_config["hostname"],
+			self.webhook_config["port"],
+			socket.AF_UNSPEC,
+			socket.SOCK_STREAM,
+			0,
+			socket.AI_PASSIVE
+		)[0]
+		shared = socket.socket(family, kind, proto)
+		shared.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		shared.bind(address)
+		shared.listen(self.webhook_config.get("socket_queue_size", 5))
+		return shared
+
+	def startWorker(self, number, shared = None):
+		"""
+		Prepares a freshly forked worker process to serve (see preFork).
+
+		PRECONDITION:
+		Called in the worker right after the fork, shared is the listening
+		socket to accept from or None to bind with SO_REUSEPORT.
+
+		POSTCONDITION:
+		cherrypy.server has an HTTP server for the shared port and self.worker is number.
+		"""
+		self.worker = number
+		httpserver, bind_addr = cherrypy.server.httpserver_from_self()
+		if shared != None:
+			def bind(family, type, proto = 0):
+				httpserver.socket = shared
+				return shared
+
+			httpserver.bind = bind
 		else:
-			print("Commands could not be retrieved - error: " + format(r.status_code))
-			if r and r is not None:
-				print("Request object returned: \n" + r.text)
-				
-		return r
+			httpserver.reuse_port = True
+
+		cherrypy.server.httpserver = httpserver
+
+		#CherryPy waits for the port to be free before serving and
+		#again after stopping, which never happens while other workers
+		#use it, so its adapter is left without an address to check
+		#(the HTTP server built above keeps the real one)
+		cherrypy.server.bind_addr = None
+
+		log.info("Worker process started", extra = {"worker": number, "pid": os.getpid()})
+
+	def onPreFork(self):
+		"""
+		Override this method to close connections and stop threads the bot
+		opened in onInit before the worker processes are forked (see preFork),
+		for example pooled upstream connections. They would otherwise be
+		shared by every worker.
+		"""
+
+	def serverConfig(self, conf = None):
+		"""
+		Builds the CherryPy app config the webhook server is started with:
+		stateless_config overlaid with the conf passed to the constructor, so
+		{'/': {'tools.sessions.on': True}} still turns sessions on everywhere.
+		Prefer @dokkaebi.sessions on the few methods that need them.
+
+		RETURNS: dictionary of CherryPy config sections.
+
+		PRECONDITION:
+		conf is None or a CherryPy config dictionary of path -> settings.
+
+		POSTCONDITION:
+		Neither stateless_config nor conf is modified.
+		"""
+		merged = {path: dict(settings) for path, settings in stateless_config.items()}
+		if conf != None:
+			for path, settings in conf.items():
+				if isinstance(settings, dict):
+					merged.setdefault(path, {}).update(settings)
+				else:
+					merged[path] = settings
+
+		return merged
 
 	def closeServer(self):
 		"""
-		STUB
+		Shuts the bot down in order: the long-polling loop is told to stop after
+		the getUpdates call in progress (see stopPolling), the update workers finish
+		the updates already queued (see drainUpdates), and then the pooled Telegram
+		session is closed, so replies to those updates still go out. Called when
+		polling ends and by the parent process once the worker processes have stopped
+		(see preFork). The webhook server drains its queue itself when CherryPy's
+		engine stops, which leaves nothing for a later closeServer call to wait on.
+
+		PRECONDITION:
+		The Dokkaebi instance has been constructed.
+
+		POSTCONDITION:
+		No updates are fetched or handled anymore and the session's connections are closed.
 		"""
-		print("Server closed...")
+		self.stopPolling()
+		self.drainUpdates()
+		self.session.close()
+		log.info("Server closed...")
 		
-		return
\ No newline at end of file
+		return
+
+class AsyncResponse(object):
+	"""
+	AsyncResponse holds a finished aiohttp response in the same shape as the
+	requests response objects the Dokkaebi API methods return, so callers can
+	keep using r.status_code, r.text and r.json().
+
+	Data Members:
+	self.status_code - int HTTP status code.
+	self.text - string response body.
+	self.headers - response headers.
+	"""
+
+	def __init__(self, status_code, text, headers):
+		self.status_code = status_code
+		self.text = text
+		self.headers = headers
+
+	def json(self):
+		"""
+		RETURNS: the decoded json body.
+		"""
+		return json.loads(self.text)
+
+	def __bool__(self):
+		return self.status_code < 400
+
+class AsyncDokkaebi(Dokkaebi):
+	"""
+	AsyncDokkaebi is the asyncio counterpart of Dokkaebi. It has the same API
+	methods (sendMessage, sendPhoto, sendMediaGroup, getUpdates, ...) but each of
+	them returns a coroutine to be awaited, and every call shares one pooled
+	aiohttp.ClientSession. Updates are received by an aiohttp webhook server or
+	by long polling, and each one is handled in its own task, so a single process
+	can have thousands of updates in flight:
+
+	class Bot(dokkaebi.AsyncDokkaebi):
+		async def handleData(self, data):
+			await self.sendMessage({"chat_id": data["message"]["chat"]["id"], "text": "hi"})
+
+	Bot(hook).run()
+
+	Requires the aiohttp package.
+
+	Data Members (in addition to those of Dokkaebi):
+	self.in_flight - number of updates currently being handled.
+	self.max_in_flight - updates handled at once before the webhook answers 503 (hook 'max_in_flight').
+	"""
+
+	def __init__(self, hook, conf = None):
+		"""
+		AsyncDokkaebi construction takes the same hook dictionary as Dokkaebi (see Dokkaebi.__init__)
+		plus 'max_in_flight'. Nothing is sent to Telegram until run() is called:
+		d = dokkaebi.AsyncDokkaebi(hook)
+		d.run()
+		PRECONDITION:
+		aiohttp is installed.
+		POSTCONDITION:
+		AsyncDokkaebi class is constructed from the given dictionary values.
+		"""
+		if aiohttp == None:
+			raise ImportError("AsyncDokkaebi requires the aiohttp package")
+
+		self.configure(hook)
+		self.in_flight = 0
+		self.max_in_flight = self.webhook_config.get("max_in_flight", 1000)
+		self.tasks = set()
+
+	def createSession(self):
+		"""
+		The aiohttp session has to be created inside the running event loop,
+		so it is created by start() instead (see openSession).
+		"""
+		return None
+
+	def openSession(self):
+		"""
+		Creates the pooled aiohttp.ClientSession used for every Telegram API call,
+		sized from the same hook keys as Dokkaebi.createSession.
+
+		PRECONDITION:
+		An event loop is running.
+
+		POSTCONDITION:
+		self.session is an open aiohttp.ClientSession.
+		"""
+		connector = aiohttp.TCPConnector(
+			limit = self.webhook_config.get("pool_maxsize", 100),
+			force_close = not self.webhook_config.get("keep_alive", True)
+		)
+		self.session = aiohttp.ClientSession(connector = connector)
+
+	def run(self):
+		"""
+		Runs the bot on a new asyncio event loop until interrupted (Ctrl+C).
+		"""
+		try:
+			asyncio.run(self.start())
+		except KeyboardInterrupt:
+			log.info("Server closed...")
+
+	async def start(self):
+		"""
+		Connects to Telegram and starts receiving updates, mirroring the Dokkaebi constructor:
+		with 'mode': 'polling' updates are long polled, otherwise the webhook is set
+		and an aiohttp server listens on the hook's hostname and port.
+
+		PRECONDITION:
+		An event loop is running.
+
+		POSTCONDITION:
+		Updates are received and handled until the task is cancelled.
+		"""
+		self.openSession()
+		try:
+			if self.webhook_config.get("mode") == "polling":
+				log.info("Starting AsyncDokkaebi bot in long-polling mode...")
+				await self.deleteWebhook()
+				self.bot_info = await self.getMe()
+				self.buildCommandTable()
+				await self.maybeAwait(self.onInit())
+				await self.poll()
+			else:
+				log.info("Starting AsyncDokkaebi bot...")
+				await self.deleteWebhook()
+				await self.setWebhook()
+				self.webhook_info = await self.getWebhookInfo()
+				self.bot_info = await self.getMe()
+				self.buildCommandTable()
+				await self.maybeAwait(self.onInit())
+
+				app = aiohttp.web.Application()
+				app.router.add_post("/", self.handleWebhook)
+				if self.webhook_config.get("metrics", "local") != False:
+					app.router.add_get("/metrics", self.handleMetrics)
+				runner = aiohttp.web.AppRunner(app)
+				await runner.setup()
+				site = aiohttp.web.TCPSite(runner, self.webhook_config["hostname"], self.webhook_config["port"])
+				await site.start()
+				log.info("Listening", extra = {"hostname": self.webhook_config["hostname"], "port": self.webhook_config["port"]})
+				try:
+					await asyncio.Event().wait()
+				finally:
+					await runner.cleanup()
+		finally:
+			await self.closeServer()
+
+	async def maybeAwait(self, result):
+		"""
+		Awaits result if it is awaitable, so overrides such as onInit and
+		handleData may be written either as plain or async methods.
+		"""
+		if inspect.isawaitable(result):
+			return await result
+
+		return result
+
+	async def handleMetrics(self, request):
+		"""
+		aiohttp handler for /metrics, see Dokkaebi.metrics.
+		"""
+		if not allowsClient(self.webhook_config.get("metrics", "local"), request.remote):
+			raise aiohttp.web.HTTPNotFound()
+
+		return aiohttp.web.Response(text = metrics.render(self.gauges()), content_type = "text/plain")
+
+	async def handleWebhook(self, request):
+		"""
+		aiohttp handler for the webhook url - the update is handed to its own task
+		and Telegram gets its answer right away. While self.max_in_flight updates are
+		being handled a 503 is returned so Telegram delivers the update again later.
+		"""
+		data = await request.json()
+		if not self.dispatchUpdate(data):
+			return aiohttp.web.Response(status = 503, text = "Too many updates in flight")
+
+		return aiohttp.web.Response(text = "")
+
+	def dispatchUpdate(self, data, wait = False):
+		"""
+		Starts a task handling the update with self.handleData.
+
+		RETURNS: boolean False if self.max_in_flight updates are already being handled.
+		"""
+		if self.isDuplicate(data):
+			self.recordUpdate("duplicate")
+			return True
+
+		if self.in_flight >= self.max_in_flight:
+			self.forgetUpdate(data)
+			self.recordUpdate("rejected")
+			return False
+
+		self.recordUpdate("handled")
+
+		self.in_flight += 1
+		task = asyncio.get_running_loop().create_task(self.handleUpdate(data))
+		#keep a reference until the task is done
+		self.tasks.add(task)
+		task.add_done_callback(self.tasks.discard)
+		return True
+
+	async def handleUpdate(self, data):
+		"""
+		Runs self.handleData for one update, printing any exception it raises.
+		"""
+		try:
+			await self.maybeAwait(self.handleData(data))
+		except Exception:
+			log.exception("Update could not be handled")
+		finally:
+			self.in_flight -= 1
+
+	async def handleData(self, data):
+		"""
+		Asynchronous version of Dokkaebi.handleData - override it (as a plain or
+		async method) or register command handlers with the @command decorator.
+		"""
+		await self.dispatchCommand(data)
+
+	async def dispatchCommand(self, data):
+		"""
+		Asynchronous version of Dokkaebi.dispatchCommand - handlers may be plain or async methods.
+		"""
+		found = self.findCommand(data)
+		if found == None:
+			return False
+
+		name, handler, message, arguments = found
+		started = time.perf_counter()
+		try:
+			await self.maybeAwait(handler(message, arguments))
+		finally:
+			self.recordCommand(name, time.perf_counter() - started)
+
+		return True
+
+	async def poll(self):
+		"""
+		Long-polls Telegram with getUpdates like Dokkaebi.poll, starting a task for
+		every update received. Polling waits while self.max_in_flight updates are
+		being handled.
+		"""
+		update_data = {
+			"offset": None,
+			"limit": self.webhook_config.get("poll_limit", 100),
+			"timeout": self.webhook_config.get("poll_timeout", 30)
+		}
+		if "allowed_updates" in self.webhook_config:
+			update_data["allowed_updates"] = json.dumps(self.webhook_config["allowed_updates"])
+
+		retry = self.webhook_config.get("poll_retry", 1)
+
+		self.polling = True
+		while self.polling:
+			try:
+				r = await self.getUpdates(update_data)
+			except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+				log.warning("Polling request failed", extra = {"error": str(e)})
+				await asyncio.sleep(retry)
+				continue
+
+			if(r.status_code != 200):
+				await asyncio.sleep(retry)
+				continue
+
+			updates = r.json()["result"]
+			for update in updates:
+				while not self.dispatchUpdate(update):
+					await asyncio.sleep(0.05)
+
+			if updates:
+				update_data["offset"] = updates[-1]["update_id"] + 1
+
+	def formData(self, data, files):
+		"""
+		RETURNS: aiohttp.FormData built from a requests-style data dictionary and files dictionary.
+		"""
+		form = aiohttp.FormData()
+		for name, value in (data or {}).items():
+			if value == None or name in (files or {}):
+				continue
+			if isinstance(value, (dict, list)):
+				value = json.dumps(value)
+			form.add_field(name, value if isinstance(value, (str, bytes)) else str(value))
+
+		for name, value in (files or {}).items():
+			form.add_field(name, value)
+
+		return form
+
+	async def callApi(self, method, verb, success, failure, **kwargs):
+		"""
+		Asynchronous version of Dokkaebi.callApi. Takes the same requests-style
+		keyword arguments (data, json, params, files, timeout) and applies the same
+		rate limiting, but waits with asyncio instead of blocking a thread.
+
+		RETURNS: AsyncResponse
+		"""
+		url = self.endpoints.url(method)
+		connect, read = kwargs.pop("timeout", self.request_timeout)
+
+		request = {"timeout": aiohttp.ClientTimeout(sock_connect = connect, sock_read = read)}
+		if kwargs.get("params") != None:
+			request["params"] = {name: str(value) for name, value in kwargs["params"].items() if value != None}
+		if "json" in kwargs:
+			request["json"] = kwargs["json"]
+		elif "data" in kwargs or "files" in kwargs:
+			request["data"] = self.formData(kwargs.get("data"), kwargs.get("files"))
+
+		limited = self.rate_limiter != None and self.isRateLimited(method)
+		chat_id = self.chatOf(kwargs)
+		retries = self.webhook_config.get("rate_retries", 3)
+		while True:
+			if limited:
+				wait = self.rate_limiter.reserve(chat_id)
+				if wait > 0:
+					await asyncio.sleep(wait)
+
+			started = time.perf_counter()
+			try:
+				async with self.session.request(verb.upper(), url, **request) as response:
+					r = AsyncResponse(response.status, await response.text(), response.headers)
+			except (aiohttp.ClientError, asyncio.TimeoutError):
+				self.recordCall(method, "error", time.perf_counter() - started)
+				raise
+
+			self.recordCall(method, r.status_code, time.perf_counter() - started)
+
+			if not limited or r.status_code != 429 or retries <= 0 or "files" in kwargs:
+				break
+
+			retries -= 1
+			self.rate_limiter.backoff(chat_id, self.retryAfter(r))
+
+		self.logResponse(method, r, success, failure)
+
+		return r
+
+	async def sendCached(self, method, field, media_data, key = None, upload = None):
+		"""
+		Asynchronous version of Dokkaebi.sendCached.
+		"""
+		if key == None:
+			key = media_data[field]
+
+		file_id = self.file_ids.get(key)
+		if file_id != None:
+			r = await getattr(self, method)(dict(media_data, **{field: file_id}))
+			if r.status_code != 400:
+				return r
+
+			self.forgetFileId(key)
+
+		if upload != None and os.path.isfile(upload):
+			with open(upload, "rb") as media:
+				r = await getattr(self, method)(dict(media_data, **{field: media}))
+		else:
+			r = await getattr(self, method)(media_data)
+
+		self.rememberFileId(key, self.fileIdOf(r, field))
+		return r
+
+	async def getWebhookInfo(self):
+		"""
+		Asynchronous version of Dokkaebi.getWebhookInfo.
+		"""
+		r = await self.callApi("getWebhookInfo", "get", "Webhook info:", "Webhook info could not be retrieved")
+		if(r.status_code == 200):
+			result = r.json()["result"]
+			log.info("Bot API result", extra = {"result": result})
+			return result
+
+		return r
+
+	async def getMe(self):
+		"""
+		Asynchronous version of Dokkaebi.getMe.
+		"""
+		r = await self.callApi("getMe", "get", "Bot information:", "Bot information could not be retrieved")
+		if(r.status_code == 200):
+			result = r.json()["result"]
+			log.info("Bot API result", extra = {"result": result})
+			return result
+
+		return r
+
+	async def closeServer(self):
+		"""
+		Stops polling and closes the aiohttp session.
+		"""
+		self.stopPolling()
+		if self.session != None:
+			await self.session.close()
+			self.session = None
+
+		log.info("Server closed...")
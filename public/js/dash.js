@@ -0,0 +1,106 @@
+//client side of the dashboard: the page is a static
+//shell (dash.html) and the readings come from /dash.json
+//with the same query string as the /dash link
+
+var days = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"];
+var months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"];
+
+function showMessage(text, kind){
+	var alert = $("<div>", {"class": "msg alert alert-" + kind + " alert-dismissible fade show", role: "alert"}).text(text);
+	alert.append('<button type="button" class="close" data-dismiss="alert" aria-label="Close"><span aria-hidden="true">&times;</span></button>');
+	$("#message").empty().append(alert);
+}
+
+function formatDay(localTime){
+	//forecast times are local to the place, so the
+	//parts are read as they are instead of through Date's timezone
+	var parts = localTime.split("T")[0].split("-");
+	var day = new Date(Date.UTC(+parts[0], +parts[1] - 1, +parts[2]));
+	return days[day.getUTCDay()] + ". " + months[day.getUTCMonth()] + " " + parts[2] + ", " + parts[0];
+}
+
+function showShare(data){
+	var widget = document.createElement("script");
+	widget.src = "https://telegram.org/js/telegram-widget.js?11";
+	widget.setAttribute("data-telegram-share-url", data.share_url);
+	widget.setAttribute("data-comment", "Forecast dashboard: " + data.place);
+	widget.setAttribute("data-size", "large");
+	document.getElementById("share").appendChild(widget);
+}
+
+function showCurrent(data){
+	var current = data.current;
+	$("#timestamp").text(data.timestamp);
+	$("#place").text(data.place);
+	$("#temp").text(current.temp + "°F");
+	$("#icon").attr("src", data.icon_url + current.icon + "@2x.png");
+	$("#conditions").text("Feels like " + current.feel + "°F. " + current.main + ". " + current.desc);
+	$("#pressure").text("Air pressure - " + current.pressure + "hPa");
+	$("#humidity").text("Humidity - " + current.humidity + "%");
+}
+
+function showChart(forecast){
+	Plotly.newPlot("line-chart", [{
+		x: forecast.time,
+		y: forecast.temp,
+		fill: "tozeroy",
+		line: {color: "#990000", width: 4},
+		mode: "lines+markers+text",
+		name: "Temp",
+		marker: {size: 14}
+	}], {
+		title: {text: "Hourly Forecast"},
+		xaxis: {range: [forecast.time[0], forecast.time[Math.min(7, forecast.time.length - 1)]], title: {text: "Date and Time (24-hour clock format)"}, showgrid: false},
+		yaxis: {title: {text: "Temperature (degrees F)"}, showgrid: false},
+		font: {color: "#f2f5fa"},
+		paper_bgcolor: "rgba(0,0,0,0)",
+		plot_bgcolor: "rgba(0,0,0,0)"
+	});
+}
+
+function showTable(forecast, iconUrl){
+	var rows = $("#forecast tbody");
+	//one row per day (forecasts are 3 hours apart)
+	for(var i = 0; i < forecast.time.length; i += 8){
+		var row = $("<tr>");
+		row.append($("<td>").text(formatDay(forecast.time[i])));
+		row.append($("<td>").text(forecast.temp[i] + "°F"));
+		row.append($("<td>").text(forecast.main[i] + "/" + forecast.description[i] + " ").append($("<img>", {src: iconUrl + forecast.icon[i] + ".png"})));
+		rows.append(row);
+	}
+	$("#forecast").DataTable();
+}
+
+function showMap(data){
+	var map = L.map("map").setView([data.latitude, data.longitude], 13);
+	L.marker([data.latitude, data.longitude]).addTo(map);
+	L.tileLayer("https://api.mapbox.com/styles/v1/{id}/tiles/{z}/{x}/{y}?access_token={accessToken}", {
+		maxZoom: 18,
+		attribution: 'Map data © <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors, Imagery © <a href="https://www.mapbox.com/">Mapbox</a>',
+		id: "mapbox/streets-v11",
+		tileSize: 512,
+		zoomOffset: -1,
+		accessToken: data.map_token
+	}).addTo(map);
+}
+
+$(document).ready(function(){
+	$.getJSON("/dash.json" + window.location.search).done(function(data){
+		if(data.error){
+			showMessage(data.error, "danger");
+			$("#content").append($("<div>").append($("<h1>").text("Please take a closer look at your command and try again :(")));
+			return;
+		}
+
+		showMessage(data.place + " - Dashboard created successfully!", "info");
+		showShare(data);
+		showCurrent(data);
+		$("#dashboard").show();
+		showChart(data.forecast);
+		showTable(data.forecast, data.icon_url);
+		showMap(data);
+		$(".msg").fadeTo(2000, 500).slideUp(500, function(){ $(".msg").slideUp(500); });
+	}).fail(function(){
+		showMessage("Unable to create a dashboard right now, please try again later.", "danger");
+	});
+});
@@ -9,13 +9,18 @@ sys.path.append("/app/.heroku/python/lib/python3.7/site-packages")
 sys.path.append(".")
 sys.path.append("/app/dokkaebi")
 sys.path.append("dokkaebi")
-print(sys.path)
-print(os.environ.get('PORT', 5000))
 
 from enum import Enum
 
 import string
+import re
+from html import escape
 import datetime
+import functools
+import hashlib
+import email.utils
+import time
+import concurrent.futures
 from datetime import date
 from timezonefinder import TimezoneFinder
 from pytz import timezone
@@ -25,8 +30,9 @@ from dominate.tags import *
 from dominate.util import raw
 from dominate.util import text
 
-import requests
 import json
+import logging
+import numpy
 import cherrypy
 import plotly.graph_objects
 import plotly.offline
@@ -39,6 +45,24 @@ from configparser import ConfigParser
 config = ConfigParser()
 config.read('weather_bot.ini')
 
+#log lines are written by a background thread,
+#DEBUG adds every Telegram response body
+dokkaebi.configureLogging(
+	level = config.get("Logging", "LEVEL", fallback = "INFO"),
+	format = config.get("Logging", "FORMAT", fallback = "text"),
+	loggers = ("dokkaebi", "weather_bot")
+)
+log = logging.getLogger("weather_bot")
+
+def monitoringAccess(name):
+	#who may read /metrics and /health, [Server] METRICS and HEALTH
+	#are "local" (only this machine, the default), true or false
+	access = config.get("Server", name, fallback = "local")
+	if access.strip().lower() == "local":
+		return "local"
+
+	return config.getboolean("Server", name)
+
 #be sure to cast anything that shouldn't
 #be a string - reading the .ini file
 #seems to result in strings for every item read.
@@ -48,8 +72,33 @@ hook_data = {
 	'port': int(config["Telegram"]["PORT"]),
 	'token': config["Telegram"]["BOT_TOKEN"], 
 	'url': config["Telegram"]["WEBHOOK_URL"],
-	'environment': config["Telegram"]["ENVIRONMENT"]
+	'environment': config["Telegram"]["ENVIRONMENT"],
+	'api_url': config.get("Telegram", "API_URL", fallback = "https://api.telegram.org"),
+	#keep-alive connections to Telegram, one per CherryPy thread
+	'pool_maxsize': int(config.get("Telegram", "POOL_MAXSIZE", fallback = 10)),
+	#updates are handled off of the webhook request by these workers
+	'workers': int(config.get("Telegram", "WORKERS", fallback = 4)),
+	'queue_size': int(config.get("Telegram", "QUEUE_SIZE", fallback = 100)),
+	#"polling" runs without a public webhook
+	'mode': config.get("Telegram", "MODE", fallback = "webhook"),
+	#outgoing messages are paced to Telegram's limits
+	'rate_limit': config.getboolean("Telegram", "RATE_LIMIT", fallback = True),
+	'global_rate': float(config.get("Telegram", "GLOBAL_RATE", fallback = 30)),
+	#Telegram file_ids of the animation and icons survive restarts here
+	'file_id_store': config.get("Telegram", "FILE_ID_STORE", fallback = "file_ids.json"),
+	#CherryPy threads per process, PROCESSES > 1 forks
+	#that many servers sharing the port (see Dokkaebi.preFork)
+	'thread_pool': int(config.get("Server", "THREAD_POOL", fallback = 10)),
+	'socket_queue_size': int(config.get("Server", "SOCKET_QUEUE_SIZE", fallback = 5)),
+	'max_request_body_size': int(config.get("Server", "MAX_REQUEST_BODY_SIZE", fallback = 1024 * 1024)),
+	'processes': int(config.get("Server", "PROCESSES", fallback = 1)),
+	#see monitoringAccess
+	'metrics': monitoringAccess("METRICS")
 }
+health_access = monitoringAccess("HEALTH")
+#left to dokkaebi's default (SO_REUSEPORT where there is one) unless set
+if config.has_option("Server", "REUSE_PORT"):
+	hook_data['reuse_port'] = config.getboolean("Server", "REUSE_PORT")
 
 #you can actually store more data
 #in your bot command payload
@@ -67,11 +116,143 @@ bot_commands = {
 	]
 }
 
+#sent with /start for fun! after the first send
+#Telegram's file_id for it is reused (see Dokkaebi.sendCached)
+start_animation = "https://external-content.duckduckgo.com/iu/?u=https://media.giphy.com/media/5yvoGUhBsuBwY/giphy.gif&f=1&nofb=1"
+
 #you'll need your own API key
 #at api.openweathermap.org
 openweather = {
-	'key': config["OpenWeather"]["API_KEY"]
+	'key': config["OpenWeather"]["API_KEY"],
+	'url': config.get("OpenWeather", "API_URL", fallback = "https://api.openweathermap.org/data/2.5"),
+	'icon_url': config.get("OpenWeather", "ICON_URL", fallback = "https://openweathermap.org/img/wn")
+}
+
+#the OpenWeatherMap urls are put together once here,
+#point API_URL/ICON_URL at a caching proxy or a
+#stand-in (see benchmarks/) to route requests there
+openweather_endpoints = {
+	'weather_by_city': openweather["url"] + "/weather?q=",
+	'weather_by_zip': openweather["url"] + "/weather?zip=",
+	'forecast_by_city': openweather["url"] + "/forecast?q=",
+	'query': "&units=imperial&appid=" + openweather["key"],
+	'icon': openweather["icon_url"] + "/"
+}
+
+#OpenWeatherMap has a small fixed set of condition icons,
+#each one is sent to Telegram once and then referred to by
+#its file_id. with local copies (named like 01d@4x.png) in
+#ICON_DIR they are uploaded instead of fetched from OpenWeatherMap,
+#and with an ICON_CHAT_ID (a private chat or channel) every icon
+#is uploaded there at startup so no user waits on the first send
+openweather_icons = {
+	'codes': ["01d", "01n", "02d", "02n", "03d", "03n", "04d", "04n", "09d", "09n",
+			"10d", "10n", "11d", "11n", "13d", "13n", "50d", "50n"],
+	'dir': config.get("OpenWeather", "ICON_DIR", fallback = "./public/img/icons"),
+	'chat_id': config.get("OpenWeather", "ICON_CHAT_ID", fallback = "")
+}
+
+#OpenWeatherMap only refreshes current readings
+#about every 10 minutes, so repeat lookups for the
+#same place are answered from here without a request
+weather_cache = dokkaebi.TTLCache(
+	ttl = int(config.get("OpenWeather", "CACHE_TTL", fallback = 600)),
+	size = int(config.get("OpenWeather", "CACHE_SIZE", fallback = 1024))
+)
+
+#forecasts are kept too, mainly so there is
+#something to show while OpenWeatherMap is down
+forecast_cache = dokkaebi.TTLCache(
+	ttl = weather_cache.ttl,
+	size = weather_cache.size
+)
+
+#concurrent lookups for the same place share
+#one in-flight request to OpenWeatherMap
+weather_flights = dokkaebi.SingleFlight()
+
+#timeouts, retries and a circuit breaker so a slow
+#OpenWeatherMap can't hold every CherryPy thread
+openweather_client = dokkaebi.UpstreamClient(
+	timeout = (3, float(config.get("OpenWeather", "TIMEOUT", fallback = 10))),
+	retries = int(config.get("OpenWeather", "RETRIES", fallback = 2)),
+	breaker = dokkaebi.CircuitBreaker(
+		failure_threshold = int(config.get("OpenWeather", "BREAKER_FAILURES", fallback = 5)),
+		reset_timeout = float(config.get("OpenWeather", "BREAKER_RESET", fallback = 30))
+	),
+	#labels its requests in /metrics
+	name = "openweather"
+)
+
+#rendered dashboard pages, kept as long as
+#the weather readings they were built from
+dash_cache = dokkaebi.TTLCache(
+	ttl = weather_cache.ttl,
+	size = int(config.get("Dashboard", "CACHE_SIZE", fallback = 256))
+)
+
+#"server" renders the whole page with plotly and dominate,
+#"client" serves a static page (public/dash.html) that
+#draws the dashboard in the browser from /dash.json
+#"precompiled" server pages are filled into a template
+#compiled once (see Bot.compileDashTemplate), "dominate"
+#builds the whole page for every request
+dashboard = {
+	'mode': config.get("Dashboard", "MODE", fallback = "server"),
+	'template': config.get("Dashboard", "TEMPLATE", fallback = "precompiled")
 }
+#css and js are served from memory, compressed up front
+#and under content-hashed urls browsers can keep for good
+static_assets = dokkaebi.StaticAssets(
+	config.get("Static", "DIR", fallback = os.path.join(os.path.dirname(os.path.abspath(__file__)), "public")),
+	prefix = "/static",
+	max_age = int(config.get("Static", "MAX_AGE", fallback = 31536000))
+)
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "public", "dash.html"), encoding = "utf-8") as f:
+	dashboard["shell"] = static_assets.rewrite(f.read())
+
+def compileTemplate(page):
+	#splits a page with @@name@@ markers into its fixed
+	#text and the names in between: even items are text,
+	#odd items are names (see fillTemplate)
+	return re.split(r"@@(\w+)@@", page)
+
+def fillTemplate(parts, values):
+	#joins a compiled template with the values for its names,
+	#the values must already be escaped for where they go
+	filled = list(parts)
+	for i in range(1, len(filled), 2):
+		filled[i] = values[filled[i]]
+
+	return "".join(filled)
+
+#the dashboard's forecast request runs here while
+#the current weather is fetched on the request thread
+dash_pool = concurrent.futures.ThreadPoolExecutor(
+	max_workers = int(config.get("Dashboard", "FETCH_WORKERS", fallback = 8)),
+	thread_name_prefix = "dash-fetch"
+)
+#fetches submitted and not finished yet, so
+#the ones still waiting can be cancelled at exit
+dash_fetches = set()
+
+#the timezone polygons are loaded once for the
+#whole process instead of once per response
+timezone_finder = TimezoneFinder(in_memory = True)
+
+#coordinates are rounded before the lookup (2 places is ~1km)
+#so nearby readings share a cached timezone
+timezone_precision = int(config.get("Timezone", "PRECISION", fallback = 2))
+
+@functools.lru_cache(maxsize = int(config.get("Timezone", "CACHE_SIZE", fallback = 4096)))
+def timezoneAt(lat, lng):
+	name = timezone_finder.timezone_at(lng = lng, lat = lat)
+	if name == None:
+		#out in the ocean somewhere...
+		return timezone("UTC")
+
+	return timezone(name)
 
 #you'll also need a mapbox account
 #for generating a map with the coordinates
@@ -101,6 +282,85 @@ states = {
 class Bot(dokkaebi.Dokkaebi):
 	@cherrypy.expose
 	def dash(self, **params):
+		#in client mode the page is a static shell that
+		#loads its readings from /dash.json and draws them
+		if dashboard["mode"] == "client":
+			return self.serveCached(("shell",), lambda: (dashboard["shell"], time.monotonic() + dash_cache.ttl), "text/html;charset=utf-8")
+
+		return self.serveCached(self.dashKey(params), lambda: self.renderDash(params), "text/html;charset=utf-8")
+
+	@cherrypy.expose
+	def static(self, *path):
+		#/static/css/styles.css or its hashed name, see dokkaebi.StaticAssets
+		return static_assets.serve("/".join(path))
+
+	@cherrypy.expose
+	def dash_json(self, **params):
+		#served at /dash.json, the dashboard's readings as columns
+		return self.serveCached(self.dashKey(params) + ("json",), lambda: self.dashJson(params), "application/json")
+
+	def serveCached(self, key, render, content_type):
+		#the same place always renders the same page until
+		#the readings expire, so serve it from the cache
+		#(compressed at most once per encoding) and let
+		#browsers revalidate with ETag/Last-Modified
+		cherrypy.response.headers["Content-Type"] = content_type
+		page = dash_cache.get(key)
+		if page == None:
+			body, expires = render()
+			if isinstance(body, str):
+				body = body.encode("utf-8")
+			if expires == None:
+				return body
+
+			#a page is only as fresh as the readings it was
+			#built from, which may have been cached a while ago
+			page = {
+				"body": body,
+				"etag": "\"" + hashlib.sha1(body).hexdigest() + "\"",
+				"last_modified": email.utils.formatdate(time.time(), usegmt = True),
+				"expires": min(expires, time.monotonic() + dash_cache.ttl),
+				"encoded": {}
+			}
+			ttl = page["expires"] - time.monotonic()
+			if ttl > 0:
+				dash_cache.set(key, page, ttl)
+
+		max_age = max(0, int(page["expires"] - time.monotonic()))
+		cherrypy.response.headers["Cache-Control"] = "public, max-age={}".format(max_age)
+		return dokkaebi.sendBody(page["body"], page["etag"], page["last_modified"], page["encoded"])
+
+	def dashKey(self, params):
+		#links from /dash carry "None" for missing parts
+		normalized = []
+		for name in ["city", "state", "country_code"]:
+			value = params.get(name)
+			if value == None or value == "None":
+				value = ""
+			normalized.append(value.strip().lower())
+
+		return tuple(normalized)
+
+	def shareUrl(self, params):
+		#built from the normalized place, so every spelling
+		#of it links to the same (cached) dashboard
+		city, state, country_code = self.dashKey(params)
+		return hook_data["url"] + "/dash?" + urllib.parse.urlencode({
+			"city": city,
+			"state": state or "None",
+			"country_code": country_code or "None"
+		})
+
+	def dashExpiry(self, current, dash_data):
+		#when the first of the readings behind a dashboard goes stale
+		#(a stale reading served while OpenWeatherMap is down has no entry left)
+		return min(current.get("expires") or 0, dash_data.get("expires") or 0)
+
+	def fetchDash(self, params):
+		#returns the current weather and the forecast
+		#for the place in the /dash parameters, or None
+		#when there is no city to look up
+
 		#get the current weather first...
 		current = {}
 		
@@ -109,66 +369,103 @@ class Bot(dokkaebi.Dokkaebi):
 		if "city" in params:
 			if "country_code" in params:
 				if "state" in params:
-					self.cityDash({"city": params["city"], "state": params["state"], "country_code": params["country_code"]}, dash_data)
+					forecast_params = {"city": params["city"], "state": params["state"], "country_code": params["country_code"]}
 					c = self.parseCommandAndParams("/cityweather " + params["city"] + "," + params["state"] + "," + params["country_code"])
-					#print("city parsed: {}".format(c))
-					self.prepareData(WeatherType.CITY, c["user_parameters"], current)
 				else:
-					self.cityDash({"city": params["city"], "country_code": params["country_code"]}, dash_data)
+					forecast_params = {"city": params["city"], "country_code": params["country_code"]}
 					c = self.parseCommandAndParams("/cityweather " + params["city"] + "," + params["country_code"])
-					#print("city parsed: {}".format(c))
-					self.prepareData(WeatherType.CITY, c["user_parameters"], current)
 			else:
-				self.cityDash({"city": params["city"]}, dash_data)
+				forecast_params = {"city": params["city"]}
 				c = self.parseCommandAndParams("/cityweather " + params["city"])
-				#print("city parsed: {}".format(c))
-				self.prepareData(WeatherType.CITY, c["user_parameters"], current)
+			#print("city parsed: {}".format(c))
+
+			#the two requests don't depend on each other,
+			#so the forecast is fetched in the background
+			#while the current weather is fetched here
+			forecast = dash_pool.submit(self.cityDash, forecast_params, dash_data)
+			dash_fetches.add(forecast)
+			forecast.add_done_callback(dash_fetches.discard)
+			self.prepareData(WeatherType.CITY, c["user_parameters"], current)
+			forecast.result()
 		else:
-			return "Bad parameters - need a city name for a forecast dashboard at a minimum."
-		
-		#print(dash_data)
-		#print(current)
-
-		#set up the doc
-		doc = dominate.document(title="Weather Dashboard")
-
-		with doc.head:
-			script(type='text/javascript', src="https://cdn.plot.ly/plotly-latest.min.js")
-			script(type='text/javascript', src="https://cdnjs.cloudflare.com/ajax/libs/animejs/3.2.0/anime.min.js")
-			script(type='text/javascript', src="https://code.jquery.com/jquery-3.5.1.min.js")
-			script(type='text/javascript', src="https://cdn.jsdelivr.net/npm/popper.js@1.16.1/dist/umd/popper.min.js", integrity="sha384-9/reFTGAW83EW2RDu2S0VKaIzap3H66lZH81PoYlFhbGU+6BZp6G7niu735Sk7lN", crossorigin="anonymous")
-			script(type='text/javascript', src="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/js/bootstrap.min.js", integrity="sha384-B4gt1jrGC7Jh4AgTPSdUtOBvfO8shuf57BaghqFfPlYxofvL8/KUEfYiJOMMV+rV", crossorigin="anonymous")
-			script(type='text/javascript', src="https://cdn.datatables.net/v/bs4/dt-1.10.22/datatables.min.js")
-			script(type='text/javascript', src="https://api.mapbox.com/mapbox-gl-js/v2.0.0/mapbox-gl.js")
-			link(rel='stylesheet', href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css", integrity="sha384-JcKb8q3iqJ61gNV9KGb8thSsNjpSL0n8PARn9HuZOnIxN0hoP+VmmDGMN5t9UJ0Z", crossorigin="anonymous")
-			link(rel='stylesheet', href="https://cdn.datatables.net/v/bs4/dt-1.10.22/datatables.min.css")
-			link(rel='stylesheet', href="/static/css/styles.css")
-			link(rel='stylesheet', href="https://api.mapbox.com/mapbox-gl-js/v2.0.0/mapbox-gl.css")
-			link(rel='stylesheet', href="https://unpkg.com/leaflet@1.7.1/dist/leaflet.css")
-			script(type='text/javascript', src="https://unpkg.com/leaflet@1.7.1/dist/leaflet.js")
+			return None
+
+		return current, dash_data
+
+	def dashJson(self, params):
+		#returns the dashboard data as compact json and when it
+		#goes stale (None when it is not worth caching) - the browser
+		#does the drawing, so only the columns the page shows are sent
+		fetched = self.fetchDash(params)
+		if fetched == None:
+			return json.dumps({"error": "Bad parameters - need a city name for a forecast dashboard at a minimum."}), None
+
+		current, dash_data = fetched
+		if dash_data == None or dash_data == {} or current == {}:
+			return json.dumps({"error": "Unable to create a dashboard from the parameters given!"}), None
+
+		forecast = dash_data["forecast"]
+		return json.dumps({
+			"place": dash_data["place"],
+			"timestamp": dash_data["timestamp"].strftime("%I:%M%p %Z %b. %d"),
+			"latitude": dash_data["latitude"],
+			"longitude": dash_data["longitude"],
+			"current": {name: current[name] for name in ["temp", "feel", "main", "desc", "icon", "pressure", "humidity"]},
+			"forecast": {
+				"time": numpy.datetime_as_string(forecast["local_time"], unit = "s").tolist(),
+				"temp": forecast["temp"].tolist(),
+				"main": forecast["main"],
+				"description": forecast["description"],
+				"icon": forecast["icon"]
+			},
+			"icon_url": openweather_endpoints["icon"],
+			"share_url": self.shareUrl(params),
+			"map_token": mapbox["key"]
+		}, separators = (",", ":")), self.dashExpiry(current, dash_data)
+
+	def renderDash(self, params):
+		#returns the server rendered page and when it goes
+		#stale (None when it is not a real dashboard worth caching)
+		fetched = self.fetchDash(params)
+		if fetched == None:
+			return "Bad parameters - need a city name for a forecast dashboard at a minimum.", None
+
+		current, dash_data = fetched
 
 		#handle display under error conditions...
-		if dash_data == None or dash_data == {}:
-			with doc:
-				wrap = div(id="content", cls="container-fluid")
-				with wrap:
-					div(raw("Unable to create a dashboard from the parameters given!<button type=\"button\" class=\"close\" data-dismiss=\"alert\" aria-label=\"Close\"><span aria-hidden=\"true\">&times;</span></button>"), cls="msg alert alert-danger alert-dismissible fade show", role="alert")
-					div(h1("Please take a closer look at your command and try again :("))
-					
-			return doc.render()
-
-		dy = []
-		dates = []
-		mins = []
-		maxes = []
-		for i in range(0, len(dash_data["forecasts"])):
-			dy.append(dash_data["forecasts"][i]["temp"])
-			mins.append(dash_data["forecasts"][i]["min_temp"])
-			maxes.append(dash_data["forecasts"][i]["max_temp"])
-			dates.append(dash_data["forecasts"][i]["date_time"])
-
-		miny = min(mins)
-		maxy = max(maxes)
+		if dash_data == None or dash_data == {} or current == {}:
+			return self.dashErrorPage(), None
+
+		values = self.dashValues(params, current, dash_data)
+		if dashboard["template"] == "dominate":
+			return self.renderDominate(values, dash_data), self.dashExpiry(current, dash_data)
+
+		return self.renderTemplate(values, dash_data), self.dashExpiry(current, dash_data)
+
+	def dashValues(self, params, current, dash_data):
+		#the text that changes from one dashboard to the next
+		return {
+			"place": dash_data["place"],
+			"share_url": self.shareUrl(params),
+			"timestamp": dash_data["timestamp"].strftime("%I:%M%p %Z %b. %d"),
+			"temp": "{}".format(current["temp"]),
+			"icon_src": openweather_endpoints["icon"] + current["icon"] + "@2x.png",
+			"conditions": "Feels like {}°F. ".format(current["feel"]) + current["main"] + ". " + current["desc"],
+			"pressure": "Air pressure - {}hPa".format(current["pressure"]),
+			"humidity": "Humidity - {}%".format(current["humidity"]),
+			"latitude": "{}".format(float(dash_data["latitude"])),
+			"longitude": "{}".format(float(dash_data["longitude"]))
+		}
+
+	def renderDominate(self, values, dash_data):
+		#builds the whole page with dominate and plotly
+		#on every request (see renderTemplate for the fast path)
+		forecast = dash_data["forecast"]
+		dy = forecast["temp"]
+		dates = forecast["local_time"]
+
+		miny = forecast["min_temp"].min()
+		maxy = forecast["max_temp"].max()
 
 		fig = plotly.graph_objects.Figure(
 		    layout_title_text="Hourly Forecast"
@@ -176,7 +473,7 @@ class Bot(dokkaebi.Dokkaebi):
 		fig.add_trace(
 			plotly.graph_objects.Scatter(
 				x=dates, 
-				y=dy, 
+				y=dy.tolist(), 
 				fill='tozeroy', 
 				line=dict(color='#990000', width=4), 
 				mode='lines+markers+text', 
@@ -188,7 +485,7 @@ class Bot(dokkaebi.Dokkaebi):
 		#fig.add_trace(plotly.graph_objects.Scatter(x=dx, y=mins, name='Low', line=dict(color='royalblue', width=4)))
 
 		#fig.update_layout(yaxis=dict(range=[miny, maxy]))
-		fig.update_layout(xaxis_range=[dates[0], dates[7]], yaxis_title="Temperature (degrees F)", xaxis_title="Date and Time (24-hour clock format)", template='plotly_dark', paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
+		fig.update_layout(xaxis_range=[str(dates[0]), str(dates[7])], yaxis_title="Temperature (degrees F)", xaxis_title="Date and Time (24-hour clock format)", template='plotly_dark', paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
 		#fig.update_yaxes(nticks=5)
 		#fig.update_xaxes(nticks=5)
 		fig.update_xaxes(showgrid=False)
@@ -196,19 +493,133 @@ class Bot(dokkaebi.Dokkaebi):
 		
 		line_chart = plotly.io.to_html(fig, include_plotlyjs=False, full_html=False)
 
-		share_url = hook_data["url"] + "/dash?" + urllib.parse.urlencode(params)
-		#print(share_url)
-		share_comment = "Forecast dashboard: " + dash_data["place"]
-		#print(share_comment)
+		def rows():
+			#one row per day (forecasts are 3 hours apart)
+			for i in range(0, len(dates), 8):
+				with tr():
+					td(dates[i].astype(datetime.datetime).strftime("%a. %b %d, %Y"))
+					td("{}".format(dy[i]) + "°F")
+					td(raw(escape(forecast["main"][i] + "/" + forecast["description"][i]) + "&nbsp;<img src=\"" + escape(openweather_endpoints["icon"] + forecast["icon"][i]) + ".png\"" + ">"))
+
+		return self.dashPage(values, raw(line_chart), rows)
+
+	def renderTemplate(self, values, dash_data):
+		#fills the page compiled once by compileDashTemplate,
+		#every value is escaped for where it lands in the page
+		if dashboard.get("compiled") == None:
+			dashboard["compiled"] = self.compileDashTemplate()
+
+		compiled = dashboard["compiled"]
+		forecast = dash_data["forecast"]
+		times = numpy.datetime_as_string(forecast["local_time"], unit = "s").tolist()
+		temps = forecast["temp"].tolist()
+
+		chart = fillTemplate(compiled["chart"], {
+			"x": json.dumps(times),
+			"y": json.dumps(temps),
+			"range_start": times[0],
+			"range_end": times[min(7, len(times) - 1)]
+		})
+
+		rows = []
+		for i in range(0, len(times), 8):
+			day = forecast["local_time"][i].astype(datetime.datetime)
+			rows.append(fillTemplate(compiled["row"], {
+				"day": escape(day.strftime("%a. %b %d, %Y")),
+				"temp": escape("{}".format(temps[i])),
+				"conditions": escape(forecast["main"][i] + "/" + forecast["description"][i]),
+				"icon_src": escape(openweather_endpoints["icon"] + forecast["icon"][i] + ".png")
+			}))
+
+		filled = {name: escape(value) for name, value in values.items()}
+		filled["chart"] = chart
+		filled["rows"] = "".join(rows)
+		return fillTemplate(compiled["page"], filled)
+
+	def compileDashTemplate(self):
+		#renders the page once with markers in place of the values
+		#and splits it up (see compileTemplate), so a request only
+		#joins strings instead of building and rendering a tree
+		markers = {name: "@@" + name + "@@" for name in [
+			"place", "share_url", "timestamp", "temp", "icon_src", "conditions",
+			"pressure", "humidity", "latitude", "longitude"
+		]}
+		page = self.dashPage(markers, raw("@@chart@@"), lambda: raw("@@rows@@"))
+
+		#the same chart plotly would draw, with the layout
+		#(and its plotly_dark template) worked out once
+		fig = plotly.graph_objects.Figure(layout_title_text="Hourly Forecast")
+		fig.add_trace(
+			plotly.graph_objects.Scatter(
+				x=["@@x@@"],
+				y=["@@y@@"],
+				fill='tozeroy',
+				line=dict(color='#990000', width=4),
+				mode='lines+markers+text',
+				name='Temp',
+				marker=dict(size=14)
+			)
+		)
+		fig.update_layout(xaxis_range=["@@range_start@@", "@@range_end@@"], yaxis_title="Temperature (degrees F)", xaxis_title="Date and Time (24-hour clock format)", template='plotly_dark', paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
+		fig.update_xaxes(showgrid=False)
+		fig.update_yaxes(showgrid=False)
+		figure = fig.to_plotly_json()
+		data = json.dumps(figure["data"], cls = plotly.utils.PlotlyJSONEncoder).replace('["@@x@@"]', "@@x@@").replace('["@@y@@"]', "@@y@@")
+		layout = json.dumps(figure["layout"], cls = plotly.utils.PlotlyJSONEncoder)
+		chart = ("<div id=\"line-chart-plot\" class=\"plotly-graph-div\" style=\"height:100%; width:100%;\"></div>"
+			+ "<script type=\"text/javascript\">Plotly.newPlot(\"line-chart-plot\", " + data.replace("</", "<\\/") + ", " + layout.replace("</", "<\\/") + ", {\"responsive\": true});</script>")
+
+		row = "<tr><td>@@day@@</td><td>@@temp@@°F</td><td>@@conditions@@&nbsp;<img src=\"@@icon_src@@\"></td></tr>"
+
+		return {"page": compileTemplate(page), "chart": compileTemplate(chart), "row": compileTemplate(row)}
+
+	def dashHead(self, doc):
+		with doc.head:
+			script(type='text/javascript', src="https://cdn.plot.ly/plotly-latest.min.js")
+			script(type='text/javascript', src="https://cdnjs.cloudflare.com/ajax/libs/animejs/3.2.0/anime.min.js")
+			script(type='text/javascript', src="https://code.jquery.com/jquery-3.5.1.min.js")
+			script(type='text/javascript', src="https://cdn.jsdelivr.net/npm/popper.js@1.16.1/dist/umd/popper.min.js", integrity="sha384-9/reFTGAW83EW2RDu2S0VKaIzap3H66lZH81PoYlFhbGU+6BZp6G7niu735Sk7lN", crossorigin="anonymous")
+			script(type='text/javascript', src="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/js/bootstrap.min.js", integrity="sha384-B4gt1jrGC7Jh4AgTPSdUtOBvfO8shuf57BaghqFfPlYxofvL8/KUEfYiJOMMV+rV", crossorigin="anonymous")
+			script(type='text/javascript', src="https://cdn.datatables.net/v/bs4/dt-1.10.22/datatables.min.js")
+			script(type='text/javascript', src="https://api.mapbox.com/mapbox-gl-js/v2.0.0/mapbox-gl.js")
+			link(rel='stylesheet', href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css", integrity="sha384-JcKb8q3iqJ61gNV9KGb8thSsNjpSL0n8PARn9HuZOnIxN0hoP+VmmDGMN5t9UJ0Z", crossorigin="anonymous")
+			link(rel='stylesheet', href="https://cdn.datatables.net/v/bs4/dt-1.10.22/datatables.min.css")
+			link(rel='stylesheet', href=static_assets.url("css/styles.css"))
+			link(rel='stylesheet', href="https://api.mapbox.com/mapbox-gl-js/v2.0.0/mapbox-gl.css")
+			link(rel='stylesheet', href="https://unpkg.com/leaflet@1.7.1/dist/leaflet.css")
+			script(type='text/javascript', src="https://unpkg.com/leaflet@1.7.1/dist/leaflet.js")
+
+	def dashErrorPage(self):
+		#the error page never changes, render it once
+		if dashboard.get("error_page") == None:
+			doc = dominate.document(title="Weather Dashboard")
+			self.dashHead(doc)
+			with doc:
+				wrap = div(id="content", cls="container-fluid")
+				with wrap:
+					div(raw("Unable to create a dashboard from the parameters given!<button type=\"button\" class=\"close\" data-dismiss=\"alert\" aria-label=\"Close\"><span aria-hidden=\"true\">&times;</span></button>"), cls="msg alert alert-danger alert-dismissible fade show", role="alert")
+					div(h1("Please take a closer look at your command and try again :("))
+
+			dashboard["error_page"] = doc.render()
+
+		return dashboard["error_page"]
+
+	def dashPage(self, values, line_chart, rows):
+		#the dashboard layout - values are plain text (dominate
+		#escapes it, or it's escaped here where it goes in raw),
+		#line_chart is raw html and rows adds the table rows
+		doc = dominate.document(title="Weather Dashboard")
+		self.dashHead(doc)
+
 		with doc:
 			wrap = div(id="content", cls="container-fluid")
 			with wrap:
-				div(raw("{} - Dashboard created successfully!<button type=\"button\" class=\"close\" data-dismiss=\"alert\" aria-label=\"Close\"><span aria-hidden=\"true\">&times;</span></button>".format(dash_data["place"])), cls="msg alert alert-info alert-dismissible fade show", role="alert")
+				div(raw("{} - Dashboard created successfully!<button type=\"button\" class=\"close\" data-dismiss=\"alert\" aria-label=\"Close\"><span aria-hidden=\"true\">&times;</span></button>".format(escape(values["place"]))), cls="msg alert alert-info alert-dismissible fade show", role="alert")
 				div(
 					script(
 						src="https://telegram.org/js/telegram-widget.js?11", 
-						data_telegram_share_url=share_url, 
-						data_comment=share_comment, 
+						data_telegram_share_url=values["share_url"], 
+						data_comment="Forecast dashboard: " + values["place"], 
 						data_size="large"
 					),
 					cls="row justify-content-center",
@@ -217,36 +628,30 @@ class Bot(dokkaebi.Dokkaebi):
 				with div(cls="row justify-content-center"):
 					with div(cls="col-6"):
 						div(
-						p(dash_data["timestamp"].strftime("%I:%M%p %Z %b. %d"), cls="current-date"),
-						h1(dash_data["place"]),
-						h2(raw("{}°F".format(current["temp"]) + "&nbsp;<img src=\"" + "https://openweathermap.org/img/wn/" + current["icon"] + "@2x.png\"" + ">")),
-						p("Feels like {}°F. ".format(current["feel"]) + current["main"] + ". " + current["desc"]),
+						p(values["timestamp"], cls="current-date"),
+						h1(values["place"]),
+						h2(raw(escape(values["temp"]) + "°F" + "&nbsp;<img src=\"" + escape(values["icon_src"]) + "\"" + ">")),
+						p(values["conditions"]),
 						blockquote(
-							p("Air pressure - {}hPa".format(current["pressure"])),
-							p("Humidity - {}%".format(current["humidity"]))
+							p(values["pressure"]),
+							p(values["humidity"])
 						)
 					)
 					with div(cls="col-6"):
 						div(id="map")
 				with div(cls="row justify-content-center"):
 					with div(cls="col-6"):
-						div(raw(line_chart), id="line-chart")
+						div(line_chart, id="line-chart")
 					with div(cls="col-6"):
 						h2("5-Day Forecast")
 						dt = table(id="forecast", cls="table table-dark table-borderless table-hover")
 						with dt:
 							with tbody():
-								for i in range(0, len(dash_data["forecasts"])):
-									date = dash_data["forecasts"][i]["date_time"].strftime("%a. %b %d, %Y")
-									if i == 0 or i%8 == 0:
-										with tr():
-											td(date)
-											td("{}".format(dash_data["forecasts"][i]["temp"]) + "°F")
-											td(raw(dash_data["forecasts"][i]["main"] + "/" + dash_data["forecasts"][i]["description"] + "&nbsp;<img src=\"" + "https://openweathermap.org/img/wn/" + dash_data["forecasts"][i]["icon"] + ".png\"" + ">"))
+								rows()
 			
 			script().add("$(document).ready(function() { $('#forecast').DataTable();} );")
-			script().add("var mymap = L.map('map').setView([{},".format(dash_data["latitude"]) + "{}".format(dash_data["longitude"]) + "], 13);"
-				+ "var marker = L.marker([{},".format(dash_data["latitude"]) + "{}".format(dash_data["longitude"]) + "]).addTo(mymap);"
+			script().add("var mymap = L.map('map').setView([" + values["latitude"] + "," + values["longitude"] + "], 13);"
+				+ "var marker = L.marker([" + values["latitude"] + "," + values["longitude"] + "]).addTo(mymap);"
 			)
 			script().add("var link = new DOMParser().parseFromString('Map data © <a href=\"https://www.openstreetmap.org/copyright\">OpenStreetMap</a> contributors, Imagery © <a href=\"https://www.mapbox.com/\">Mapbox</a>', 'text/html').documentElement.textContent;"
 				+ "L.tileLayer('https://api.mapbox.com/styles/v1/{{id}}/tiles/{{z}}/{{x}}/{{y}}?access_token={}'".format(mapbox["key"])
@@ -271,54 +676,90 @@ class Bot(dokkaebi.Dokkaebi):
 
 	def prepareCityForecast(self, res, data):
 		if res != {}:
-			tf = TimezoneFinder()
+			if res.get("city") and res["city"] != None:
+				tz = self.localTimezone(res["city"]["coord"]["lat"], res["city"]["coord"]["lon"])
+
 			#print(res)
 			if res.get("list") and res["list"] != None:
 				#print("there is a list of forecasts")
-				forecasts = []
-				for i in range(0, len(res["list"])):
-					forecast = {
-						"temp": res["list"][i]["main"]["temp"],
-						"feels_like": res["list"][i]["main"]["feels_like"],
-						"min_temp": res["list"][i]["main"]["temp_min"],
-						"max_temp": res["list"][i]["main"]["temp_max"],
-						"pressure": res["list"][i]["main"]["pressure"],
-						"humidity": res["list"][i]["main"]["humidity"],
-						"main": res["list"][i]["weather"][0]["main"],
-						"description": res["list"][i]["weather"][0]["description"],
-						"icon": res["list"][i]["weather"][0]["icon"],
-						"dt": res["list"][i]["dt"],
-						"date_text": datetime.datetime.fromtimestamp(res["list"][i]["dt"], tz=timezone(tf.timezone_at(lng=res["city"]["coord"]["lon"], lat=res["city"]["coord"]["lat"]))).strftime("%m-%d-%Y %I:%M:%S %p %Z"),
-						"date_time": datetime.datetime.fromtimestamp(res["list"][i]["dt"], tz=timezone(tf.timezone_at(lng=res["city"]["coord"]["lon"], lat=res["city"]["coord"]["lat"]))),
-						"dt_txt": res["list"][i]["dt_txt"]
-					}
-					forecasts.append(forecast)
-
-				data.update({"forecasts": forecasts})
+				data.update({"forecast": self.forecastColumns(res["list"], tz)})
 
 			if res.get("city") and res["city"] != None:
 				data.update({
 					"latitude": res["city"]["coord"]["lat"],
 					"longitude": res["city"]["coord"]["lon"],
-					"local_timezone": timezone(tf.timezone_at(lng=res["city"]["coord"]["lon"], lat=res["city"]["coord"]["lat"])),
+					"local_timezone": tz,
 					"country": res["city"]["country"],
-					"sunrise": datetime.datetime.fromtimestamp(res["city"]["sunrise"], tz=timezone(tf.timezone_at(lng=res["city"]["coord"]["lon"], lat=res["city"]["coord"]["lat"]))),
-					"sunset": datetime.datetime.fromtimestamp(res["city"]["sunset"], tz=timezone(tf.timezone_at(lng=res["city"]["coord"]["lon"], lat=res["city"]["coord"]["lat"]))),
-					"timestamp": datetime.datetime.now(tz=timezone(tf.timezone_at(lng=res["city"]["coord"]["lon"], lat=res["city"]["coord"]["lat"]))),#.strftime("%A %B %d, %Y %I:%M:%S %p %Z"),
+					"sunrise": datetime.datetime.fromtimestamp(res["city"]["sunrise"], tz=tz),
+					"sunset": datetime.datetime.fromtimestamp(res["city"]["sunset"], tz=tz),
+					"timestamp": datetime.datetime.now(tz=tz),#.strftime("%A %B %d, %Y %I:%M:%S %p %Z"),
 					"name": res["city"]["name"]
 				})
 
 			#print(data)
 
+	def forecastColumns(self, entries, tz):
+		#one pass over the OpenWeatherMap list fills
+		#numpy columns instead of building a dict per entry
+		count = len(entries)
+		dt = numpy.empty(count, dtype = numpy.int64)
+		readings = numpy.empty((count, 6))
+		condition = numpy.empty(count, dtype = numpy.int32)
+		main = []
+		description = []
+		icon = []
+
+		for i, entry in enumerate(entries):
+			reading = entry["main"]
+			weather = entry["weather"][0]
+			dt[i] = entry["dt"]
+			readings[i] = (reading["temp"], reading["feels_like"], reading["temp_min"], reading["temp_max"], reading["pressure"], reading["humidity"])
+			condition[i] = weather["id"]
+			main.append(weather["main"])
+			description.append(weather["description"])
+			icon.append(weather["icon"])
+
+		return {
+			"dt": dt,
+			"local_time": self.localTimes(dt, tz),
+			"temp": readings[:, 0],
+			"feels_like": readings[:, 1],
+			"min_temp": readings[:, 2],
+			"max_temp": readings[:, 3],
+			"pressure": readings[:, 4],
+			"humidity": readings[:, 5],
+			"condition": condition,
+			"main": main,
+			"description": description,
+			"icon": icon
+		}
+
+	def localTimes(self, dt, tz):
+		#unix timestamps -> naive local datetime64 values.
+		#the utc offset only changes at a DST transition, so it is
+		#checked at both ends and only worked out per entry if
+		#the forecast crosses one
+		if len(dt) == 0:
+			return dt.astype("datetime64[s]")
+
+		first = datetime.datetime.fromtimestamp(int(dt[0]), tz = tz).utcoffset().total_seconds()
+		last = datetime.datetime.fromtimestamp(int(dt[-1]), tz = tz).utcoffset().total_seconds()
+		if first == last:
+			offsets = int(first)
+		else:
+			offsets = numpy.array([datetime.datetime.fromtimestamp(int(t), tz = tz).utcoffset().total_seconds() for t in dt], dtype = numpy.int64)
+
+		return (dt + offsets).astype("datetime64[s]")
+
 	def prepareResponse(self, res, data):
 		if res != {}:
-			tf = TimezoneFinder()
-			
 			if res.get("coord") and res["coord"] != None:
+				tz = self.localTimezone(res["coord"]["lat"], res["coord"]["lon"])
+
 				data.update({
 					"latitude": res["coord"]["lat"],
 					"longitude": res["coord"]["lon"],
-					"local_timezone": timezone(tf.timezone_at(lng=res["coord"]["lon"], lat=res["coord"]["lat"]))
+					"local_timezone": tz
 				})
 
 			if res.get("main") and res["main"] != None:
@@ -341,14 +782,18 @@ class Bot(dokkaebi.Dokkaebi):
 			if res.get("sys") and res["sys"] != None:
 				data.update({
 					"country": res["sys"]["country"],
-					"sunrise": datetime.datetime.fromtimestamp(res["sys"]["sunrise"], tz=timezone(tf.timezone_at(lng=res["coord"]["lon"], lat=res["coord"]["lat"]))),
-					"sunset": datetime.datetime.fromtimestamp(res["sys"]["sunset"], tz=timezone(tf.timezone_at(lng=res["coord"]["lon"], lat=res["coord"]["lat"]))),
-					"timestamp": datetime.datetime.now(tz=timezone(tf.timezone_at(lng=res["coord"]["lon"], lat=res["coord"]["lat"]))).strftime("%A %B %d, %Y %I:%M:%S %p %Z")
+					"sunrise": datetime.datetime.fromtimestamp(res["sys"]["sunrise"], tz=tz),
+					"sunset": datetime.datetime.fromtimestamp(res["sys"]["sunset"], tz=tz),
+					"timestamp": datetime.datetime.now(tz=tz).strftime("%A %B %d, %Y %I:%M:%S %p %Z")
 				})
 
 			if res.get("name") and res["name"] != None:
 				data.update({"name": res["name"]})
 
+	def localTimezone(self, lat, lng):
+		#every timezone conversion goes through here
+		return timezoneAt(round(lat, timezone_precision), round(lng, timezone_precision))
+
 	def parseCity(self, user_parameters):
 		#check how long the city name is
 		#and act accordingly
@@ -424,21 +869,22 @@ class Bot(dokkaebi.Dokkaebi):
 			if state != None and state != "None":
 				if country_code != None and country_code != "None":
 					#print('path 1')
-					url = "https://api.openweathermap.org/data/2.5/forecast?q=" + city.title() + "," + state + "," + country_code + "&units=imperial&appid=" + openweather["key"]
+					url = openweather_endpoints["forecast_by_city"] + city.title() + "," + state + "," + country_code + openweather_endpoints["query"]
 				else:
 					if state.upper() in states:
-						url = "https://api.openweathermap.org/data/2.5/forecast?q=" + city.title() + "," + state + ",us&units=imperial&appid=" + openweather["key"]
+						url = openweather_endpoints["forecast_by_city"] + city.title() + "," + state + ",us" + openweather_endpoints["query"]
 						#print('path 2')
 					else:
-						url = "https://api.openweathermap.org/data/2.5/forecast?q=" + city.title() + "," + state + "&units=imperial&appid=" + openweather["key"]
+						url = openweather_endpoints["forecast_by_city"] + city.title() + "," + state + openweather_endpoints["query"]
 						#print('path 3')
 			else:
-				url = "https://api.openweathermap.org/data/2.5/forecast?q=" + city.title() + "&units=imperial&appid=" + openweather["key"]
+				url = openweather_endpoints["forecast_by_city"] + city.title() + openweather_endpoints["query"]
 				#print('path 4')
 
 			#print(url)
 
-			res = requests.get(url).json()
+			key = ("forecast", city.lower(), (state or "").lower(), (country_code or "").lower())
+			res = self.fetchWeather(key, url)
 			#print(res)
 
 			if res != None and res.get("cod") == "200":
@@ -450,9 +896,11 @@ class Bot(dokkaebi.Dokkaebi):
 				else:
 					data.update({"place": res.get("city").get("name").title() + " - " + res.get("city").get("country")})
 
+				#dashboards built from this reading go stale with it
+				data["expires"] = forecast_cache.expires(key)
 				self.prepareCityForecast(res, data)
 			else:
-				print("OpenWeatherMap query failed ({}): ".format(res.get("cod")) + res.get("message"))
+				log.warning("OpenWeatherMap query failed", extra = {"cod": res.get("cod"), "error": res.get("message")})
 
 	def weatherByCity(self, user_parameters, data):
 		params = self.parseCity(user_parameters)
@@ -470,22 +918,23 @@ class Bot(dokkaebi.Dokkaebi):
 			if state != None:
 				if country_code != None:
 					#print('path 1')
-					url = "https://api.openweathermap.org/data/2.5/weather?q=" + city.title() + "," + state + "," + country_code + "&units=imperial&appid=" + openweather["key"]
+					url = openweather_endpoints["weather_by_city"] + city.title() + "," + state + "," + country_code + openweather_endpoints["query"]
 				else:
 					if state.upper() in states:
-						url = "https://api.openweathermap.org/data/2.5/weather?q=" + city.title() + "," + state + ",us&units=imperial&appid=" + openweather["key"]
+						url = openweather_endpoints["weather_by_city"] + city.title() + "," + state + ",us" + openweather_endpoints["query"]
 						data.update({"state": state})
 						#print('path 2')
 					else:
-						url = "https://api.openweathermap.org/data/2.5/weather?q=" + city.title() + "," + state + "&units=imperial&appid=" + openweather["key"]
+						url = openweather_endpoints["weather_by_city"] + city.title() + "," + state + openweather_endpoints["query"]
 						#print('path 3')
 			else:
-				url = "https://api.openweathermap.org/data/2.5/weather?q=" + city.title() + "&units=imperial&appid=" + openweather["key"]
+				url = openweather_endpoints["weather_by_city"] + city.title() + openweather_endpoints["query"]
 				#print('path 4')
 
 			#print(url)
 
-			res = requests.get(url).json()
+			key = ("weather", city.lower(), (state or "").lower(), (country_code or "").lower())
+			res = self.fetchWeather(key, url)
 			#print(res)
 
 			if res != None and res.get("cod") == 200:
@@ -497,9 +946,10 @@ class Bot(dokkaebi.Dokkaebi):
 				else:
 					data.update({"place": res.get("name").title() + " - " + res.get("sys").get("country")})
 
+				data["expires"] = weather_cache.expires(key)
 				self.prepareResponse(res, data)
 			else:
-				print("OpenWeatherMap query failed ({}): ".format(res.get("cod")) + res.get("message"))
+				log.warning("OpenWeatherMap query failed", extra = {"cod": res.get("cod"), "error": res.get("message")})
 
 	def weatherByPostalCode(self, user_parameters, data):
 		getPost = self.parsePostalCode(user_parameters)
@@ -513,173 +963,220 @@ class Bot(dokkaebi.Dokkaebi):
 			#functions if/when you wish to convert (for example the user wants to see it
 			#differently and you require units as a command parameter)
 			if country_code != None:
-				url = "https://api.openweathermap.org/data/2.5/weather?zip=" + postal_code + "," + country_code + "&units=imperial&appid=" + openweather["key"]
+				url = openweather_endpoints["weather_by_zip"] + postal_code + "," + country_code + openweather_endpoints["query"]
 			else: #assume it's a zip in the US
-				url = "https://api.openweathermap.org/data/2.5/weather?zip=" + postal_code + ",us&units=imperial&appid=" + openweather["key"]
+				url = openweather_endpoints["weather_by_zip"] + postal_code + ",us" + openweather_endpoints["query"]
 
 			#print(url)
 
-			res = requests.get(url).json()
+			res = self.fetchWeather(("zip", postal_code.strip().lower(), (country_code or "us").strip().lower()), url)
 			#print(res)
 
 			if res != None and res.get("cod") == 200:
 				data.update({"place": res.get("name").title() + " - " + res.get("sys").get("country")})
 				self.prepareResponse(res, data)
 			else:
-				print("OpenWeatherMap query failed ({}): ".format(res.get("cod")) + res.get("message"))
+				log.warning("OpenWeatherMap query failed", extra = {"cod": res.get("cod"), "error": res.get("message")})
+
+	def fetchWeather(self, key, url):
+		#key is the endpoint and normalized place, for example
+		#("weather", "san diego", "ca", "us"), ("zip", "92113", "us")
+		#or ("forecast", "paris", "fr", "")
+		cache = forecast_cache if key[0] == "forecast" else weather_cache
+		res = cache.get(key)
+		if res != None:
+			return res
+
+		def fetch():
+			res = openweather_client.getJson(url)
+			#only keep good readings around
+			#(forecast "cod" is a string, weather's is an int),
+			#cached before the flight ends so a caller arriving
+			#right after it finds them instead of fetching again
+			if res != None and str(res.get("cod")) == "200":
+				cache.set(key, res)
+
+			return res
+
+		try:
+			return weather_flights.do(key, fetch)
+		except dokkaebi.UpstreamUnavailable as e:
+			#old readings beat no readings
+			res = cache.getStale(key)
+			if res != None:
+				log.warning("OpenWeatherMap unavailable, serving stale data", extra = {"error": str(e)})
+				return res
+
+			return {"cod": 503, "message": str(e)}
+
+	@cherrypy.expose
+	@cherrypy.tools.json_out()
+	def health(self):
+		#upstream state for monitoring
+		if not dokkaebi.allowsClient(health_access, cherrypy.request.remote.ip):
+			raise cherrypy.NotFound()
+
+		return {
+			"openweather": openweather_client.stats(),
+			"weather_cache": weather_cache.stats(),
+			"forecast_cache": forecast_cache.stats(),
+			"duplicate_updates": self.seen_updates.stats() if self.seen_updates != None else None
+		}
+
+	def gauges(self):
+		#the bot's caches on top of dokkaebi's own
+		#numbers in /metrics (see Dokkaebi.gauges)
+		caches = {"weather": weather_cache.stats(), "forecast": forecast_cache.stats(), "dash": dash_cache.stats()}
+		timezones = timezoneAt.cache_info()
+		caches["timezone"] = {"hits": timezones.hits, "misses": timezones.misses, "entries": timezones.currsize}
+		flights = weather_flights.stats()
+		breaker = openweather_client.stats()["breaker"]
+
+		return dokkaebi.Dokkaebi.gauges(self) + [
+			("weather_bot_cache_hits_total", "counter", "Lookups answered from a cache.", [({"cache": name}, c["hits"]) for name, c in caches.items()]),
+			("weather_bot_cache_misses_total", "counter", "Lookups that missed a cache.", [({"cache": name}, c["misses"]) for name, c in caches.items()]),
+			("weather_bot_cache_entries", "gauge", "Entries held by a cache.", [({"cache": name}, c["entries"]) for name, c in caches.items()]),
+			("weather_bot_openweather_in_flight", "gauge", "OpenWeatherMap requests in progress.", [({}, flights["in_flight"])]),
+			("weather_bot_openweather_shared_total", "counter", "Lookups that waited on an identical request already in progress.", [({}, flights["shared"])]),
+			("weather_bot_openweather_breaker_open", "gauge", "1 while the OpenWeatherMap circuit breaker is not closed.", [({}, breaker["state"] != "closed")])
+		]
 
 	def parseCommandAndParams(self, user_parameters):
 		#this will work both for single word commands
 		#and commands with multiple text parameters
-		command = user_parameters.split(' ')[0] #grab command keyword...
-		p = ""
-		if user_parameters.split(' ')[1:]:#split on spaces first...
-			if "," in user_parameters:#split on commas if there...
-				p = user_parameters.split(',')
-				#re-establish the city name if multi-word (for example ["san", "luis", "obispo", "ca", "us"] 
-				#becomes reconstituted as ["san luis obispo", "ca", "us"] as you would want it to be)
-				p[0] = " ".join(p[0].split(' ')[1:])
-				#print("user params: {}".format(p))
-				#print(p)
-			else: #no commas so its just the city
-				p = " ".join(user_parameters.split(' ')[1:]) #again, could be a multi-word city...
-				#print("user params: {}".format(p))
-				#print(p[0])
-
-		return {"command": command, "user_parameters": p}
-
-	def handleData(self, data):
-		#print(data)
-
-		if "message" in data:
-			if "text" in data["message"]:
-				parsed = self.parseCommandAndParams(data["message"]["text"])
-				command = parsed["command"]
-				user_parameters = parsed["user_parameters"]
+		command, p = self.parseCommand(user_parameters)
+		return {"command": command, "user_parameters": self.splitParameters(p)}
+
+	def splitParameters(self, arguments):
+		#split on commas if there, for example "san luis obispo, ca, us"
+		#becomes ["san luis obispo", " ca", " us"] as you would want it to be...
+		if "," in arguments:
+			return arguments.split(',')
+
+		#no commas so its just the city (could be a multi-word city...)
+		return arguments
+
+	#commands are dispatched by dokkaebi (see Dokkaebi.dispatchCommand),
+	#so each handler gets the message and the text after the command.
+	#handling malformed/unsupported commands from
+	#users results in weird behavior sometimes
+	#(for example on a pin message event or upon inviting the bot to a chat)
+	#it's best to just ignore interactions outside
+	#the scope of valid commands for now
+	@dokkaebi.command("start")
+	def onStart(self, message, arguments):
+		chat_id = message["chat"]["id"]
+
+		#for fun!
+		self.sendCached("sendAnimation", "animation", {"chat_id": chat_id, "animation": start_animation})
+		msg = {
+			"chat_id": chat_id,
+			"text": self.start_greeting[0] + message["from"]["first_name"] + self.start_greeting[1],
+			"parse_mode": "html"
+		}
+		self.sendMessage(msg)
+		self.sendMessage({"chat_id": chat_id, "text": self.start_text})
+
+	@dokkaebi.command("help")
+	def onHelp(self, message, arguments):
+		self.sendMessage({"chat_id": message["chat"]["id"], "text": self.help_text, "parse_mode": "html"})
+
+	@dokkaebi.command("dash")
+	def onDash(self, message, arguments):
+		chat_id = message["chat"]["id"]
+		city_data = self.parseCity(self.splitParameters(arguments))
+		#print(city_data)
+
+		d = hook_data["url"] + "/dash?" + str(urllib.parse.urlencode(city_data))
+		#print(d)
+
+		if d != None and d != "":
+			self.sendMessage({
+				"chat_id": chat_id, 
+				"text": "Your dashboard has been created! Check it out - " + d
+			})
 		else:
-			command = None
-
-		chat_id = data["message"]["chat"]["id"]
-		user_first_name = data["message"]["from"]["first_name"]
-		
-		if command in ["/start", "/start@" + self.bot_info["username"]]:
-			#for fun!
-			weather = "https://external-content.duckduckgo.com/iu/?u=https://media.giphy.com/media/5yvoGUhBsuBwY/giphy.gif&f=1&nofb=1"
-			print(self.sendAnimation({"chat_id": chat_id, "animation": weather}).json())
-			msg = {
-				"chat_id": chat_id,
-				"text": "Thanks for using "  + self.bot_info["username"] + ", " + user_first_name + "!\n" + "It's always wise to check the weather before you run outside. " + "&#128514;",
-				"parse_mode": "html"
-			}
-			print(self.sendMessage(msg).json())
-			print(self.sendMessage({
+			self.sendMessage({
 				"chat_id": chat_id, 
-				"text": "Just submit a command to get weather information.\nFor example, the command: /cityweather San Diego\nwill return weather information for San Diego.\nUse the /help command for the full list of commands."
-			}).json())
-
-		elif command in ["/help", "/help@" + self.bot_info["username"]]:
-			#append the help string from
-			#the bot_command data structure
-			t = ""
-			for x in bot_commands["commands"]:
-				t += "".join("/" + x["command"] + " - " + x["description"] + "\nExample: " + x["example"]) + "\n"
-			
-			msg = {
+				"text": "There was an error with the city you entered. Please check the spelling and try again."
+			})
+
+	@dokkaebi.command("cityweather")
+	def onCityWeather(self, message, arguments):
+		chat_id = message["chat"]["id"]
+		city_data = {}
+		self.prepareData(WeatherType.CITY, self.splitParameters(arguments), city_data)
+
+		#print(city_data)
+		#timezones and UTC offsets are tricky...
+		#but this is close enough for the intended purpose
+		#see this for more info:
+		#https://stackoverflow.com/questions/17733139/getting-the-correct-timezone-offset-in-python-using-local-timezone
+		#and this:
+		#https://en.wikipedia.org/wiki/ISO_8601
+		if city_data != {}:
+			self.sendIcon(city_data.get("icon"), {
 				"chat_id": chat_id,
-				"text": "The following commands are available: \n" + t.rstrip(),
+				"caption": "The current weather for " + city_data.get("place") + " (" + city_data.get("timestamp") + ") :" + self.weatherCaption(city_data),
 				"parse_mode": "html"
-			}
-			
-			#print(t.rstrip())
-			print(self.sendMessage(msg).json())
+			})
+		else:
+			self.sendMessage({
+				"chat_id": chat_id, 
+				"text": "There was an error with the city you entered. Please check the spelling and try again."
+			})
 
-		elif command in ["/dash", "/dash@" + self.bot_info["username"]]:
-			city_data = self.parseCity(user_parameters)
-			#print(city_data)
+	@dokkaebi.command("zipweather")
+	def onZipWeather(self, message, arguments):
+		chat_id = message["chat"]["id"]
+		zip_data = {}
+		self.prepareData(WeatherType.POSTAL_CODE, self.splitParameters(arguments), zip_data)
 
-			d = hook_data["url"] + "/dash?" + str(urllib.parse.urlencode(city_data))
-			#print(d)
+		#print(zip_data)
 
-			if d != None and d != "":
-				print(self.sendMessage({
-					"chat_id": chat_id, 
-					"text": "Your dashboard has been created! Check it out - " + d
-				}).json())
-			else:
-				print(self.sendMessage({
-					"chat_id": chat_id, 
-					"text": "There was an error with the city you entered. Please check the spelling and try again."
-				}).json())
-
-		elif command in ["/cityweather", "/cityweather@" + self.bot_info["username"]]:
-			city_data = {}
-			self.prepareData(WeatherType.CITY, user_parameters, city_data)
-
-			#print(city_data)
-			#timezones and UTC offsets are tricky...
-			#but this is close enough for the intended purpose
-			#see this for more info:
-			#https://stackoverflow.com/questions/17733139/getting-the-correct-timezone-offset-in-python-using-local-timezone
-			#and this:
-			#https://en.wikipedia.org/wiki/ISO_8601
-			if city_data != {}:
-				print(self.sendPhoto({
-					"chat_id": chat_id,
-					"photo": "http://openweathermap.org/img/wn/" + city_data.get("icon") + "@4x.png", 
-					"caption": "The current weather for " + city_data.get("place") + " (" + city_data.get("timestamp") + ") :" +
-							"\n--------------------------------" +
-							"\n" + city_data.get("main") + "/" + city_data.get("desc") + "\n<b>Temperature</b>: {}".format(city_data.get("temp")) + " °F" +
-							"\n<i>Feels like</i>: {}".format(city_data.get("feel")) + " °F" +
-							"\n<b>Low</b>: {}".format(city_data.get("min_temp")) + " °F" + "\n<b>High</b>: {}".format(city_data.get("max_temp")) + " °F" +
-							"\n--------------------------------" +
-							"\n<i>Pressure</i>: {}".format(city_data.get("pressure")) + " hpa\n<i>Humidity</i>: {}".format(city_data.get("humidity")) + "%" +
-							"\n--------------------------------" +
-							"\n<i>Sunrise</i>: {}".format(city_data.get("sunrise").strftime("%A %B %d, %Y %X %Z")) + "\n<i>Sunset</i>: {}".format(city_data.get("sunset").strftime("%A %B %d, %Y %X %Z")),
-					"parse_mode": "html"
-				}).json())
-			else:
-				print(self.sendMessage({
-					"chat_id": chat_id, 
-					"text": "There was an error with the city you entered. Please check the spelling and try again."
-				}).json())
-
-		elif command in ["/zipweather", "/zipweather@" + self.bot_info["username"]]:
-			zip_data = {}
-			self.prepareData(WeatherType.POSTAL_CODE, user_parameters, zip_data)
-
-			#print(zip_data)
-
-			if zip_data != {}:
-				print(self.sendPhoto({
-					"chat_id": chat_id,
-					"photo": "http://openweathermap.org/img/wn/" + zip_data.get("icon") + "@4x.png", 
-					"caption": "The current weather for " + zip_data.get("place") + ":" +
-							"\n--------------------------------" +
-							"\n" + zip_data.get("main") + "/" + zip_data.get("desc") + "\n<b>Temperature</b>: {}".format(zip_data.get("temp")) + " °F" +
-							"\n<i>Feels like</i>: {}".format(zip_data.get("feel")) + " °F" +
-							"\n<b>Low</b>: {}".format(zip_data.get("min_temp")) + " °F" + "\n<b>High</b>: {}".format(zip_data.get("max_temp")) + " °F" +
-							"\n--------------------------------" +
-							"\n<i>Pressure</i>: {}".format(zip_data.get("pressure")) + " hpa\n<i>Humidity</i>: {}".format(zip_data.get("humidity")) + "%" +
-							"\n--------------------------------" +
-							"\n<i>Sunrise</i>: {}".format(zip_data.get("sunrise").strftime("%A %B %d, %Y %X %Z")) + "\n<i>Sunset</i>: {}".format(zip_data.get("sunset").strftime("%A %B %d, %Y %X %Z")),
-					"parse_mode": "html"
-				}).json())
-			else:
-				print(self.sendMessage({
-					"chat_id": chat_id, 
-					"text": "There was an error with the postal code you entered. Please check the spelling and try again."
-				}).json())
-		#handling malformed/unsupported commands from
-		#users this way results in weird behavior sometimes
-		#(for example on a pin message event or upon inviting the bot to a chat)
-		#it's best to just ignore interactions outside
-		#the scope of valid commands for now
-		#else:
-		#	msg = {
-		#		"chat_id": chat_id,
-		#		"text": "I didn't quite get that, " + user_first_name + ". Please try a valid command."
-		#	}
-		#	print(self.sendMessage(msg).json())
+		if zip_data != {}:
+			self.sendIcon(zip_data.get("icon"), {
+				"chat_id": chat_id,
+				"caption": "The current weather for " + zip_data.get("place") + ":" + self.weatherCaption(zip_data),
+				"parse_mode": "html"
+			})
+		else:
+			self.sendMessage({
+				"chat_id": chat_id, 
+				"text": "There was an error with the postal code you entered. Please check the spelling and try again."
+			})
+
+	def sendIcon(self, icon, photo_data):
+		#sends the OpenWeatherMap condition icon as a photo,
+		#by file_id once Telegram has seen it (see Dokkaebi.sendCached)
+		return self.sendCached(
+			"sendPhoto",
+			"photo",
+			dict(photo_data, photo = openweather_endpoints["icon"] + icon + "@4x.png"),
+			key = "openweather-icon-" + icon,
+			upload = os.path.join(openweather_icons["dir"], icon + "@4x.png")
+		)
+
+	def warmIcons(self):
+		#upload the icons Telegram doesn't know yet
+		#to the icon chat so their file_ids are ready
+		if openweather_icons["chat_id"] == "":
+			return
+
+		for icon in openweather_icons["codes"]:
+			if "openweather-icon-" + icon not in self.file_ids:
+				self.sendIcon(icon, {"chat_id": openweather_icons["chat_id"], "disable_notification": True})
+
+	def weatherCaption(self, data):
+		#the readings shared by the /cityweather and /zipweather replies
+		return ("\n--------------------------------" +
+				"\n" + data.get("main") + "/" + data.get("desc") + "\n<b>Temperature</b>: {}".format(data.get("temp")) + " °F" +
+				"\n<i>Feels like</i>: {}".format(data.get("feel")) + " °F" +
+				"\n<b>Low</b>: {}".format(data.get("min_temp")) + " °F" + "\n<b>High</b>: {}".format(data.get("max_temp")) + " °F" +
+				"\n--------------------------------" +
+				"\n<i>Pressure</i>: {}".format(data.get("pressure")) + " hpa\n<i>Humidity</i>: {}".format(data.get("humidity")) + "%" +
+				"\n--------------------------------" +
+				"\n<i>Sunrise</i>: {}".format(data.get("sunrise").strftime("%A %B %d, %Y %X %Z")) + "\n<i>Sunset</i>: {}".format(data.get("sunset").strftime("%A %B %d, %Y %X %Z")))
 
 	def kelvinToFahrenheit(self, temp):
 		return (temp - 273.15) * 1.8000 + 32.00
@@ -688,18 +1185,57 @@ class Bot(dokkaebi.Dokkaebi):
 		return temp - 273.15
 		
 	def onInit(self):
-		print(self.setMyCommands(bot_commands).json())
-		print(self.getMyCommands().json())
+		self.setMyCommands(bot_commands)
+		self.getMyCommands()
+		self.prepareReplies()
+		self.warmIcons()
+		cherrypy.engine.subscribe("exit", self.stopDashPool)
+		if dashboard["mode"] == "server" and dashboard["template"] != "dominate":
+			dashboard["compiled"] = self.compileDashTemplate()
+
+	def stopDashPool(self):
+		#the pool's threads would keep CherryPy
+		#waiting on them forever at exit, fetches
+		#not started yet are cancelled by hand
+		#(shutdown's cancel_futures needs Python 3.9),
+		#cancel() leaves the running ones alone
+		for fetch in list(dash_fetches):
+			fetch.cancel()
+
+		dash_pool.shutdown(wait = False)
+
+	def onPreFork(self):
+		#each worker process opens its own
+		#connections to OpenWeatherMap
+		openweather_client.session.close()
+
+	def prepareReplies(self):
+		#the /start and /help replies never change,
+		#so they are put together once up front
+		#(the greeting is split around the user's first name)
+		self.start_greeting = (
+			"Thanks for using " + self.bot_info["username"] + ", ",
+			"!\n" + "It's always wise to check the weather before you run outside. " + "&#128514;"
+		)
+		self.start_text = "Just submit a command to get weather information.\nFor example, the command: /cityweather San Diego\nwill return weather information for San Diego.\nUse the /help command for the full list of commands."
+
+		#append the help string from
+		#the bot_command data structure
+		t = ""
+		for x in bot_commands["commands"]:
+			t += "".join("/" + x["command"] + " - " + x["description"] + "\nExample: " + x["example"]) + "\n"
+
+		self.help_text = "The following commands are available: \n" + t.rstrip()
 
+#endpoints are stateless by default (see dokkaebi.stateless_config),
+#[Server] SESSIONS turns CherryPy sessions back on for every route
 conf = {
 	'/': {
-		'tools.sessions.on': True,
-		'tools.staticdir.root': os.path.abspath(os.getcwd())
-	},
-	'/static': {
-		'tools.staticdir.on': True,
-		'tools.staticdir.dir': './public'
+		'tools.sessions.on': config.getboolean("Server", "SESSIONS", fallback = False)
 	}
 }
 
-newBot = Bot(hook_data, conf)
\ No newline at end of file
+#run as a script to start the bot, importing
+#this file (see benchmarks/) leaves it alone
+if __name__ == "__main__":
+	newBot = Bot(hook_data, conf)
\ No newline at end of file